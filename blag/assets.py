@@ -0,0 +1,325 @@
+"""Asset Fingerprinting.
+
+The static files of a site (the files of the static directory and the
+non-markdown files of the input directory) usually keep their URLs forever,
+so browsers and CDNs cannot cache them for long. With fingerprinting, each
+asset gets a second copy whose name contains a hash of its content, e.g.
+`style.3f9a1c2b.css` next to `style.css`. The content behind such a URL
+never changes, so it can be served with far-future cache headers.
+
+The asset manifest (`.blag-assets.json` in the output directory) maps each
+asset to its hashed name, for the next build and for deployment tools.
+Assets whose size and modification time did not change are not hashed
+again, so only changed assets get new names. Hashed copies of assets that
+changed or are gone are removed, the plain copies are kept.
+
+Rendered pages refer to the hashed names: templates through the `asset`
+global (e.g. `{{ asset("/style.css") }}`, see `AssetManifest.url`), the
+converted markdown through `AssetManifest.rewrite`, which rewrites the
+`src` and `href` attributes of the content while the page is rendered.
+References within CSS files (e.g. `@import`) are not rewritten.
+
+"""
+
+import hashlib
+import json
+import logging
+import os
+import posixpath
+import re
+from collections.abc import Iterable, Iterator
+from typing import Any
+from urllib.parse import urlsplit, urlunsplit
+
+from blag.manifest import digest
+from blag.sync import copy_file, write_file
+
+logger = logging.getLogger(__name__)
+
+ASSET_MANIFEST = ".blag-assets.json"
+ASSET_MANIFEST_VERSION = 1
+# number of hex digits of the hash in the hashed names
+HASH_LENGTH = 8
+
+_TAG = re.compile(r"""<[\w-]+(?:[^>"']|"[^"]*"|'[^']*')*>""")
+_URL_ATTRIBUTE = re.compile(
+    r"""(\s(?:src|href)\s*=\s*)(?:"([^"]*)"|'([^']*)')""", re.IGNORECASE
+)
+
+
+def hashed_name(path: str, hash_: str) -> str:
+    """Get the hashed name of an asset.
+
+    Parameters
+    ----------
+    path
+        relative path of the asset
+    hash_
+        hex digest of the asset's content
+
+    Returns
+    -------
+    str
+        `path` with the first `HASH_LENGTH` digits of `hash_` inserted
+        before its extension
+
+    """
+    root, ext = posixpath.splitext(path)
+    return f"{root}.{hash_[:HASH_LENGTH]}{ext}"
+
+
+def file_digest(path: str) -> str:
+    """Compute the hex digest of the content of `path`.
+
+    Parameters
+    ----------
+    path
+
+    Returns
+    -------
+    str
+
+    """
+    sha = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1024 * 1024), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def asset_paths(directories: Iterable[str]) -> Iterator[str]:
+    """Find the assets in `directories`.
+
+    Parameters
+    ----------
+    directories
+        the static and the input directory, missing ones are skipped
+
+    Yields
+    ------
+    str
+        relative paths of all files but markdown files, with `/` as
+        separator
+
+    """
+    for directory in directories:
+        for root, _, filenames in os.walk(directory):
+            rel = os.path.relpath(root, directory)
+            for filename in filenames:
+                if filename.endswith(".md"):
+                    continue
+                path = os.path.normpath(os.path.join(rel, filename))
+                yield path.replace(os.sep, "/")
+
+
+def plain_url(url: str) -> str:
+    """Return `url` as it is.
+
+    This is the `asset` template global if the assets are not
+    fingerprinted.
+
+    Parameters
+    ----------
+    url
+
+    Returns
+    -------
+    str
+
+    """
+    return url
+
+
+class AssetManifest:
+    """The asset manifest.
+
+    `entries` maps the relative path of each asset to its hashed name
+    (`name`) and the size and modification time of the file it was hashed
+    from.
+
+    Parameters
+    ----------
+    output_dir
+        the output directory, the assets and the manifest are stored in it
+
+    """
+
+    def __init__(self, output_dir: str):
+        self.output_dir = output_dir
+        self.entries: dict[str, dict[str, Any]] = {}
+
+    @property
+    def path(self) -> str:
+        """Path of the asset manifest."""
+        return os.path.join(self.output_dir, ASSET_MANIFEST)
+
+    @classmethod
+    def load(cls, output_dir: str) -> "AssetManifest":
+        """Load the asset manifest from `output_dir`.
+
+        If there is no manifest, or it cannot be read, an empty manifest is
+        returned and all assets are hashed again.
+
+        Parameters
+        ----------
+        output_dir
+
+        Returns
+        -------
+        AssetManifest
+
+        """
+        manifest = cls(output_dir)
+        try:
+            with open(manifest.path) as fh:
+                data = json.load(fh)
+        except FileNotFoundError:
+            return manifest
+        except ValueError:
+            logger.warning(f"Ignoring corrupt asset manifest {manifest.path}.")
+            return manifest
+        if data.get("version") == ASSET_MANIFEST_VERSION:
+            manifest.entries = data["assets"]
+        return manifest
+
+    def save(self) -> None:
+        """Save the asset manifest."""
+        write_file(
+            self.path,
+            json.dumps(
+                dict(version=ASSET_MANIFEST_VERSION, assets=self.entries),
+                indent=2,
+                sort_keys=True,
+            ),
+        )
+
+    @property
+    def fingerprint(self) -> str:
+        """Digest of the hashed names, see `blag.manifest`."""
+        return digest(
+            json.dumps(
+                sorted((p, e["name"]) for p, e in self.entries.items())
+            )
+        )
+
+    def update(self, paths: Iterable[str]) -> tuple[int, int]:
+        """Hash the assets and write their hashed copies.
+
+        The hashed copies are hard links to (or, where that is not possible,
+        copies of) the assets in the output directory. Assets that are not
+        in `paths` are forgotten.
+
+        Parameters
+        ----------
+        paths
+            relative paths of the assets, see `asset_paths`
+
+        Returns
+        -------
+        tuple[int, int]
+            number of hashed and skipped assets
+
+        """
+        entries: dict[str, dict[str, Any]] = {}
+        hashed = skipped = 0
+        for path in paths:
+            if path in entries:
+                continue
+            src = os.path.join(self.output_dir, path)
+            try:
+                stat = os.stat(src)
+            except FileNotFoundError:
+                continue
+            entry = self.entries.get(path)
+            if entry is not None and self._up_to_date(entry, stat):
+                entries[path] = entry
+                skipped += 1
+                continue
+            name = hashed_name(path, file_digest(src))
+            logger.debug(f"Hashing {path} as {name}.")
+            copy_file(src, os.path.join(self.output_dir, name), "hardlink")
+            entries[path] = dict(
+                name=name, size=stat.st_size, mtime=stat.st_mtime_ns
+            )
+            hashed += 1
+
+        for path, entry in self.entries.items():
+            if entries.get(path, {}).get("name") != entry["name"]:
+                try:
+                    os.remove(os.path.join(self.output_dir, entry["name"]))
+                except FileNotFoundError:
+                    pass
+        self.entries = entries
+        return hashed, skipped
+
+    def _up_to_date(self, entry: dict[str, Any], stat: os.stat_result) -> bool:
+        """Check if the hashed copy of `entry` matches the asset `stat`."""
+        return (
+            entry["size"] == stat.st_size
+            and entry["mtime"] == stat.st_mtime_ns
+            and os.path.exists(os.path.join(self.output_dir, entry["name"]))
+        )
+
+    def url(self, url: str) -> str:
+        """Get the URL of the hashed copy of an asset.
+
+        This is the `asset` template global.
+
+        Parameters
+        ----------
+        url
+            URL of the asset, relative to the site's root, with or without
+            leading slash
+
+        Returns
+        -------
+        str
+            the URL of the hashed copy, or `url` if it is no asset
+
+        """
+        return self._resolve(url, "")
+
+    def rewrite(self, html: str, dst: str) -> str:
+        """Point the links in `html` to the hashed copies of the assets.
+
+        The `src` and `href` attributes of all tags are rewritten, relative
+        URLs are resolved against `dst`.
+
+        Parameters
+        ----------
+        html
+        dst
+            relative path of the page `html` is part of
+
+        Returns
+        -------
+        str
+
+        """
+        base = posixpath.dirname(dst)
+
+        def attribute(match: re.Match[str]) -> str:
+            quote = '"' if match[2] is not None else "'"
+            url = match[2] if match[2] is not None else match[3]
+            return f"{match[1]}{quote}{self._resolve(url, base)}{quote}"
+
+        return _TAG.sub(
+            lambda tag: _URL_ATTRIBUTE.sub(attribute, tag.group()), html
+        )
+
+    def _resolve(self, url: str, base: str) -> str:
+        """Resolve `url` relative to the directory `base`."""
+        scheme, netloc, path, query, fragment = urlsplit(url)
+        if scheme or netloc or not path:
+            return url
+        if path.startswith("/"):
+            rel = path[1:]
+        else:
+            rel = posixpath.normpath(posixpath.join(base, path))
+        entry = self.entries.get(rel)
+        if entry is None:
+            return url
+        # the hashed copy is next to the asset
+        name: str = posixpath.basename(entry["name"])
+        path = path[: len(path) - len(posixpath.basename(path))] + name
+        return urlunsplit((scheme, netloc, path, query, fragment))
@@ -0,0 +1,354 @@
+"""Benchmarks.
+
+This module measures blag's performance on synthetic sites. `generate_corpus`
+creates a reproducible site with a given number of articles and tags, where a
+share of the articles contains code blocks, footnotes and images.
+`benchmark` builds such sites of several sizes and measures the wall time of
+each stage of the build (see `blag.blag.BuildSession.build`).
+
+The results can be saved as baseline and compared with later runs, to catch
+performance regressions before a release:
+
+```sh
+$ python -m blag.benchmark --save baseline.json
+$ python -m blag.benchmark --baseline baseline.json
+```
+
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Any
+
+import blag
+from blag.blag import BuildSession
+
+DEFAULT_SIZES = [100, 1000]
+# slowdowns of less seconds are noise, not regressions
+MIN_SLOWDOWN = 0.01
+# a 1x1 pixel png
+PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d49484452000000010000000108060000001f15c489"
+    "0000000b49444154789c6360000200000500017a5eab3f0000000049454e44ae426082"
+)
+WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod "
+    "tempor incididunt ut labore et dolore magna aliqua enim ad minim veniam "
+    "quis nostrud exercitation ullamco laboris nisi aliquip ex ea commodo"
+).split()
+CODE = '''
+```python
+def fibonacci(n: int) -> int:
+    """Compute the {i}th fibonacci number."""
+    a, b = 0, 1
+    for _ in range(n):
+        a, b = b, a + b
+    return a + {i}
+```
+'''
+CONFIG = """\
+[main]
+base_url = https://example.com/
+title = Benchmark
+description = A synthetic site
+author = blag
+"""
+
+
+def generate_corpus(
+    directory: str,
+    articles: int,
+    tags: int = 50,
+    code: float = 0.3,
+    footnotes: float = 0.2,
+    images: float = 0.2,
+    seed: int = 0,
+) -> None:
+    """Generate a synthetic site in `directory`.
+
+    The site consists of the configuration, the default templates, the
+    articles in `content` and some static files in `static`. The same
+    arguments always result in the same site.
+
+    Parameters
+    ----------
+    directory
+        where the site is created, it must not exist
+    articles
+        number of articles
+    tags
+        number of distinct tags, each article has one to three of them
+    code, footnotes, images
+        share of the articles with code blocks, footnotes and images,
+        respectively
+    seed
+        seed of the random number generator
+
+    """
+    rng = random.Random(seed)
+    os.makedirs(os.path.join(directory, "content", "images"))
+    shutil.copytree(
+        os.path.join(blag.__path__[0], "templates"),
+        os.path.join(directory, "templates"),
+    )
+    shutil.copytree(
+        os.path.join(blag.__path__[0], "static"),
+        os.path.join(directory, "static"),
+    )
+    with open(os.path.join(directory, "config.ini"), "w") as fh:
+        fh.write(CONFIG)
+
+    def sentence() -> str:
+        words = rng.choices(WORDS, k=rng.randint(8, 20))
+        return " ".join(words).capitalize() + "."
+
+    start = datetime(2000, 1, 1)
+    for i in range(articles):
+        date = start + timedelta(hours=i * 7)
+        article_tags = rng.sample(range(tags), k=min(rng.randint(1, 3), tags))
+        lines = [
+            f"title: Article {i}",
+            f"date: {date.isoformat(' ', 'minutes')}",
+            f"tags: {', '.join(f'tag{t}' for t in article_tags)}",
+            f"description: {sentence()}",
+            "",
+        ]
+        for _ in range(rng.randint(3, 8)):
+            lines.append(" ".join(sentence() for _ in range(4)))
+            lines.append("")
+        if rng.random() < code:
+            lines.append(CODE.format(i=i))
+        if rng.random() < images:
+            with open(
+                os.path.join(directory, "content", "images", f"{i}.png"),
+                "wb",
+            ) as image:
+                image.write(PNG)
+            lines.append(f"![image {i}](images/{i}.png)\n")
+        if rng.random() < footnotes:
+            lines.append(f"A statement.[^{i}]\n\n[^{i}]: {sentence()}\n")
+        # a link to another article
+        other = rng.randrange(i + 1)
+        lines.append(f"See also [an article](article{other}.md).")
+        with open(
+            os.path.join(directory, "content", f"article{i}.md"), "w"
+        ) as fh:
+            fh.write("\n".join(lines) + "\n")
+
+    with open(os.path.join(directory, "content", "about.md"), "w") as fh:
+        fh.write(f"title: About\n\n{sentence()}\n")
+
+
+def run_build(directory: str, jobs: int = 1) -> dict[str, float]:
+    """Build the site in `directory` and measure its stages.
+
+    The build uses no cache, so everything is converted.
+
+    Parameters
+    ----------
+    directory
+        the site, see `generate_corpus`
+    jobs
+        number of worker processes
+
+    Returns
+    -------
+    dict[str, float]
+        the wall time in seconds of each stage and of the whole build
+        (`total`)
+
+    """
+    cwd = os.getcwd()
+    os.chdir(directory)
+    try:
+        args = argparse.Namespace(
+            input_dir="content",
+            output_dir="build",
+            template_dir="templates",
+            static_dir="static",
+            jobs=jobs,
+            cache_dir=".blag-cache",
+            cache_size=0,
+            copy_mode="copy",
+            checksum=False,
+            staging=False,
+            profile=False,
+            precompress=False,
+            minify=False,
+            fingerprint_assets=False,
+        )
+        start = time.perf_counter()
+        session = BuildSession(args)
+        session.build()
+        timings = dict(session.timings, total=time.perf_counter() - start)
+    finally:
+        os.chdir(cwd)
+    return timings
+
+
+def benchmark(
+    sizes: list[int],
+    repeat: int = 3,
+    tags: int = 50,
+    jobs: int = 1,
+) -> dict[str, dict[str, float]]:
+    """Measure full builds of synthetic sites.
+
+    Each site is built `repeat` times from scratch, the fastest time of each
+    stage is reported.
+
+    Parameters
+    ----------
+    sizes
+        the numbers of articles of the sites
+    repeat
+        number of builds per site
+    tags
+        number of distinct tags
+    jobs
+        number of worker processes
+
+    Returns
+    -------
+    dict[str, dict[str, float]]
+        the timings (see `run_build`) by size
+
+    """
+    results: dict[str, dict[str, float]] = {}
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            directory = os.path.join(tmp, "site")
+            generate_corpus(directory, size, tags)
+            best: dict[str, float] = {}
+            for _ in range(repeat):
+                shutil.rmtree(os.path.join(directory, "build"), True)
+                timings = run_build(directory, jobs)
+                for stage, seconds in timings.items():
+                    best[stage] = min(best.get(stage, seconds), seconds)
+        results[str(size)] = best
+    return results
+
+
+def compare(
+    results: dict[str, dict[str, float]],
+    baseline: dict[str, dict[str, float]] | None = None,
+    threshold: float = 0.1,
+) -> tuple[str, bool]:
+    """Format the results as a table, compared with `baseline`.
+
+    Parameters
+    ----------
+    results
+        see `benchmark`
+    baseline
+        earlier results
+    threshold
+        relative slowdown of a stage that counts as regression, if it is
+        more than `MIN_SLOWDOWN` seconds
+
+    Returns
+    -------
+    tuple[str, bool]
+        the table and if there are regressions
+
+    """
+    lines = [f"{'size':>6}  {'stage':<14}{'time':>10}"]
+    if baseline is not None:
+        lines[0] += f"{'baseline':>10}{'change':>9}"
+    regression = False
+    for size, timings in results.items():
+        for stage, seconds in timings.items():
+            line = f"{size:>6}  {stage:<14}{seconds:>9.3f}s"
+            previous = (baseline or {}).get(size, {}).get(stage)
+            if previous:
+                change = seconds / previous - 1
+                line += f"{previous:>9.3f}s{change:>+9.1%}"
+                if change > threshold and seconds - previous > MIN_SLOWDOWN:
+                    regression = True
+                    line += "  slower"
+            lines.append(line)
+    return "\n".join(lines), regression
+
+
+def main(arguments: list[str] | None = None) -> None:
+    """Run the benchmarks.
+
+    Parameters
+    ----------
+    arguments
+        command line arguments, used for testing
+
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m blag.benchmark",
+        description="Measure the build of synthetic sites.",
+    )
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=DEFAULT_SIZES,
+        help="Numbers of articles (default: 100 1000)",
+    )
+    parser.add_argument(
+        "--tags",
+        type=int,
+        default=50,
+        help="Number of distinct tags (default: 50)",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Number of builds per size, the fastest counts (default: 3)",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of worker processes (default: 1)",
+    )
+    parser.add_argument(
+        "--save",
+        help="Save the results as JSON",
+    )
+    parser.add_argument(
+        "--baseline",
+        help="Compare with results saved with --save",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Relative slowdown that counts as regression (default: 0.1)",
+    )
+    args = parser.parse_args(arguments)
+    # only report problems, not the progress of each build
+    logging.getLogger("blag").setLevel(logging.WARNING)
+
+    results = benchmark(args.sizes, args.repeat, args.tags, args.jobs)
+    baseline: dict[str, Any] | None = None
+    if args.baseline is not None:
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)
+    table, regression = compare(results, baseline, args.threshold)
+    print(table)
+    if args.save is not None:
+        with open(args.save, "w") as fh:
+            json.dump(results, fh, indent=2)
+    if regression:
+        print(f"Regression: stages are more than {args.threshold:.0%} slower.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,144 +4,82 @@
 
 import argparse
 import configparser
+import copy
+import cProfile
+import json
 import logging
 import os
+import posixpath
 import shutil
 import sys
+import time
+from collections.abc import Callable, Iterable, Iterator, Mapping, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from itertools import islice
 from typing import Any
-
-import feedgenerator
-from jinja2 import Environment, FileSystemLoader, Template, TemplateNotFound
+from urllib.parse import quote
+
+from jinja2 import (
+    BaseLoader,
+    BytecodeCache,
+    Environment,
+    Template,
+    TemplateNotFound,
+)
+from markdown import Markdown
 
 import blag
-from blag.devserver import serve
-from blag.markdown import convert_markdown, markdown_factory
-from blag.quickstart import quickstart
-from blag.version import __VERSION__
-
-logger = logging.getLogger(__name__)
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s %(levelname)s %(name)s %(message)s",
+from blag.assets import AssetManifest, asset_paths, plain_url
+from blag.cache import Cache
+
+# the CLI moved to `blag.cli`, `blag.blag:main` is still the entry point of
+# existing installations
+from blag.cli import main as main
+from blag.cli import parse_args as parse_args
+from blag.dependencies import template_fingerprints
+from blag.feed import StreamingAtomFeed
+from blag.index import ArticleIndex
+from blag.manifest import (
+    Manifest,
+    deserialize_context,
+    digest,
+    serialize_context,
 )
+from blag.markdown import (
+    convert_markdown,
+    markdown_factory,
+    markdown_fingerprint,
+    memoize_highlighting,
+)
+from blag.minify import Minifier
+from blag.precompress import precompress
+from blag.profiling import BuildProfile
+from blag.sitemap import MAX_URLS, shard_name, write_index, write_urlset
+from blag.sync import (
+    stage,
+    swap,
+    sync_file,
+    sync_tree,
+    write_file,
+    write_stream,
+    write_with,
+)
+from blag.theme import bytecode_cache, loader_factory
+from blag.version import __VERSION__
 
+# the templates a site consists of
+TEMPLATES = [
+    "page.html",
+    "article.html",
+    "index.html",
+    "archive.html",
+    "tags.html",
+    "tag.html",
+]
 
-def main(arguments: list[str] | None = None) -> None:
-    """Run the CLI.
-
-    This method parses the CLI arguments and executes the respective
-    commands.
-
-    Parameters
-    ----------
-    arguments
-        optional parameters, used for testing
-
-    """
-    args = parse_args(arguments)
-    # set loglevel
-    if args.verbose:
-        logger.setLevel(logging.DEBUG)
-    logger.debug(f"This is blag {__VERSION__}.")
-    args.func(args)
-
-
-def parse_args(args: list[str] | None = None) -> argparse.Namespace:
-    """Parse command line arguments.
-
-    Parameters
-    ----------
-    args
-        optional parameters, used for testing
-
-    Returns
-    -------
-    arparse.Namespace
-
-    """
-    parser = argparse.ArgumentParser()
-    parser.add_argument(
-        "--version",
-        action="version",
-        version="%(prog)s " + __VERSION__,
-    )
-    parser.add_argument(
-        "-v",
-        "--verbose",
-        action="store_true",
-        help="Verbose output.",
-    )
-
-    commands = parser.add_subparsers(dest="command")
-    commands.required = True
-
-    build_parser = commands.add_parser(
-        "build",
-        help="Build website.",
-    )
-    build_parser.set_defaults(func=build)
-    build_parser.add_argument(
-        "-i",
-        "--input-dir",
-        default="content",
-        help="Input directory (default: content)",
-    )
-    build_parser.add_argument(
-        "-o",
-        "--output-dir",
-        default="build",
-        help="Ouptut directory (default: build)",
-    )
-    build_parser.add_argument(
-        "-t",
-        "--template-dir",
-        default="templates",
-        help="Template directory (default: templates)",
-    )
-    build_parser.add_argument(
-        "-s",
-        "--static-dir",
-        default="static",
-        help="Static directory (default: static)",
-    )
-
-    quickstart_parser = commands.add_parser(
-        "quickstart",
-        help="Quickstart blag, creating necessary configuration.",
-    )
-    quickstart_parser.set_defaults(func=quickstart)
-
-    serve_parser = commands.add_parser(
-        "serve",
-        help="Start development server.",
-    )
-    serve_parser.set_defaults(func=serve)
-    serve_parser.add_argument(
-        "-i",
-        "--input-dir",
-        default="content",
-        help="Input directory (default: content)",
-    )
-    serve_parser.add_argument(
-        "-o",
-        "--output-dir",
-        default="build",
-        help="Ouptut directory (default: build)",
-    )
-    serve_parser.add_argument(
-        "-t",
-        "--template-dir",
-        default="templates",
-        help="Template directory (default: templates)",
-    )
-    serve_parser.add_argument(
-        "-s",
-        "--static-dir",
-        default="static",
-        help="Static directory (default: static)",
-    )
-
-    return parser.parse_args(args)
+logger = logging.getLogger(__name__)
 
 
 def get_config(configfile: str) -> configparser.SectionProxy:
@@ -178,27 +116,38 @@ def get_config(configfile: str) -> configparser.SectionProxy:
 def environment_factory(
     template_dir: str,
     globals_: dict[str, object] | None = None,
+    cache_dir: str | None = None,
 ) -> Environment:
     """Environment factory.
 
     Creates a Jinja2 Environment with the templates from `template_dir` loaded.
     If `globals` are provided, they are attached to the environment and thus
-    available to all contexts.
+    available to all contexts. The `asset` global (see `blag.assets`)
+    defaults to `blag.assets.plain_url`.
+
+    `template_dir` can also be a theme precompiled with `blag
+    compile-templates`, see `blag.theme`.
 
     Parameters
     ----------
     template_dir
         directory containing the templates
     globals_
+    cache_dir
+        if given, the compiled templates are cached in this directory
 
     Returns
     -------
     jinja2.Environment
 
     """
-    env = Environment(loader=FileSystemLoader(template_dir))
+    env = Environment(
+        loader=loader_factory(template_dir),
+        bytecode_cache=bytecode_cache(cache_dir) if cache_dir else None,
+    )
+    env.globals["asset"] = plain_url
     if globals_:
-        env.globals = globals_
+        env.globals = dict(asset=plain_url) | globals_
     return env
 
 
@@ -206,20 +155,723 @@ def build(args: argparse.Namespace) -> None:
     """Build the site.
 
     This is blag's main method that builds the site, generates the feed
-    etc.
+    etc. See `BuildSession`.
+
+    If `args.staging` is set, the site is built into a staging directory
+    (see `blag.sync.stage`), which replaces the output directory once the
+    build succeeded.
+
+    If `args.profile` is set, the metrics of the build are printed (see
+    `blag.profiling`), `args.metrics` is the path they are written to as
+    JSON, and `args.cprofile` the path of the cProfile stats of the build.
+
+    If `args.precompress` is set, compressed sidecars of the outputs are
+    written after the build (see `BuildSession.precompress`).
 
     Parameters
     ----------
     args
 
     """
-    os.makedirs(f"{args.output_dir}", exist_ok=True)
+    if args.metrics or args.cprofile:
+        args = copy.copy(args)
+        args.profile = True
+    if not args.staging:
+        session = _build(args)
+    else:
+        staging = stage(args.output_dir)
+        staged_args = copy.copy(args)
+        staged_args.output_dir = staging
+        try:
+            session = _build(staged_args)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        swap(staging, args.output_dir)
+
+    if session.profile is not None:
+        print(session.profile.report())
+        if args.metrics:
+            with open(args.metrics, "w") as fh:
+                json.dump(session.profile.metrics(), fh, indent=2)
+
+
+def _build(args: argparse.Namespace) -> "BuildSession":
+    """Build and precompress the site, see `build`.
+
+    With cProfile if `args.cprofile` is set.
+
+    """
+    session = BuildSession(args)
+
+    def run() -> None:
+        session.build()
+        if args.precompress:
+            session.precompress()
+
+    if not args.cprofile:
+        run()
+        return session
+    profiler = cProfile.Profile()
+    try:
+        profiler.runcall(run)
+    finally:
+        profiler.dump_stats(args.cprofile)
+    return session
+
+
+class BuildSession:
+    """A build session.
+
+    The session holds everything needed to build the site: the
+    configuration, the templates, a Markdown instance, the manifest and the
+    contexts of all markdown files. `build` builds the whole site
+    (incrementally, see `blag.manifest`), `update` rebuilds only what is
+    affected by a set of changed paths, without walking the input directory
+    or reading unchanged files. The devserver keeps one session for all
+    rebuilds.
+
+    Parameters
+    ----------
+    args
+        contains the input-, output-, template- and static dir and the
+        build options
+
+    """
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.cache = None
+        if args.cache_size > 0:
+            self.cache = Cache(args.cache_dir, args.cache_size * 1024 * 1024)
+        self.manifest: Manifest | None = None
+        self.md: Markdown | None = None
+        # contexts of all markdown files by their relative destination
+        self.contexts: dict[str, dict[str, Any]] = {}
+        # True if the outputs were updated since the manifest was saved
+        self.dirty = False
+        # outputs written by the last `update`
+        self.written: set[str] = set()
+        # wall time in seconds of the stages of the last build, see `stage`
+        self.timings: dict[str, float] = {}
+        # metrics of the last build or update, if profiling is enabled
+        self.profile: BuildProfile | None = None
+        self.minifier = Minifier(self.cache) if args.minify else None
+        # transformations of copied files, see `blag.sync.sync_tree`
+        self.transforms = self.minifier.transforms() if self.minifier else None
+        self.assets: AssetManifest | None = None
+        if args.fingerprint_assets:
+            self.assets = AssetManifest.load(args.output_dir)
+        self.load()
+
+    def load(self) -> None:
+        """Load the configuration and the templates."""
+        self.config = get_config("config.ini")
+        self.config_mtime = _mtime("config.ini")
+        self.per_page = self.config.getint("per_page", fallback=0)
+        # serialized entries of the last feed, see `generate_feed`
+        self.feed_entries: dict[str, str] = {}
+        self.env = environment_factory(
+            self.args.template_dir,
+            dict(
+                site=self.config,
+                asset=plain_url if self.assets is None else self.assets.url,
+            ),
+            self.args.cache_dir if self.cache is not None else None,
+        )
+        self.templates: dict[str, Template] = {}
+        try:
+            for name in TEMPLATES:
+                self.templates[name] = self.env.get_template(name)
+        except TemplateNotFound as exc:
+            tmpl = os.path.join(blag.__path__[0], "templates")
+            logger.error(
+                f'Template "{exc.name}" not found in '
+                f"{self.args.template_dir}! "
+                "Consider running `blag quickstart` or copying the "
+                f"missing template from {tmpl}."
+            )
+
+            sys.exit(1)
+
+        self.fingerprints = dict(
+            blag=__VERSION__,
+            markdown=markdown_fingerprint(),
+            site=digest(repr(sorted(self.config.items()))),
+        )
+        if self.minifier is not None:
+            self.fingerprints["minify"] = self.minifier.fingerprint
+        self.template_fingerprints = template_fingerprints(
+            self.env, TEMPLATES
+        )
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Measure the wall time of the stage `name`.
+
+        The time is added to `timings[name]`.
+
+        Parameters
+        ----------
+        name
+            name of the stage
+
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.timings[name] = self.timings.get(name, 0) + elapsed
+
+    def build(self) -> None:
+        """Build the site.
+
+        The wall times of the stages (`walk`, `static`, `markdown`,
+        `article_index`, `feed`, `index`, `archive`, `tags`, `sitemap` and
+        `finish`) are stored in `timings`.
+
+        """
+        args = self.args
+        self._reset_metrics()
+        profile = self.profile
+        os.makedirs(f"{args.output_dir}", exist_ok=True)
+        with self.stage("walk"):
+            convertibles = collect_files(
+                args.input_dir,
+                args.output_dir,
+                args.copy_mode,
+                args.checksum,
+                self.transforms,
+            )
+
+        # copy static files over
+        logger.info("Copying static files.")
+        if os.path.exists(args.static_dir):
+            with self.stage("static"):
+                copied, skipped = sync_tree(
+                    args.static_dir,
+                    args.output_dir,
+                    args.copy_mode,
+                    args.checksum,
+                    self.transforms,
+                )
+            logger.debug(
+                f"Copied {copied} static files, {skipped} up to date."
+            )
+            if profile is not None:
+                profile.count("static_copied", copied)
+                profile.count("static_skipped", skipped)
+
+        self.update_assets()
+
+        if self.manifest is None:
+            manifest = Manifest.load(
+                args.output_dir, self.fingerprints, self.template_fingerprints
+            )
+        else:
+            manifest = self.manifest.renew(
+                self.fingerprints, self.template_fingerprints
+            )
+
+        with self.stage("markdown"):
+            articles, pages = process_markdown(
+                convertibles,
+                args.input_dir,
+                args.output_dir,
+                self.templates["page.html"],
+                self.templates["article.html"],
+                manifest,
+                args.jobs,
+                self.cache,
+                profile,
+                self.minifier,
+                self.assets,
+            )
+        self.contexts = dict(articles + pages)
+
+        # the listings only need to be regenerated if the articles or their
+        # templates changed
+        articles_changed = manifest.articles_changed(articles)
+        self._update_index(articles, manifest)
+        records = article_records(articles, self._content)
+        if articles_changed or manifest.needs_render("atom.xml"):
+            self.generate_feed(records, manifest)
+        if articles_changed or manifest.needs_render(
+            "index.html", "index.html"
+        ):
+            self.generate_index(records, manifest)
+        if articles_changed or manifest.needs_render(
+            "archive.html", "archive.html"
+        ):
+            self.generate_archive(records, manifest)
+        if (
+            articles_changed
+            or manifest.needs_render("tags/index.html", "tags.html")
+            or manifest.template_changed("tag.html")
+        ):
+            self.generate_tags(records, manifest)
+        self.generate_sitemap(articles, manifest)
+
+        with self.stage("finish"):
+            manifest.remove_stale()
+            manifest.save()
+            manifest.settle()
+            if self.assets is not None:
+                self.assets.save()
+            if self.cache is not None:
+                self.cache.evict()
+        self.manifest = manifest
+        self.dirty = False
+
+    def update(self, changed: set[str]) -> set[str] | None:
+        """Rebuild the site after `changed` paths changed.
+
+        Changed markdown files are converted and rendered, deleted ones are
+        removed from the output, other files in the input and static
+        directories are copied. If markdown files changed, the sitemap is
+        regenerated. If articles changed, the feed, index and archive, and
+        the tag pages of their tags (old and new ones) are regenerated.
+
+        Changed templates, a changed configuration, changed directories or,
+        if the assets are fingerprinted, changed assets trigger a `build`.
+
+        `update` does not save the manifest, `close` does. Meanwhile, the
+        saved manifest is removed, so an interrupted session does not leave
+        a manifest behind that does not match the outputs.
+
+        Parameters
+        ----------
+        changed
+            the changed paths, as reported by `blag.watch.Watcher.wait`
+
+        Returns
+        -------
+        set[str] | None
+            the written (or removed) outputs, relative to the output
+            directory, None if the whole site was built
+
+        """
+        if self.manifest is None or self._needs_build(changed):
+            self.build()
+            return None
+
+        self.written = set()
+        self._reset_metrics()
+        if not self.dirty:
+            self.manifest.invalidate()
+            self.dirty = True
+
+        args = self.args
+        # tags of the changed articles, None if no article changed
+        tags: set[str] | None = None
+        markdown = False
+        memoize_highlighting(self.cache)
+        try:
+            with self.stage("files"):
+                for path in sorted(changed):
+                    src = _relative(path, args.input_dir)
+                    if src is None:
+                        src = _relative(path, args.static_dir)
+                        if src is not None:
+                            self._copy(path, src)
+                    elif src.endswith(".md"):
+                        markdown = True
+                        article_tags = self._update_markdown(src)
+                        if article_tags is not None:
+                            tags = (tags or set()) | article_tags
+                    else:
+                        self._copy(path, src)
+        finally:
+            memoize_highlighting(None)
+
+        if not markdown:
+            return self.written
+        articles = sorted(
+            (item for item in self.contexts.items() if "date" in item[1]),
+            key=lambda x: x[1]["date"],
+            reverse=True,
+        )
+        self.manifest.articles_changed(articles)
+        self.written.update(self.generate_sitemap(articles, self.manifest))
+        if tags is None:
+            return self.written
+        self._update_index(articles, self.manifest)
+        records = article_records(articles, self._content)
+        self.written.update(self.generate_feed(records, self.manifest))
+        self.written.update(self.generate_index(records, self.manifest))
+        self.written.update(self.generate_archive(records, self.manifest))
+        self.written.update(self.generate_tags(records, self.manifest, tags))
+        return self.written
+
+    def update_assets(self) -> None:
+        """Hash the changed assets and update the asset manifest.
+
+        See `blag.assets`, nothing happens unless the assets are
+        fingerprinted. The wall time is stored in `timings["assets"]` and
+        the fingerprint of the hashed names in `fingerprints`, so all
+        outputs are rendered again if any hashed name changed.
+
+        """
+        if self.assets is None:
+            return
+        args = self.args
+        logger.info("Fingerprinting assets.")
+        with self.stage("assets"):
+            hashed, skipped = self.assets.update(
+                asset_paths([args.static_dir, args.input_dir])
+            )
+        logger.debug(f"Hashed {hashed} assets, {skipped} up to date.")
+        if self.profile is not None:
+            self.profile.count("assets_hashed", hashed)
+            self.profile.count("assets_skipped", skipped)
+        self.fingerprints["assets"] = self.assets.fingerprint
+
+    def precompress(self) -> None:
+        """Write compressed sidecars of the outputs that changed.
+
+        See `blag.precompress`. The wall time is stored in
+        `timings["precompress"]`.
+
+        """
+        logger.info("Precompressing outputs.")
+        with self.stage("precompress"):
+            compressed, skipped = precompress(self.args.output_dir)
+        logger.debug(f"Compressed {compressed} files, {skipped} up to date.")
+        if self.profile is not None:
+            self.profile.count("precompressed", compressed)
+            self.profile.count("precompress_skipped", skipped)
+
+    def _reset_metrics(self) -> None:
+        """Reset `timings` and `profile` for a new build or update."""
+        self.timings = {}
+        self.profile = None
+        if self.args.profile:
+            self.profile = BuildProfile()
+            self.profile.stages = self.timings
+
+    def _listings(self, written: list[str]) -> list[str]:
+        """Count the written listing pages, if profiling is enabled."""
+        if self.profile is not None:
+            self.profile.count("listings_written", len(written))
+        return written
+
+    def close(self) -> None:
+        """Save the manifest, if it was not saved since an update."""
+        if self.manifest is not None and self.dirty:
+            self.manifest.save()
+            self.dirty = False
+
+    def _needs_build(self, changed: set[str]) -> bool:
+        """Check if `changed` requires a full build.
+
+        If the templates or the configuration changed, they are reloaded.
+        If the assets are fingerprinted, changed assets require a build as
+        well, as all outputs might refer to them.
+
+        """
+        if _mtime("config.ini") != self.config_mtime or any(
+            _relative(path, self.args.template_dir) is not None
+            for path in changed
+        ):
+            self.load()
+            return True
+        if self.assets is not None and any(
+            _relative(path, directory) is not None
+            for path in changed
+            if not path.endswith(".md")
+            for directory in (self.args.static_dir, self.args.input_dir)
+        ):
+            return True
+        return any(os.path.isdir(path) for path in changed)
+
+    def _copy(self, path: str, rel: str) -> None:
+        """Copy a changed file to the output directory."""
+        if not os.path.isfile(path):
+            # like `build`, keep copies of deleted files
+            return
+        dst = os.path.join(self.args.output_dir, rel)
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        transform = None
+        if self.transforms is not None:
+            transform = self.transforms.get(os.path.splitext(rel)[1])
+        if sync_file(
+            path, dst, self.args.copy_mode, self.args.checksum, transform
+        ):
+            self.written.add(rel)
+
+    def _update_markdown(self, src: str) -> set[str] | None:
+        """Convert and render a changed markdown file.
+
+        Returns the tags of the file if it was or is an article, otherwise
+        None.
+
+        """
+        assert self.manifest is not None
+        output_dir = self.args.output_dir
+        dst = src[:-3] + ".html"
+        previous = self.contexts.pop(dst, None)
+        try:
+            with open(os.path.join(self.args.input_dir, src)) as fh:
+                body = fh.read()
+                mtime = os.fstat(fh.fileno()).st_mtime
+        except FileNotFoundError:
+            logger.info(f"Removing {dst}, its source {src} is gone.")
+            self.manifest.forget(src)
+            try:
+                os.remove(os.path.join(output_dir, dst))
+            except FileNotFoundError:
+                pass
+            self.written.add(dst)
+            return _article_tags(previous)
+
+        hash_ = digest(body)
+        entry = self.manifest.sources.get(src)
+        if previous is not None and entry and entry["hash"] == hash_:
+            # only touched
+            self.contexts[dst] = previous
+            return None
+
+        logger.info(f"Processing {src}")
+        context = None
+        if self.cache is not None:
+            context = _cache_get(self.cache, hash_)
+        converted = context is None
+        if converted and self.md is None:
+            self.md = markdown_factory()
+        os.makedirs(
+            os.path.dirname(os.path.join(output_dir, dst)), exist_ok=True
+        )
+        context, convert, render, written = _convert_and_render(
+            self.md,
+            self.templates["page.html"],
+            self.templates["article.html"],
+            dst,
+            body,
+            context,
+            output_dir,
+            self.minifier,
+            self.assets,
+        )
+        if self.profile is not None:
+            self.profile.count("sources")
+            self.profile.add_file(dst, convert, render, written)
+        if converted and self.cache is not None:
+            _cache_set(self.cache, hash_, context)
+        self.manifest.record(src, dst, hash_, context, mtime)
+        self.contexts[dst] = context
+        self.written.add(dst)
+
+        tags = _article_tags(previous)
+        if tags is None:
+            return _article_tags(context)
+        return tags | (_article_tags(context) or set())
+
+    def _content(self, dst: str) -> str:
+        """Load the content of an unchanged markdown file.
+
+        The converted content is looked up in the cache, if it is not there
+        the file is converted again.
+
+        """
+        src = dst[:-5] + ".md"
+        with open(os.path.join(self.args.input_dir, src)) as fh:
+            body = fh.read()
+        hash_ = digest(body)
+        if self.cache is not None:
+            context = _cache_get(self.cache, hash_)
+            if context is not None:
+                content: str = context["content"]
+                return content
+        logger.debug(f"Converting {src} again, its content is not cached.")
+        if self.md is None:
+            self.md = markdown_factory()
+        content, meta = convert_markdown(self.md, body)
+        if self.cache is not None:
+            _cache_set(self.cache, hash_, dict(content=content) | meta)
+        return content
+
+    def _update_index(
+        self,
+        articles: Sequence[tuple[str, Mapping[str, Any]]],
+        manifest: Manifest,
+    ) -> None:
+        """Update the article index, see `blag.index.ArticleIndex`."""
+        with self.stage("article_index"):
+            index = ArticleIndex(self.args.output_dir)
+            try:
+                index.update(articles, manifest.hashes)
+            finally:
+                index.close()
+
+    def generate_feed(
+        self,
+        articles: Sequence[tuple[str, Mapping[str, Any]]],
+        manifest: Manifest,
+    ) -> list[str]:
+        """Generate the feed, see `generate_feed`."""
+        with self.stage("feed"):
+            return self._listings(
+                generate_feed(
+                    articles,
+                    self.args.output_dir,
+                    base_url=self.config["base_url"],
+                    blog_title=self.config["title"],
+                    blog_description=self.config["description"],
+                    blog_author=self.config["author"],
+                    entries=self.config.getint("feed_entries", fallback=0),
+                    summary_only=self.config.getboolean(
+                        "feed_summary_only", fallback=False
+                    ),
+                    manifest=manifest,
+                    serialized=self.feed_entries,
+                )
+            )
+
+    def generate_index(
+        self,
+        articles: Sequence[tuple[str, Mapping[str, Any]]],
+        manifest: Manifest,
+    ) -> list[str]:
+        """Generate the index page, see `generate_index`."""
+        with self.stage("index"):
+            return self._listings(
+                generate_index(
+                    articles,
+                    self.templates["index.html"],
+                    self.args.output_dir,
+                    self.per_page,
+                    manifest,
+                    self.minifier,
+                )
+            )
+
+    def generate_archive(
+        self,
+        articles: Sequence[tuple[str, Mapping[str, Any]]],
+        manifest: Manifest,
+    ) -> list[str]:
+        """Generate the archive pages, see `generate_archive`."""
+        with self.stage("archive"):
+            return self._listings(
+                generate_archive(
+                    articles,
+                    self.templates["archive.html"],
+                    self.args.output_dir,
+                    self.per_page,
+                    manifest,
+                    self.minifier,
+                )
+            )
+
+    def generate_tags(
+        self,
+        articles: Sequence[tuple[str, Mapping[str, Any]]],
+        manifest: Manifest,
+        only: set[str] | None = None,
+    ) -> list[str]:
+        """Generate the tag pages, see `generate_tags`."""
+        with self.stage("tags"):
+            return self._listings(
+                generate_tags(
+                    articles,
+                    self.templates["tags.html"],
+                    self.templates["tag.html"],
+                    self.args.output_dir,
+                    only,
+                    self.per_page,
+                    manifest,
+                    self.minifier,
+                )
+            )
+
+    def generate_sitemap(
+        self,
+        articles: Sequence[tuple[str, Mapping[str, Any]]],
+        manifest: Manifest,
+    ) -> list[str]:
+        """Generate the sitemap, see `generate_sitemap`.
+
+        The pages are listed first, then the articles from the oldest to
+        the newest, so a new article only changes the last shard.
+
+        """
+        pages = sorted(
+            (item for item in self.contexts.items() if "date" not in item[1]),
+            key=lambda x: x[0],
+        )
+        with self.stage("sitemap"):
+            return self._listings(
+                generate_sitemap(
+                    [*pages, *reversed(articles)],
+                    manifest.lastmod(),
+                    self.args.output_dir,
+                    self.config["base_url"],
+                    manifest=manifest,
+                )
+            )
+
+
+def _mtime(path: str) -> int | None:
+    """Get the modification time of `path`, None if it does not exist."""
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _relative(path: str, directory: str) -> str | None:
+    """Get `path` relative to `directory`, None if it is not below it."""
+    rel = os.path.relpath(os.path.abspath(path), os.path.abspath(directory))
+    if rel.split(os.sep)[0] == os.pardir:
+        return None
+    return rel
+
+
+def _article_tags(context: dict[str, Any] | None) -> set[str] | None:
+    """Get the tags of an article, None if `context` is no article."""
+    if context is None or "date" not in context:
+        return None
+    return set(context.get("tags", []))
+
+
+def collect_files(
+    input_dir: str,
+    output_dir: str,
+    strategy: str = "copy",
+    checksum: bool = False,
+    transforms: Mapping[str, Callable[[bytes], bytes]] | None = None,
+) -> list[tuple[str, str]]:
+    """Collect the markdown files and copy all other files.
+
+    The directory structure of `input_dir` is mirrored in `output_dir`.
+    Files that are up to date in `output_dir` are not copied again, see
+    `blag.sync.sync_file`.
+
+    Parameters
+    ----------
+    input_dir
+    output_dir
+    strategy
+        how to copy the files, one of `blag.sync.STRATEGIES`
+    checksum
+        compare the contents instead of the modification times to decide
+        if a file is up to date
+    transforms
+        transformations of the copied files by file extension, see
+        `blag.sync.sync_tree`
+
+    Returns
+    -------
+    list[tuple[str, str]]
+        relative paths to markdown- (src) html- (dest) files
+
+    """
+    transforms = transforms or {}
     convertibles = []
-    for root, dirnames, filenames in os.walk(args.input_dir):
+    for root, dirnames, filenames in os.walk(input_dir):
         for filename in filenames:
-            rel_src = os.path.relpath(
-                f"{root}/{filename}", start=args.input_dir
-            )
+            rel_src = os.path.relpath(f"{root}/{filename}", start=input_dir)
             # all non-markdown files are just copied over, the markdown
             # files are converted to html
             if rel_src.endswith(".md"):
@@ -227,60 +879,19 @@ def build(args: argparse.Namespace) -> None:
                 rel_dst = rel_dst[:-3] + ".html"
                 convertibles.append((rel_src, rel_dst))
             else:
-                shutil.copy(
-                    f"{args.input_dir}/{rel_src}",
-                    f"{args.output_dir}/{rel_src}",
+                sync_file(
+                    f"{input_dir}/{rel_src}",
+                    f"{output_dir}/{rel_src}",
+                    strategy,
+                    checksum,
+                    transforms.get(os.path.splitext(rel_src)[1]),
                 )
         for dirname in dirnames:
             # all directories are copied into the output directory
-            path = os.path.relpath(f"{root}/{dirname}", start=args.input_dir)
-            os.makedirs(f"{args.output_dir}/{path}", exist_ok=True)
-
-    # copy static files over
-    logger.info("Copying static files.")
-    if os.path.exists(args.static_dir):
-        shutil.copytree(args.static_dir, args.output_dir, dirs_exist_ok=True)
-
-    config = get_config("config.ini")
+            path = os.path.relpath(f"{root}/{dirname}", start=input_dir)
+            os.makedirs(f"{output_dir}/{path}", exist_ok=True)
 
-    env = environment_factory(args.template_dir, dict(site=config))
-
-    try:
-        page_template = env.get_template("page.html")
-        article_template = env.get_template("article.html")
-        index_template = env.get_template("index.html")
-        archive_template = env.get_template("archive.html")
-        tags_template = env.get_template("tags.html")
-        tag_template = env.get_template("tag.html")
-    except TemplateNotFound as exc:
-        tmpl = os.path.join(blag.__path__[0], "templates")
-        logger.error(
-            f'Template "{exc.name}" not found in {args.template_dir}! '
-            "Consider running `blag quickstart` or copying the "
-            f"missing template from {tmpl}."
-        )
-
-        sys.exit(1)
-
-    articles, pages = process_markdown(
-        convertibles,
-        args.input_dir,
-        args.output_dir,
-        page_template,
-        article_template,
-    )
-
-    generate_feed(
-        articles,
-        args.output_dir,
-        base_url=config["base_url"],
-        blog_title=config["title"],
-        blog_description=config["description"],
-        blog_author=config["author"],
-    )
-    generate_index(articles, index_template, args.output_dir)
-    generate_archive(articles, archive_template, args.output_dir)
-    generate_tags(articles, tags_template, tag_template, args.output_dir)
+    return convertibles
 
 
 def process_markdown(
@@ -289,6 +900,12 @@ def process_markdown(
     output_dir: str,
     page_template: Template,
     article_template: Template,
+    manifest: Manifest | None = None,
+    jobs: int = 1,
+    cache: Cache | None = None,
+    profile: BuildProfile | None = None,
+    minifier: Minifier | None = None,
+    assets: AssetManifest | None = None,
 ) -> tuple[list[tuple[str, dict[str, Any]]], list[tuple[str, dict[str, Any]]]]:
     """Process markdown files.
 
@@ -300,6 +917,21 @@ def process_markdown(
 
     Articles are sorted by date in descending order.
 
+    If a `manifest` is given, sources that did not change since the last
+    build are not converted again and only rendered if necessary. All
+    processed sources are recorded in the manifest.
+
+    If `jobs` is greater than one, converting and rendering is spread over
+    that many worker processes. Each worker has its own Markdown instance
+    and a copy of the templates' environment. The results do not differ
+    from a serial run.
+
+    If a `cache` is given, the results of `convert_markdown` are looked up
+    in and stored into the cache, so files with the same content do not
+    need to be converted again, even if the manifest does not know them.
+    The cache is also used to memoize the syntax highlighting of code
+    blocks (see `blag.markdown.memoize_highlighting`).
+
     Parameters
     ----------
     convertibles
@@ -308,6 +940,20 @@ def process_markdown(
     output_dir
     page_template, archive_template
         templates for pages and articles
+    manifest
+        the build manifest
+    jobs
+        number of worker processes
+    cache
+        the persistent cache
+    profile
+        if given, the number of files and the time each rendered file took
+        are recorded in it
+    minifier
+        if given, the rendered html is minified, see `blag.minify`
+    assets
+        if given, the links to assets in the content point to their hashed
+        copies, see `blag.assets`
 
     Returns
     -------
@@ -316,51 +962,514 @@ def process_markdown(
 
     """
     logger.info("Converting Markdown files...")
-    md = markdown_factory()
 
-    articles = []
-    pages = []
-    for src, dst in convertibles:
+    # contexts of all convertibles, in order
+    contexts: list[dict[str, Any] | None] = []
+    hashes = []
+    mtimes = []
+    # (dst, body, context) of all convertibles that need to be converted
+    # (context is None) and/or rendered, and their indices
+    tasks: list[tuple[str, str, dict[str, Any] | None]] = []
+    indices = []
+    # indices of the tasks that need to be converted
+    converted = []
+    for i, (src, dst) in enumerate(convertibles):
         logger.debug(f"Processing {src}")
 
         with open(f"{input_dir}/{src}") as fh:
             body = fh.read()
+            mtimes.append(os.fstat(fh.fileno()).st_mtime)
+        hash_ = digest(body)
+        hashes.append(hash_)
 
-        content, meta = convert_markdown(md, body)
-
-        context = dict(content=content)
-        context.update(meta)
+        context, render = _lookup(
+            src, dst, hash_, manifest, cache, page_template, article_template
+        )
+        contexts.append(context)
+        if not render:
+            logger.debug(f"{src} is unchanged")
+            continue
+        if context is None:
+            converted.append(len(tasks))
+        tasks.append((dst, body, context))
+        indices.append(i)
+
+    results = _process(
+        tasks,
+        page_template,
+        article_template,
+        output_dir,
+        jobs,
+        cache,
+        minifier,
+        assets,
+    )
+    # the metrics are recorded even if nobody asked for them, they are cheap
+    profile = profile or BuildProfile()
+    profile.count("sources", len(convertibles))
+    for i, (context, convert_time, render_time, changed) in zip(
+        indices, results
+    ):
+        contexts[i] = context
+        profile.add_file(
+            convertibles[i][1], convert_time, render_time, changed
+        )
+    if cache is not None:
+        for j in converted:
+            _cache_set(cache, hashes[indices[j]], results[j][0])
 
+    articles = []
+    pages = []
+    for (src, dst), hash_, mtime, context in zip(
+        convertibles, hashes, mtimes, contexts
+    ):
+        assert context is not None
+        if manifest is not None:
+            manifest.record(src, dst, hash_, context, mtime)
         # if markdown has date in meta, we treat it as a blog article,
         # everything else are just pages
-        if meta and "date" in meta:
+        if "date" in context:
             articles.append((dst, context))
-            result = article_template.render(context)
         else:
             pages.append((dst, context))
-            result = page_template.render(context)
-        with open(f"{output_dir}/{dst}", "w") as fh_dest:
-            fh_dest.write(result)
 
     # sort articles by date, descending
     articles = sorted(articles, key=lambda x: x[1]["date"], reverse=True)
     return articles, pages
 
 
+def _lookup(
+    src: str,
+    dst: str,
+    hash_: str,
+    manifest: Manifest | None,
+    cache: Cache | None,
+    page_template: Template,
+    article_template: Template,
+) -> tuple[dict[str, Any] | None, bool]:
+    """Look up the context of a markdown file.
+
+    Returns the context -- None if the file needs to be converted -- and
+    whether the file needs to be rendered. The manifest only knows the
+    metadata of unchanged files, files that need to be rendered are looked
+    up in the cache or converted again.
+
+    """
+    if manifest is not None:
+        context = manifest.lookup(src, dst, hash_)
+        if context is not None:
+            template = article_template if "date" in context else page_template
+            if not manifest.needs_render(dst, template.name):
+                return context, False
+    if cache is not None:
+        return _cache_get(cache, hash_), True
+    return None, True
+
+
+def _cache_key(hash_: str) -> str:
+    """Compute the cache key of a converted markdown file."""
+    return Cache.key(hash_, markdown_fingerprint(), __VERSION__)
+
+
+def _cache_get(cache: Cache, hash_: str) -> dict[str, Any] | None:
+    """Get the context of a markdown file from the cache."""
+    value = cache.get("markdown", _cache_key(hash_))
+    if value is None:
+        return None
+    try:
+        return deserialize_context(json.loads(value))
+    except ValueError:
+        return None
+
+
+def _cache_set(cache: Cache, hash_: str, context: dict[str, Any]) -> None:
+    """Store the context of a markdown file in the cache."""
+    cache.set(
+        "markdown",
+        _cache_key(hash_),
+        json.dumps(serialize_context(context)).encode("utf-8"),
+    )
+
+
+def convert_and_render(
+    md: Markdown | None,
+    page_template: Template,
+    article_template: Template,
+    dst: str,
+    body: str,
+    context: dict[str, Any] | None,
+    output_dir: str,
+    minifier: Minifier | None = None,
+    assets: AssetManifest | None = None,
+) -> dict[str, Any]:
+    """Convert a markdown file and render it.
+
+    Parameters
+    ----------
+    md
+        the Markdown instance, only used if `context` is None
+    page_template, article_template
+        templates for pages and articles
+    dst
+        relative path of the html destination
+    body
+        the markdown source
+    context
+        the already converted context, if None `body` is converted
+    output_dir
+    minifier
+        if given, the rendered html is minified, see `blag.minify`
+    assets
+        if given, the links to assets in the content point to their hashed
+        copies, see `blag.assets`
+
+    Returns
+    -------
+    dict[str, Any]
+        the context
+
+    """
+    context, _, _, _ = _convert_and_render(
+        md,
+        page_template,
+        article_template,
+        dst,
+        body,
+        context,
+        output_dir,
+        minifier,
+        assets,
+    )
+    return context
+
+
+def _convert_and_render(
+    md: Markdown | None,
+    page_template: Template,
+    article_template: Template,
+    dst: str,
+    body: str,
+    context: dict[str, Any] | None,
+    output_dir: str,
+    minifier: Minifier | None = None,
+    assets: AssetManifest | None = None,
+) -> tuple[dict[str, Any], float | None, float, bool]:
+    """Run `convert_and_render` and measure it.
+
+    Returns the context, the seconds it took to convert (None if `context`
+    was given) and to render the file, and whether the output was written.
+
+    """
+    convert = None
+    if context is None:
+        assert md is not None
+        start = time.perf_counter()
+        content, meta = convert_markdown(md, body)
+        context = dict(content=content)
+        context.update(meta)
+        convert = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if "date" in context:
+        template = article_template
+    else:
+        template = page_template
+    if assets is None:
+        result = template.render(context)
+    else:
+        # the context is recorded, it keeps the links as they are
+        result = template.render(
+            context, content=assets.rewrite(context["content"], dst)
+        )
+    if minifier is not None:
+        result = minifier.html(result)
+    written = write_file(f"{output_dir}/{dst}", result)
+    return context, convert, time.perf_counter() - start, written
+
+
+def _process(
+    tasks: list[tuple[str, str, dict[str, Any] | None]],
+    page_template: Template,
+    article_template: Template,
+    output_dir: str,
+    jobs: int,
+    cache: Cache | None,
+    minifier: Minifier | None,
+    assets: AssetManifest | None,
+) -> list[tuple[dict[str, Any], float | None, float, bool]]:
+    """Run `convert_and_render` for all tasks.
+
+    The results (see `_convert_and_render`) are returned in the order of the
+    tasks.
+
+    """
+    if jobs > 1 and len(tasks) > 1:
+        return _process_parallel(
+            tasks,
+            page_template,
+            article_template,
+            output_dir,
+            jobs,
+            cache,
+            minifier,
+            assets,
+        )
+    return _process_serial(
+        tasks,
+        page_template,
+        article_template,
+        output_dir,
+        cache,
+        minifier,
+        assets,
+    )
+
+
+def _process_serial(
+    tasks: list[tuple[str, str, dict[str, Any] | None]],
+    page_template: Template,
+    article_template: Template,
+    output_dir: str,
+    cache: Cache | None,
+    minifier: Minifier | None,
+    assets: AssetManifest | None,
+) -> list[tuple[dict[str, Any], float | None, float, bool]]:
+    """Run `convert_and_render` for all tasks in this process."""
+    md = None
+    results = []
+    memoize_highlighting(cache)
+    try:
+        for dst, body, context in tasks:
+            # the markdown instance is only needed if anything changed
+            if md is None and context is None:
+                md = markdown_factory()
+            results.append(
+                _convert_and_render(
+                    md,
+                    page_template,
+                    article_template,
+                    dst,
+                    body,
+                    context,
+                    output_dir,
+                    minifier,
+                    assets,
+                )
+            )
+    finally:
+        memoize_highlighting(None)
+    return results
+
+
+def _process_parallel(
+    tasks: list[tuple[str, str, dict[str, Any] | None]],
+    page_template: Template,
+    article_template: Template,
+    output_dir: str,
+    jobs: int,
+    cache: Cache | None,
+    minifier: Minifier | None,
+    assets: AssetManifest | None,
+) -> list[tuple[dict[str, Any], float | None, float, bool]]:
+    """Run `convert_and_render` for all tasks in worker processes."""
+    env = page_template.environment
+    assert page_template.name is not None
+    assert article_template.name is not None
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=_init_worker,
+        initargs=(
+            env.loader,
+            env.bytecode_cache,
+            env.globals,
+            page_template.name,
+            article_template.name,
+            cache,
+            minifier,
+            assets,
+        ),
+    ) as executor:
+        return list(
+            executor.map(
+                _worker_process,
+                [(dst, b, c, output_dir) for dst, b, c in tasks],
+                chunksize=max(1, len(tasks) // (jobs * 4)),
+            )
+        )
+
+
+# state of a worker process, see `_init_worker`
+_worker: dict[str, Any] = {}
+
+
+def _init_worker(
+    loader: BaseLoader | None,
+    bytecode_cache: BytecodeCache | None,
+    globals_: dict[str, Any],
+    page_template: str,
+    article_template: str,
+    cache: Cache | None,
+    minifier: Minifier | None,
+    assets: AssetManifest | None,
+) -> None:
+    """Initialize a worker process of `process_markdown`.
+
+    Each worker gets its own Markdown instance and environment.
+
+    """
+    memoize_highlighting(cache)
+    env = Environment(loader=loader, bytecode_cache=bytecode_cache)
+    env.globals = globals_
+    _worker["md"] = markdown_factory()
+    _worker["page_template"] = env.get_template(page_template)
+    _worker["article_template"] = env.get_template(article_template)
+    _worker["minifier"] = minifier
+    _worker["assets"] = assets
+
+
+def _worker_process(
+    task: tuple[str, str, dict[str, Any] | None, str],
+) -> tuple[dict[str, Any], float | None, float, bool]:
+    """Run `convert_and_render` in a worker process."""
+    dst, body, context, output_dir = task
+    return _convert_and_render(
+        _worker["md"],
+        _worker["page_template"],
+        _worker["article_template"],
+        dst,
+        body,
+        context,
+        output_dir,
+        _worker["minifier"],
+        _worker["assets"],
+    )
+
+
+class ArticleRecord(Mapping[str, Any]):
+    """Read-only record of an article, as listed on the listing pages.
+
+    The feed, index, archive and tag pages share one record per article,
+    instead of each page copying the article's context. The record only
+    references the context, so the article's content is not touched unless
+    a template uses it. Contexts of unchanged articles do not contain the
+    content (see `blag.manifest.Manifest.lookup`), it is then loaded with
+    `content` when it is used.
+
+    The record provides the article's metadata and `dst`, the relative path
+    of the article, both as items and as attributes (`entry.title`).
+
+    Parameters
+    ----------
+    dst
+        relative path of the article
+    context
+        the article's context
+    content
+        if given, loads the content of the article with the relative path
+        `dst`, if its context does not contain it
+
+    """
+
+    __slots__ = ("dst", "_context", "_content")
+
+    dst: str
+    _context: Mapping[str, Any]
+    _content: Callable[[str], str] | None
+
+    def __init__(
+        self,
+        dst: str,
+        context: Mapping[str, Any],
+        content: Callable[[str], str] | None = None,
+    ):
+        object.__setattr__(self, "dst", dst)
+        object.__setattr__(self, "_context", context)
+        if "content" in context:
+            content = None
+        object.__setattr__(self, "_content", content)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        """Prevent modifications."""
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    def __getattr__(self, name: str) -> Any:
+        """Get the metadata element `name`."""
+        if name.startswith("_"):
+            raise AttributeError(name)
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __getitem__(self, key: str) -> Any:
+        """Get the metadata element `key`."""
+        if key == "dst":
+            return self.dst
+        if key == "content" and self._content is not None:
+            return self._content(self.dst)
+        return self._context[key]
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over the names of the metadata elements."""
+        yield "dst"
+        yield from (key for key in self._context if key != "dst")
+        if self._content is not None:
+            yield "content"
+
+    def __len__(self) -> int:
+        """Get the number of metadata elements."""
+        return (
+            len(self._context)
+            + ("dst" not in self._context)
+            + (self._content is not None)
+        )
+
+
+def article_records(
+    articles: Sequence[tuple[str, Mapping[str, Any]]],
+    content: Callable[[str], str] | None = None,
+) -> list[tuple[str, ArticleRecord]]:
+    """Create the records of the articles, see `ArticleRecord`.
+
+    Parameters
+    ----------
+    articles
+        relative path and context of each article
+    content
+        loads the content of an article by its relative path, for contexts
+        without content
+
+    Returns
+    -------
+    list[tuple[str, ArticleRecord]]
+
+    """
+    return [
+        (dst, ArticleRecord(dst, context, content))
+        for dst, context in articles
+    ]
+
+
 def generate_feed(
-    articles: list[tuple[str, dict[str, Any]]],
+    articles: Sequence[tuple[str, Mapping[str, Any]]],
     output_dir: str,
     base_url: str,
     blog_title: str,
     blog_description: str,
     blog_author: str,
-) -> None:
+    entries: int = 0,
+    summary_only: bool = False,
+    manifest: Manifest | None = None,
+    serialized: dict[str, str] | None = None,
+) -> list[str]:
     """Generate Atom feed.
 
+    The feed is streamed into its file, see `blag.feed.StreamingAtomFeed`.
+
     Parameters
     ----------
     articles
-        list of relative output path and article dictionary
+        list of relative output path and article dictionary, newest first
     output_dir
         where the feed is stored
     base_url
@@ -371,39 +1480,186 @@ def generate_feed(
         blog description
     blog_author
         blog author
+    entries
+        if greater than zero, only the first `entries` articles are added
+    summary_only
+        if True, the articles' content is left out and only their summary
+        (description or title) is added
+    manifest
+        if given, the feed is only generated if it changed, see
+        `blag.manifest.Manifest.page_changed`
+    serialized
+        if given together with `manifest`, the serialized entries of the
+        last feed by article and hash. Entries of unchanged articles are
+        taken from it instead of being serialized again, so their content
+        is not loaded. It is updated with the entries of this feed.
+
+    Returns
+    -------
+    list[str]
+        ["atom.xml"] if the feed was written, otherwise an empty list
 
     """
+    if entries > 0:
+        articles = articles[:entries]
+    if manifest is not None and not manifest.page_changed(
+        "atom.xml", articles, [entries, summary_only], None
+    ):
+        return []
+
     logger.info("Generating Atom feed.")
-    feed = feedgenerator.Atom1Feed(
+
+    # the serialized entries of this feed
+    current: dict[str, str] = {}
+
+    def items() -> Iterator[str]:
+        for dst, context in articles:
+            key = None
+            if manifest is not None and dst in manifest.hashes:
+                key = " ".join(
+                    [base_url + dst, manifest.hashes[dst], blog_author]
+                    + ["summary"] * summary_only
+                )
+            if serialized is not None and key in serialized:
+                entry = serialized[key]
+            else:
+                entry = feed.serialize(
+                    dict(
+                        title=context["title"],
+                        author_name=blog_author,
+                        link=base_url + dst,
+                        # if article has a description, use that. otherwise
+                        # fall back to the title
+                        description=context.get(
+                            "description", context["title"]
+                        ),
+                        content=None if summary_only else context["content"],
+                        pubdate=context["date"],
+                    )
+                )
+            if key is not None:
+                current[key] = entry
+            yield entry
+
+    feed = StreamingAtomFeed(
+        items(),
+        max((context["date"] for _, context in articles), default=None),
         link=base_url,
         title=blog_title,
         description=blog_description,
         feed_url=base_url + "atom.xml",
     )
+    path = f"{output_dir}/atom.xml"
+    written = write_with(path, lambda fh: feed.write(fh, "utf-8"))
+    if serialized is not None:
+        serialized.clear()
+        serialized.update(current)
+    if written:
+        return ["atom.xml"]
+    return []
+
+
+def generate_sitemap(
+    entries: Sequence[tuple[str, Mapping[str, Any]]],
+    lastmod: Mapping[str, float],
+    output_dir: str,
+    base_url: str,
+    max_urls: int = MAX_URLS,
+    manifest: Manifest | None = None,
+) -> list[str]:
+    """Generate the sitemap.
 
-    for dst, context in articles:
-        # if article has a description, use that. otherwise fall back to
-        # the title
-        description = context.get("description", context["title"])
-
-        feed.add_item(
-            title=context["title"],
-            author_name=blog_author,
-            link=base_url + dst,
-            description=description,
-            content=context["content"],
-            pubdate=context["date"],
-        )
+    If there are more than `max_urls` entries, they are split into shards
+    and `sitemap.xml` becomes the sitemap index, see `blag.sitemap`. The
+    documents are streamed into their files.
 
-    with open(f"{output_dir}/atom.xml", "w") as fh:
-        feed.write(fh, encoding='utf-8')
+    Parameters
+    ----------
+    entries
+        relative output path and context of each article and page, in the
+        order they are listed
+    lastmod
+        the times the entries' sources last changed, by relative output
+        path, see `blag.manifest.Manifest.lastmod`
+    output_dir
+        where the sitemap is stored
+    base_url
+        base url
+    max_urls
+        maximum number of URLs per sitemap
+    manifest
+        if given, the sitemap is only generated if any entry changed, see
+        `blag.manifest.Manifest.page_changed`
+
+    Returns
+    -------
+    list[str]
+        the written and removed sitemaps
+
+    """
+    if manifest is not None and not manifest.page_changed(
+        "sitemap.xml", entries, max_urls, None
+    ):
+        return []
+
+    logger.info("Generating sitemap.")
+    written = []
+    shards: list[tuple[str, float | None]] = []
+    if len(entries) <= max_urls:
+        write = partial(
+            write_urlset, urls=_sitemap_urls(entries, lastmod, base_url)
+        )
+    else:
+        for n, start in enumerate(range(0, len(entries), max_urls), 1):
+            shard = islice(entries, start, start + max_urls)
+            if write_with(
+                f"{output_dir}/{shard_name(n)}",
+                partial(
+                    write_urlset,
+                    urls=_sitemap_urls(shard, lastmod, base_url),
+                ),
+            ):
+                written.append(shard_name(n))
+            latest = max(
+                (
+                    lastmod[dst]
+                    for dst, _ in islice(entries, start, start + max_urls)
+                    if dst in lastmod
+                ),
+                default=None,
+            )
+            shards.append((base_url + shard_name(n), latest))
+        write = partial(write_index, sitemaps=shards)
+    if write_with(f"{output_dir}/sitemap.xml", write):
+        written.append("sitemap.xml")
+
+    # the shards of a formerly larger site
+    n = len(shards) + 1
+    while os.path.exists(f"{output_dir}/{shard_name(n)}"):
+        os.remove(f"{output_dir}/{shard_name(n)}")
+        written.append(shard_name(n))
+        n += 1
+    return written
+
+
+def _sitemap_urls(
+    entries: Iterable[tuple[str, Mapping[str, Any]]],
+    lastmod: Mapping[str, float],
+    base_url: str,
+) -> Iterator[tuple[str, float | None]]:
+    """Get the absolute URL and the lastmod of each sitemap entry."""
+    for dst, _ in entries:
+        yield base_url + quote(dst), lastmod.get(dst)
 
 
 def generate_index(
-    articles: list[tuple[str, dict[str, Any]]],
+    articles: Sequence[tuple[str, Mapping[str, Any]]],
     template: Template,
     output_dir: str,
-) -> None:
+    per_page: int = 0,
+    manifest: Manifest | None = None,
+    minifier: Minifier | None = None,
+) -> list[str]:
     """Generate the index page.
 
     This is used for the index (i.e. landing) page.
@@ -415,27 +1671,48 @@ def generate_index(
         dictionary with the content.
     template
     output_dir
+    per_page
+        if greater than zero, only the first `per_page` articles are passed
+        to the template
+    manifest
+        if given, the page is only rendered if it changed, see
+        `blag.manifest.Manifest.page_changed`
+    minifier
+        if given, the page is minified, see `blag.minify`
 
-    """
-    archive = []
-    for dst, context in articles:
-        entry = context.copy()
-        entry["dst"] = dst
-        archive.append(entry)
+    Returns
+    -------
+    list[str]
+        the written outputs
 
-    result = template.render(dict(archive=archive))
-    with open(f"{output_dir}/index.html", "w") as fh:
-        fh.write(result)
+    """
+    if per_page > 0:
+        articles = articles[:per_page]
+    return _render_pages(
+        template,
+        [("index.html", articles, None)],
+        output_dir,
+        manifest,
+        minifier=minifier,
+    )
 
 
 def generate_archive(
-    articles: list[tuple[str, dict[str, Any]]],
+    articles: Sequence[tuple[str, Mapping[str, Any]]],
     template: Template,
     output_dir: str,
-) -> None:
+    per_page: int = 0,
+    manifest: Manifest | None = None,
+    minifier: Minifier | None = None,
+) -> list[str]:
     """Generate the archive page.
 
-    This is used for the full archive.
+    This is used for the full archive. The page is streamed into the file
+    while it is rendered, see `blag.sync.write_stream`.
+
+    If `per_page` is greater than zero, the archive is split into pages of
+    that many articles: `archive.html`, `archive/page/2.html`, etc., see
+    `paginate`.
 
     Parameters
     ----------
@@ -444,27 +1721,47 @@ def generate_archive(
         dictionary with the content.
     template
     output_dir
+    per_page
+        number of articles per page, 0 disables pagination
+    manifest
+        if given, pages are only rendered if they changed, see
+        `blag.manifest.Manifest.page_changed`
+    minifier
+        if given, the pages are minified, see `blag.minify`
 
-    """
-    archive = []
-    for dst, context in articles:
-        entry = context.copy()
-        entry["dst"] = dst
-        archive.append(entry)
+    Returns
+    -------
+    list[str]
+        the written outputs
 
-    result = template.render(dict(archive=archive))
-    with open(f"{output_dir}/archive.html", "w") as fh:
-        fh.write(result)
+    """
+    pages = paginate(articles, per_page, "archive.html", "archive/page/")
+    written = _render_pages(
+        template, pages, output_dir, manifest, minifier=minifier
+    )
+    _remove_pages(output_dir, "archive/page/", len(pages), manifest)
+    return written
 
 
 def generate_tags(
-    articles: list[tuple[str, dict[str, Any]]],
+    articles: Sequence[tuple[str, Mapping[str, Any]]],
     tags_template: Template,
     tag_template: Template,
     output_dir: str,
-) -> None:
+    only: set[str] | None = None,
+    per_page: int = 0,
+    manifest: Manifest | None = None,
+    minifier: Minifier | None = None,
+) -> list[str]:
     """Generate the tags page.
 
+    The pages are streamed into the files while they are rendered, see
+    `blag.sync.write_stream`.
+
+    If `per_page` is greater than zero, the tag pages are split into pages
+    of that many articles: `tags/{tag}.html`, `tags/{tag}/page/2.html`,
+    etc., see `paginate`.
+
     Parameters
     ----------
     articles
@@ -472,40 +1769,244 @@ def generate_tags(
         dictionary with the content.
     tags_template, tag_template
     output_dir
+    only
+        if given, only the pages of these tags are generated (and the tags
+        page), e.g. the tags of changed articles
+    per_page
+        number of articles per page, 0 disables pagination
+    manifest
+        if given, tag pages are only rendered if they changed, see
+        `blag.manifest.Manifest.page_changed`
+    minifier
+        if given, the pages are minified, see `blag.minify`
+
+    Returns
+    -------
+    list[str]
+        the written outputs
 
     """
     logger.info("Generating Tag-pages.")
     os.makedirs(f"{output_dir}/tags", exist_ok=True)
-    # get tags number of occurrences
-    all_tags: dict[str, int] = {}
-    for _, context in articles:
-        tags: list[str] = context.get("tags", [])
-        for tag in tags:
-            all_tags[tag] = all_tags.get(tag, 0) + 1
+    written = []
+    index = tag_index(articles)
+    if manifest is not None:
+        for tag in manifest.update_tags(index):
+            _remove_tag_pages(output_dir, tag, manifest)
+
     # sort by occurrence
-    taglist: list[tuple[str, int]] = sorted(
-        all_tags.items(), key=lambda x: x[1], reverse=True
+    taglist = sorted(
+        ((tag, len(dsts)) for tag, dsts in index.items()),
+        key=lambda x: x[1],
+        reverse=True,
     )
+    if (
+        manifest is None
+        or manifest.page_changed("tags/index.html", [], taglist, "tags.html")
+    ) and _write_page(
+        f"{output_dir}/tags/index.html",
+        tags_template.generate(dict(tags=taglist)),
+        minifier,
+    ):
+        written.append("tags/index.html")
+
+    contexts = dict(articles)
+    for tag, dsts in index.items():
+        if only is not None and tag not in only:
+            continue
+        archive = [(dst, contexts[dst]) for dst in dsts]
+        prefix = f"tags/{tag}/page/"
+        pages = paginate(archive, per_page, f"tags/{tag}.html", prefix)
+        written += _render_pages(
+            tag_template, pages, output_dir, manifest, dict(tag=tag), minifier
+        )
+        _remove_pages(output_dir, prefix, len(pages), manifest)
+    return written
+
+
+def tag_index(
+    articles: Sequence[tuple[str, Mapping[str, Any]]],
+) -> dict[str, list[str]]:
+    """Index the articles by their tags.
+
+    Parameters
+    ----------
+    articles
+        the sorted articles
 
-    result = tags_template.render(dict(tags=taglist))
-    with open(f"{output_dir}/tags/index.html", "w") as fh:
-        fh.write(result)
+    Returns
+    -------
+    dict[str, list[str]]
+        the destinations of the articles of each tag, in the order of
+        `articles`. The tags are ordered by their first occurrence.
 
-    # get tags and archive per tag
-    all_tags2: dict[str, list[dict[str, Any]]] = {}
+    """
+    index: dict[str, list[str]] = {}
     for dst, context in articles:
-        tags = context.get("tags", [])
-        for tag in tags:
-            archive: list[dict[str, Any]] = all_tags2.get(tag, [])
-            entry = context.copy()
-            entry["dst"] = dst
-            archive.append(entry)
-            all_tags2[tag] = archive
-
-    for tag, archive in all_tags2.items():
-        result = tag_template.render(dict(archive=archive, tag=tag))
-        with open(f"{output_dir}/tags/{tag}.html", "w") as fh:
-            fh.write(result)
+        for tag in context.get("tags", []):
+            index.setdefault(tag, []).append(dst)
+    return index
+
+
+def paginate(
+    articles: Sequence[tuple[str, Mapping[str, Any]]],
+    per_page: int,
+    first: str,
+    prefix: str,
+) -> list[
+    tuple[str, Sequence[tuple[str, Mapping[str, Any]]], dict[str, Any]]
+]:
+    """Split the articles into pages.
+
+    The first page is `first`, the following ones are `<prefix>N.html`,
+    starting with 2.
+
+    Each page comes with its pagination, a dictionary with the page's
+    number (`page`), the number of pages (`pages`) and the links to the
+    `previous` and `next` page (relative to the page, None for the first
+    and last page, respectively). It is available as `pagination` in the
+    templates.
+
+    Parameters
+    ----------
+    articles
+        the sorted articles
+    per_page
+        number of articles per page, 0 puts all articles on one page
+    first
+        relative path of the first page
+    prefix
+        relative path of the following pages, without the page number
+
+    Returns
+    -------
+    list[tuple[str, Sequence[tuple[str, Mapping[str, Any]]], dict[str, Any]]]
+        relative path, articles and pagination of each page
+
+    """
+    n = per_page if per_page > 0 else max(len(articles), 1)
+    chunks = [articles[i : i + n] for i in range(0, len(articles), n)] or [[]]
+    dsts = [first] + [f"{prefix}{i}.html" for i in range(2, len(chunks) + 1)]
+
+    pages = []
+    for i, (dst, chunk) in enumerate(zip(dsts, chunks)):
+        start = posixpath.dirname(dst) or "."
+        pagination = dict(
+            page=i + 1,
+            pages=len(chunks),
+            previous=posixpath.relpath(dsts[i - 1], start) if i > 0 else None,
+            next=(
+                posixpath.relpath(dsts[i + 1], start)
+                if i + 1 < len(dsts)
+                else None
+            ),
+        )
+        pages.append((dst, chunk, pagination))
+    return pages
+
+
+def _render_pages(
+    template: Template,
+    pages: Sequence[
+        tuple[
+            str,
+            Sequence[tuple[str, Mapping[str, Any]]],
+            dict[str, Any] | None,
+        ]
+    ],
+    output_dir: str,
+    manifest: Manifest | None,
+    context: dict[str, Any] | None = None,
+    minifier: Minifier | None = None,
+) -> list[str]:
+    """Render listing pages, see `paginate`.
+
+    Returns the written outputs.
+
+    """
+    written = []
+    for dst, articles, pagination in pages:
+        if manifest is not None and not manifest.page_changed(
+            dst, articles, [context, pagination], template.name
+        ):
+            continue
+        archive = [
+            (
+                article
+                if isinstance(article, ArticleRecord)
+                else ArticleRecord(article_dst, article)
+            )
+            for article_dst, article in articles
+        ]
+        os.makedirs(
+            os.path.dirname(os.path.join(output_dir, dst)), exist_ok=True
+        )
+        if _write_page(
+            os.path.join(output_dir, dst),
+            template.generate(
+                dict(
+                    context or {},
+                    archive=archive,
+                    pagination=pagination,
+                    # relative path to the root of the site
+                    root="../" * dst.count("/"),
+                )
+            ),
+            minifier,
+        ):
+            written.append(dst)
+    return written
+
+
+def _write_page(
+    path: str, chunks: Iterator[str], minifier: Minifier | None
+) -> bool:
+    """Stream a rendered page into `path`.
+
+    Pages that are minified are rendered into memory first, the minifier
+    needs the whole page.
+
+    """
+    if minifier is None:
+        return write_stream(path, chunks)
+    return write_file(path, minifier.html("".join(chunks)))
+
+
+def _remove_pages(
+    output_dir: str,
+    prefix: str,
+    pages: int,
+    manifest: Manifest | None,
+) -> None:
+    """Remove the pages `<prefix>N.html` beyond the number of `pages`."""
+    directory = os.path.join(output_dir, prefix)
+    if not os.path.isdir(directory):
+        return
+    for filename in os.listdir(directory):
+        number, ext = os.path.splitext(filename)
+        if ext != ".html" or not number.isdigit() or int(number) <= pages:
+            continue
+        os.remove(os.path.join(directory, filename))
+        if manifest is not None:
+            manifest.forget_page(prefix + filename)
+
+
+def _remove_tag_pages(output_dir: str, tag: str, manifest: Manifest) -> None:
+    """Remove all pages of `tag`."""
+    logger.info(f"Removing the pages of tag {tag}, it is no longer used.")
+    dst = f"tags/{tag}.html"
+    try:
+        os.remove(os.path.join(output_dir, dst))
+    except FileNotFoundError:
+        pass
+    manifest.forget_page(dst)
+    prefix = f"tags/{tag}/page/"
+    _remove_pages(output_dir, prefix, 0, manifest)
+    for directory in prefix, f"tags/{tag}/":
+        try:
+            os.rmdir(os.path.join(output_dir, directory))
+        except OSError:
+            pass
 
 
 if __name__ == "__main__":
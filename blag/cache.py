@@ -0,0 +1,223 @@
+"""Persistent Cache.
+
+This module provides blag's on-disk cache. The cache is content-addressed:
+entries are stored under a key derived from everything that influences them,
+so entries never need to be invalidated -- a changed input simply results in
+a different key. Entries are grouped in namespaces (e.g. `markdown` for the
+results of `convert_markdown`).
+
+The cache has a maximum size, when it is exceeded the least recently used
+entries are evicted.
+
+"""
+
+import argparse
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+from blag.manifest import digest
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = ".blag-cache"
+# in MiB
+DEFAULT_CACHE_SIZE = 512
+# suffix of the temporary files entries are written to
+TMP_SUFFIX = ".tmp"
+# temporary files older than this many seconds are left over from killed
+# processes and removed on eviction
+TMP_MAX_AGE = 3600
+
+
+class Cache:
+    """On-disk cache with LRU eviction.
+
+    Each entry is stored in its own file
+    `<directory>/<namespace>/<key[:2]>/<key>`. Reading an entry updates its
+    modification time, which is used to determine the least recently used
+    entries on eviction.
+
+    Writing entries is atomic, so the cache can be shared by concurrent
+    processes.
+
+    Parameters
+    ----------
+    directory
+        the cache directory
+    max_size
+        maximum size of the cache in bytes
+
+    """
+
+    def __init__(
+        self,
+        directory: str = DEFAULT_CACHE_DIR,
+        max_size: int = DEFAULT_CACHE_SIZE * 1024 * 1024,
+    ):
+        self.directory = directory
+        self.max_size = max_size
+
+    @staticmethod
+    def key(*parts: str) -> str:
+        """Compute a key from `parts`.
+
+        Parameters
+        ----------
+        parts
+            everything that influences the cached value
+
+        Returns
+        -------
+        str
+
+        """
+        return digest("\0".join(parts))
+
+    def _path(self, namespace: str, key: str) -> str:
+        return os.path.join(self.directory, namespace, key[:2], key)
+
+    def get(self, namespace: str, key: str) -> bytes | None:
+        """Get an entry.
+
+        Parameters
+        ----------
+        namespace
+        key
+
+        Returns
+        -------
+        bytes | None
+            the value or None if there is no such entry
+
+        """
+        path = self._path(namespace, key)
+        try:
+            with open(path, "rb") as fh:
+                value = fh.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return value
+
+    def set(self, namespace: str, key: str, value: bytes) -> None:
+        """Set an entry.
+
+        Parameters
+        ----------
+        namespace
+        key
+        value
+
+        """
+        path = self._path(namespace, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(
+            dir=os.path.dirname(path), suffix=TMP_SUFFIX
+        )
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(value)
+            os.replace(tmp, path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+    def _entries(
+        self, leftovers: list[str] | None = None
+    ) -> list[tuple[float, int, str]]:
+        """Get (mtime, size, path) of all entries.
+
+        Temporary files are no entries, the paths of those older than
+        `TMP_MAX_AGE` are appended to `leftovers`.
+
+        """
+        entries = []
+        now = time.time()
+        for root, _, filenames in os.walk(self.directory):
+            for filename in filenames:
+                path = os.path.join(root, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if not filename.endswith(TMP_SUFFIX):
+                    entries.append((stat.st_mtime, stat.st_size, path))
+                elif leftovers is not None and (
+                    now - stat.st_mtime > TMP_MAX_AGE
+                ):
+                    leftovers.append(path)
+        return entries
+
+    def evict(self) -> None:
+        """Evict the least recently used entries until the cache fits.
+
+        Temporary files left over from killed processes are removed as
+        well.
+
+        """
+        leftovers: list[str] = []
+        entries = self._entries(leftovers)
+        for path in leftovers:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        size = sum(s for _, s, _ in entries)
+        if size <= self.max_size:
+            return
+        logger.info("Cache is full, evicting least recently used entries.")
+        for _, entry_size, path in sorted(entries):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+            if size <= self.max_size:
+                break
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def stats(self) -> dict[str, tuple[int, int]]:
+        """Get statistics about the cache.
+
+        Returns
+        -------
+        dict[str, tuple[int, int]]
+            mapping of namespace to number of entries and their size in
+            bytes
+
+        """
+        stats: dict[str, tuple[int, int]] = {}
+        for _, size, path in self._entries():
+            namespace = os.path.relpath(path, self.directory).split(os.sep)[0]
+            n, total = stats.get(namespace, (0, 0))
+            stats[namespace] = (n + 1, total + size)
+        return stats
+
+
+def cache_command(args: argparse.Namespace) -> None:
+    """Run the `cache` command.
+
+    Parameters
+    ----------
+    args
+        contains the cache dir and the action (`clear` or `stats`)
+
+    """
+    cache = Cache(args.cache_dir)
+    if args.action == "clear":
+        cache.clear()
+        print(f"Cleared {args.cache_dir}.")
+        return
+
+    stats = cache.stats()
+    for namespace, (n, size) in sorted(stats.items()):
+        print(f"{namespace}: {n} entries, {size / 1024 / 1024:.1f} MiB")
+    n = sum(n for n, _ in stats.values())
+    size = sum(s for _, s in stats.values())
+    print(f"total: {n} entries, {size / 1024 / 1024:.1f} MiB")
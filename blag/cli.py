@@ -0,0 +1,440 @@
+"""Command Line Interface.
+
+This module parses the command line and runs the commands. It is kept
+light: the modules implementing the commands, and their dependencies
+(Jinja2, Markdown, Pygments, feedgenerator, the devserver, ...), are only
+imported when a command runs, and only the ones the command needs. So
+`blag --version`, `blag --help` and invalid arguments return immediately.
+
+"""
+
+import argparse
+import importlib
+import logging
+import os
+from collections.abc import Callable
+
+from blag.cache import DEFAULT_CACHE_DIR, DEFAULT_CACHE_SIZE
+from blag.sync import STRATEGIES
+from blag.version import __VERSION__
+
+logger = logging.getLogger(__name__)
+
+
+def main(arguments: list[str] | None = None) -> None:
+    """Run the CLI.
+
+    This method parses the CLI arguments and executes the respective
+    commands.
+
+    Parameters
+    ----------
+    arguments
+        optional parameters, used for testing
+
+    """
+    args = parse_args(arguments)
+    configure_logging(args.verbose)
+    logger.debug(f"This is blag {__VERSION__}.")
+    args.func(args)
+
+
+def configure_logging(verbose: bool) -> None:
+    """Configure the logging.
+
+    This is called by `main` and by processes that do not inherit the
+    configuration, e.g. the devserver's autoreloader when processes are
+    spawned (see `blag.devserver.autoreload`).
+
+    Parameters
+    ----------
+    verbose
+        if True, blag's debug messages are logged as well
+
+    """
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s %(message)s",
+    )
+    # set loglevel
+    if verbose:
+        logging.getLogger("blag").setLevel(logging.DEBUG)
+
+
+def parse_args(args: list[str] | None = None) -> argparse.Namespace:
+    """Parse command line arguments.
+
+    Parameters
+    ----------
+    args
+        optional parameters, used for testing
+
+    Returns
+    -------
+    arparse.Namespace
+
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--version",
+        action="version",
+        version="%(prog)s " + __VERSION__,
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        help="Verbose output.",
+    )
+
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    build_parser = commands.add_parser(
+        "build",
+        help="Build website.",
+    )
+    build_parser.set_defaults(func=command("blag.blag:build"))
+    build_parser.add_argument(
+        "-i",
+        "--input-dir",
+        default="content",
+        help="Input directory (default: content)",
+    )
+    build_parser.add_argument(
+        "-o",
+        "--output-dir",
+        default="build",
+        help="Ouptut directory (default: build)",
+    )
+    build_parser.add_argument(
+        "-t",
+        "--template-dir",
+        default="templates",
+        help="Template directory (default: templates)",
+    )
+    build_parser.add_argument(
+        "-s",
+        "--static-dir",
+        default="static",
+        help="Static directory (default: static)",
+    )
+    build_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=parse_jobs,
+        default=1,
+        help="Number of worker processes, 0 uses all CPUs (default: 1)",
+    )
+    build_parser.add_argument(
+        "--copy-mode",
+        choices=STRATEGIES,
+        default="copy",
+        help=(
+            "How to copy static files: copy them, hard link them or clone "
+            "them on filesystems supporting it (default: copy)"
+        ),
+    )
+    build_parser.add_argument(
+        "--checksum",
+        action="store_true",
+        help=(
+            "Compare the contents of static files instead of their "
+            "modification times, to decide if they need to be copied"
+        ),
+    )
+    build_parser.add_argument(
+        "--staging",
+        action="store_true",
+        help=(
+            "Build into a staging directory and replace the output "
+            "directory with it when the build is done"
+        ),
+    )
+    build_parser.add_argument(
+        "--cache-dir",
+        default=DEFAULT_CACHE_DIR,
+        help=f"Cache directory (default: {DEFAULT_CACHE_DIR})",
+    )
+    build_parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=DEFAULT_CACHE_SIZE,
+        help=(
+            "Maximum size of the cache in MiB, 0 disables the cache "
+            f"(default: {DEFAULT_CACHE_SIZE})"
+        ),
+    )
+    build_parser.add_argument(
+        "--minify",
+        action="store_true",
+        help="Minify the rendered HTML and the copied CSS files",
+    )
+    build_parser.add_argument(
+        "--fingerprint-assets",
+        action="store_true",
+        help=(
+            "Copy the static files to content-hashed names and refer to "
+            "those in the rendered HTML"
+        ),
+    )
+    build_parser.add_argument(
+        "--profile",
+        action="store_true",
+        help=(
+            "Report the time of each stage, the slowest files and the "
+            "number of written and skipped files"
+        ),
+    )
+    build_parser.add_argument(
+        "--metrics",
+        metavar="FILE",
+        help="Write the metrics of the build as JSON into FILE",
+    )
+    build_parser.add_argument(
+        "--cprofile",
+        metavar="FILE",
+        help="Profile the build with cProfile and dump the stats into FILE",
+    )
+    build_parser.add_argument(
+        "--precompress",
+        action="store_true",
+        help=(
+            "Write gzip (and zstd, if available) compressed copies of the "
+            "HTML, XML, CSS and JS files next to them"
+        ),
+    )
+
+    quickstart_parser = commands.add_parser(
+        "quickstart",
+        help="Quickstart blag, creating necessary configuration.",
+    )
+    quickstart_parser.set_defaults(func=command("blag.quickstart:quickstart"))
+
+    serve_parser = commands.add_parser(
+        "serve",
+        help="Start development server.",
+    )
+    serve_parser.set_defaults(func=command("blag.devserver:serve"))
+    serve_parser.add_argument(
+        "-b",
+        "--bind",
+        default="",
+        help="Address to listen on (default: all addresses)",
+    )
+    serve_parser.add_argument(
+        "-p",
+        "--port",
+        type=int,
+        default=8000,
+        help="Port to listen on (default: 8000)",
+    )
+    serve_parser.add_argument(
+        "-i",
+        "--input-dir",
+        default="content",
+        help="Input directory (default: content)",
+    )
+    serve_parser.add_argument(
+        "-o",
+        "--output-dir",
+        default="build",
+        help="Ouptut directory (default: build)",
+    )
+    serve_parser.add_argument(
+        "-t",
+        "--template-dir",
+        default="templates",
+        help="Template directory (default: templates)",
+    )
+    serve_parser.add_argument(
+        "-s",
+        "--static-dir",
+        default="static",
+        help="Static directory (default: static)",
+    )
+    serve_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=parse_jobs,
+        default=1,
+        help="Number of worker processes, 0 uses all CPUs (default: 1)",
+    )
+    serve_parser.add_argument(
+        "--copy-mode",
+        choices=STRATEGIES,
+        default="copy",
+        help=(
+            "How to copy static files: copy them, hard link them or clone "
+            "them on filesystems supporting it (default: copy)"
+        ),
+    )
+    serve_parser.add_argument(
+        "--checksum",
+        action="store_true",
+        help=(
+            "Compare the contents of static files instead of their "
+            "modification times, to decide if they need to be copied"
+        ),
+    )
+    serve_parser.add_argument(
+        "--cache-dir",
+        default=DEFAULT_CACHE_DIR,
+        help=f"Cache directory (default: {DEFAULT_CACHE_DIR})",
+    )
+    serve_parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=DEFAULT_CACHE_SIZE,
+        help=(
+            "Maximum size of the cache in MiB, 0 disables the cache "
+            f"(default: {DEFAULT_CACHE_SIZE})"
+        ),
+    )
+    serve_parser.add_argument(
+        "--minify",
+        action="store_true",
+        help="Minify the rendered HTML and the copied CSS files",
+    )
+    serve_parser.add_argument(
+        "--fingerprint-assets",
+        action="store_true",
+        help=(
+            "Copy the static files to content-hashed names and refer to "
+            "those in the rendered HTML"
+        ),
+    )
+    serve_parser.add_argument(
+        "--profile",
+        action="store_true",
+        help=(
+            "Report the time of each stage, the slowest files and the "
+            "number of written and skipped files after each rebuild"
+        ),
+    )
+
+    compile_parser = commands.add_parser(
+        "compile-templates",
+        help="Precompile the templates into a zip file.",
+    )
+    compile_parser.set_defaults(func=command("blag.theme:compile_command"))
+    compile_parser.add_argument(
+        "-t",
+        "--template-dir",
+        default="templates",
+        help="Template directory (default: templates)",
+    )
+    compile_parser.add_argument(
+        "-o",
+        "--output",
+        default="templates.zip",
+        help="Output file (default: templates.zip)",
+    )
+
+    cache_parser = commands.add_parser(
+        "cache",
+        help="Manage the cache.",
+    )
+    cache_parser.set_defaults(func=command("blag.cache:cache_command"))
+    cache_parser.add_argument(
+        "action",
+        choices=["clear", "stats"],
+        help="Clear the cache or show statistics about it.",
+    )
+    cache_parser.add_argument(
+        "--cache-dir",
+        default=DEFAULT_CACHE_DIR,
+        help=f"Cache directory (default: {DEFAULT_CACHE_DIR})",
+    )
+
+    query_parser = commands.add_parser(
+        "query",
+        help="Query the article index of a built site.",
+    )
+    query_parser.set_defaults(func=command("blag.index:query_command"))
+    query_parser.add_argument(
+        "-o",
+        "--output-dir",
+        default="build",
+        help="Output directory (default: build)",
+    )
+    query_parser.add_argument(
+        "--tag",
+        help="Only articles with this tag",
+    )
+    query_parser.add_argument(
+        "-n",
+        "--limit",
+        type=int,
+        help="Only the latest LIMIT articles",
+    )
+    query_parser.add_argument(
+        "--tags",
+        action="store_true",
+        help="List the tags and their number of articles instead",
+    )
+    query_parser.add_argument(
+        "--json",
+        action="store_true",
+        help="Print the result as JSON",
+    )
+
+    return parser.parse_args(args)
+
+
+def parse_jobs(value: str) -> int:
+    """Parse the number of jobs.
+
+    Parameters
+    ----------
+    value
+        number of jobs, 0 means one job per CPU
+
+    Returns
+    -------
+    int
+
+    """
+    n = int(value)
+    if n < 0:
+        raise argparse.ArgumentTypeError("must not be negative")
+    if n == 0:
+        n = os.cpu_count() or 1
+    return n
+
+
+class _Command:
+    """A command that imports its implementation when it runs.
+
+    Unlike a closure, it can be pickled, e.g. as part of the arguments
+    passed to the devserver's autoreloader process.
+
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.__name__ = name.split(":")[1]
+
+    def __call__(self, args: argparse.Namespace) -> None:
+        module, function = self.name.split(":")
+        getattr(importlib.import_module(module), function)(args)
+
+
+def command(name: str) -> Callable[[argparse.Namespace], None]:
+    """Create a command that imports its implementation when it runs.
+
+    Parameters
+    ----------
+    name
+        the implementation as `module:function`, e.g. `blag.blag:build`
+
+    Returns
+    -------
+    Callable[[argparse.Namespace], None]
+
+    """
+    return _Command(name)
+
+
+if __name__ == "__main__":
+    main()
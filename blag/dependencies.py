@@ -0,0 +1,179 @@
+"""Template Dependencies.
+
+This module builds the dependency graph of the templates, by parsing their
+Jinja2 syntax trees for `extends`, `include` and `import` statements. This
+allows blag to re-render only those outputs, whose templates actually
+changed.
+
+Only the templates blag renders and the templates they (transitively)
+reference are parsed, so other files in the template directory (images,
+editor swap files, unused drafts) are ignored. Referenced templates that
+cannot be decoded or parsed reference nothing, their fingerprint is
+computed from their raw content.
+
+"""
+
+import logging
+import os
+
+from jinja2 import (
+    Environment,
+    FileSystemLoader,
+    TemplateNotFound,
+    TemplateSyntaxError,
+    meta,
+)
+from jinja2.loaders import split_template_path
+
+from blag.manifest import digest
+from blag.theme import PrecompiledLoader
+
+logger = logging.getLogger(__name__)
+
+
+def _raw_source(env: Environment, name: str) -> bytes:
+    """Read the template `name` as bytes, if it is a file."""
+    if isinstance(env.loader, FileSystemLoader):
+        pieces = split_template_path(name)
+        for searchpath in env.loader.searchpath:
+            try:
+                with open(os.path.join(searchpath, *pieces), "rb") as fh:
+                    return fh.read()
+            except OSError:
+                continue
+    return b""
+
+
+def _scan(env: Environment, name: str) -> tuple[str | bytes, set[str]]:
+    """Get the source of the template `name` and its references."""
+    try:
+        source, _, _ = env.loader.get_source(env, name)  # type: ignore
+    except TemplateNotFound:
+        return "", set()
+    except UnicodeDecodeError:
+        logger.debug(f"{name} cannot be decoded, using its raw content.")
+        return _raw_source(env, name), set()
+    try:
+        ast = env.parse(source)
+    except TemplateSyntaxError as exc:
+        logger.debug(f"{name} cannot be parsed, using its source: {exc}")
+        return source, set()
+    references: set[str] = set()
+    for reference in meta.find_referenced_templates(ast):
+        if reference is None:
+            logger.debug(f"{name} references a dynamic template.")
+            references.update(env.list_templates())
+            break
+        references.add(reference)
+    references.discard(name)
+    return source, references
+
+
+def _walk(
+    env: Environment, names: list[str]
+) -> tuple[dict[str, set[str]], dict[str, str]]:
+    """Get the dependency graph and the source digests of the templates."""
+    graph: dict[str, set[str]] = {}
+    digests: dict[str, str] = {}
+    todo = list(names)
+    while todo:
+        name = todo.pop()
+        if name in graph:
+            continue
+        source, graph[name] = _scan(env, name)
+        digests[name] = digest(source)
+        todo.extend(graph[name])
+    return graph, digests
+
+
+def dependency_graph(
+    env: Environment, names: list[str]
+) -> dict[str, set[str]]:
+    """Build the dependency graph of the templates `names`.
+
+    The graph contains `names` and all templates they (transitively)
+    reference. Templates referenced with a dynamic name (e.g. `{% include
+    var %}`) cannot be resolved statically, such templates are considered
+    to depend on all templates.
+
+    Parameters
+    ----------
+    env
+        the environment
+    names
+        names of the templates
+
+    Returns
+    -------
+    dict[str, set[str]]
+        mapping of each template to the templates it directly references
+
+    """
+    graph, _ = _walk(env, names)
+    return graph
+
+
+def dependencies(graph: dict[str, set[str]], name: str) -> set[str]:
+    """Get all templates `name` depends on, including itself.
+
+    Parameters
+    ----------
+    graph
+        the dependency graph
+    name
+        name of the template
+
+    Returns
+    -------
+    set[str]
+
+    """
+    result = set()
+    todo = [name]
+    while todo:
+        current = todo.pop()
+        if current in result:
+            continue
+        result.add(current)
+        todo.extend(graph.get(current, ()))
+    return result
+
+
+def template_fingerprints(
+    env: Environment,
+    names: list[str],
+) -> dict[str, str]:
+    """Compute a fingerprint of each template and its dependencies.
+
+    The fingerprint of a template changes if the template itself or any
+    template it (transitively) depends on changes.
+
+    Parameters
+    ----------
+    env
+        the environment
+    names
+        names of the templates
+
+    Returns
+    -------
+    dict[str, str]
+        mapping of template name to fingerprint
+
+    """
+    if isinstance(env.loader, PrecompiledLoader):
+        # the sources of precompiled templates are not available, so each
+        # template is considered to depend on the whole theme
+        with open(env.loader.path, "rb") as fh:
+            theme = digest(fh.read())
+        return {name: theme for name in names}
+
+    graph, digests = _walk(env, names)
+    return {
+        name: digest(
+            " ".join(
+                f"{n}:{digests[n]}" for n in sorted(dependencies(graph, name))
+            )
+        )
+        for name in names
+    }
@@ -4,21 +4,79 @@ This module provides functionality for blag's development server. It
 automatically detects changes in certain directories and rebuilds the
 site if necessary.
 
+After a rebuild, the browsers showing the site are notified via Server-Sent
+Events: the devserver injects a small script into the served HTML pages,
+that reloads the page if it changed and swaps changed stylesheets without a
+reload.
+
 """
 
 import argparse
+import email.utils
+import io
+import json
 import logging
 import multiprocessing
 import os
+import queue
+import threading
 import time
+import urllib.parse
+from datetime import timezone
 from functools import partial
-from http.server import HTTPServer, SimpleHTTPRequestHandler
-from typing import NoReturn
+from http import HTTPStatus
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing.queues import Queue
+from typing import IO, Any, NoReturn
 
 from blag import blag
+from blag.cli import configure_logging
+from blag.watch import watcher_factory
 
 logger = logging.getLogger(__name__)
 
+# the paths of the live reload endpoints
+EVENTS_PATH = "/_blag/events"
+SCRIPT_PATH = "/_blag/livereload.js"
+
+# outputs that do not cause a reload, see `_urls`
+NO_RELOAD_EXTENSIONS = (".xml",)
+
+SCRIPT_TAG = f'<script src="{SCRIPT_PATH}"></script>'.encode()
+
+# reloads the page if it changed and swaps changed stylesheets, the events
+# contain the changed outputs or "*" if everything changed
+SCRIPT = b"""\
+(function () {
+  var source = new EventSource("%s");
+  source.onmessage = function (event) {
+    var changed = JSON.parse(event.data);
+    var page = decodeURIComponent(location.pathname).replace(/^\\//, "");
+    if (page === "" || page.endsWith("/")) {
+      page += "index.html";
+    }
+    var reload = false;
+    changed.forEach(function (path) {
+      if (path.endsWith(".css")) {
+        var links = document.querySelectorAll('link[rel="stylesheet"]');
+        links.forEach(function (link) {
+          var url = new URL(link.href);
+          if (decodeURIComponent(url.pathname) === "/" + path) {
+            url.searchParams.set("_blag", Date.now());
+            link.href = url.href;
+          }
+        });
+      } else if (path === "*" || path === page || !path.endsWith(".html")) {
+        reload = true;
+      }
+    });
+    if (reload) {
+      location.reload();
+    }
+  };
+})();
+""" % EVENTS_PATH.encode()
+
 
 def get_last_modified(dirs: list[str]) -> float:
     """Get the last modified time.
@@ -54,43 +112,437 @@ def get_last_modified(dirs: list[str]) -> float:
     return last_mtime
 
 
-def autoreload(args: argparse.Namespace, wait: int=1) -> NoReturn:
+def autoreload(
+    args: argparse.Namespace,
+    wait: float = 1,
+    events: "Queue[list[str]] | None" = None,
+) -> NoReturn:
     """Start the autoreloader.
 
-    This method monitors the given directories for changes (i.e. the
-    last modified time). If the last modified time has changed, a
-    rebuild is triggered.
+    This method monitors the given directories for changes (see
+    `blag.watch`). If anything changed, the site is rebuilt.
+
+    The autoreloader keeps a `blag.blag.BuildSession`, so templates, the
+    Markdown instance and the articles stay in memory, and only the changed
+    files and the pages depending on them are rebuilt.
 
-    A rebuild is also performed immediately when this method is called
+    A build is also performed immediately when this method is called
     to avoid serving stale contents.
 
+    The autoreloader runs in its own process, which does not inherit the
+    logging configuration if it is spawned, so the logging is configured
+    again (see `blag.cli.configure_logging`).
+
     Parameters
     ----------
     args
-        contains the input-, template- and static dir
+        contains the input-, template- and static dir, and whether the
+        output is verbose
     wait
         number of seconds the devsever waits before checking for updated
-        content
+        content, if the directories have to be polled for changes
+    events
+        if given, the outputs written by each rebuild (relative to the
+        output directory, `*` if the whole site was built) are put into
+        this queue
 
     """
+    configure_logging(getattr(args, "verbose", False))
     dirs = [args.input_dir, args.template_dir, args.static_dir]
+    watcher = watcher_factory(dirs, wait)
     logger.info(f"Monitoring {dirs} for changes...")
+    session = blag.BuildSession(args)
     # make sure we trigger the rebuild immediately when we enter the
     # loop to avoid serving stale contents
-    last_mtime = 0.0
-    while True:
-        # make sure the devsever does not crash when the build fails with an
-        # exception
+    changed = set(dirs)
+    full = True
+    try:
+        while True:
+            # make sure the devsever does not crash when the build fails with
+            # an exception
+            try:
+                if changed:
+                    logger.info("Change detected, rebuilding...")
+                    logger.debug(f"Changed: {sorted(changed)}")
+                    start = time.perf_counter()
+                    written = None
+                    if full:
+                        session.build()
+                        full = False
+                    else:
+                        written = session.update(changed)
+                    elapsed = time.perf_counter() - start
+                    logger.info(f"Rebuilt in {elapsed * 1000:.0f} ms.")
+                    if session.profile is not None:
+                        print(session.profile.report())
+                    urls = _urls(written)
+                    if events is not None and urls:
+                        events.put(urls)
+                changed = watcher.wait(wait)
+            except Exception:
+                logger.exception("Error occurred during rebuild:")
+                logger.info(
+                    "Devserver did not crash, you may continue editing."
+                )
+                # the session might be inconsistent, build everything with
+                # the next change
+                full = True
+                changed = watcher.wait(wait)
+    finally:
+        session.close()
+        watcher.close()
+
+
+def _urls(written: set[str] | None) -> list[str]:
+    """Convert the outputs written by a rebuild into URL paths.
+
+    The feed and the sitemaps are left out, pages do not embed them, but
+    they are written on most changes and would reload every page.
+
+    """
+    if written is None:
+        return ["*"]
+    return sorted(
+        path.replace(os.sep, "/")
+        for path in written
+        if not path.endswith(NO_RELOAD_EXTENSIONS)
+    )
+
+
+class LiveReload:
+    """Push channel to the browsers.
+
+    Each connected browser gets its own queue of events, `broadcast` puts
+    an event into all queues.
+
+    """
+
+    def __init__(self) -> None:
+        self.clients: set[queue.Queue[list[str]]] = set()
+        self.lock = threading.Lock()
+
+    def connect(self) -> queue.Queue[list[str]]:
+        """Connect a browser.
+
+        Returns
+        -------
+        queue.Queue[list[str]]
+            the browser's events
+
+        """
+        events: queue.Queue[list[str]] = queue.Queue()
+        with self.lock:
+            self.clients.add(events)
+        return events
+
+    def disconnect(self, events: queue.Queue[list[str]]) -> None:
+        """Disconnect a browser.
+
+        Parameters
+        ----------
+        events
+            the browser's events, see `connect`
+
+        """
+        with self.lock:
+            self.clients.discard(events)
+
+    def broadcast(self, changed: list[str]) -> None:
+        """Send an event to all browsers.
+
+        Parameters
+        ----------
+        changed
+            the changed outputs, relative to the output directory, or `*`
+
+        """
+        with self.lock:
+            for events in self.clients:
+                events.put(changed)
+
+    def forward(self, events: "Queue[list[str]]") -> NoReturn:
+        """Broadcast the events of the autoreloader.
+
+        Parameters
+        ----------
+        events
+            see `autoreload`
+
+        """
+        while True:
+            self.broadcast(events.get())
+
+
+class RequestHandler(SimpleHTTPRequestHandler):
+    """Request handler of the devserver.
+
+    In addition to `http.server.SimpleHTTPRequestHandler`, the handler
+
+    * sends an `ETag` (derived from the file's modification time and size)
+      and answers conditional requests (`If-None-Match`,
+      `If-Modified-Since`) with `304 Not Modified`
+    * answers requests for a single byte range (`Range`, `If-Range`) with
+      `206 Partial Content`
+    * sends files with `sendfile`, so they do not pass through Python
+    * keeps connections alive (HTTP/1.1)
+
+    Browsers are asked to revalidate every response (`Cache-Control:
+    no-cache`), so they never show stale pages, but only download changed
+    files.
+
+    If `livereload` is given, the live reload script is injected into all
+    HTML pages and the events are served at `EVENTS_PATH`.
+
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    # byte range of the file being sent: offset and number of bytes
+    byte_range: tuple[int, int] | None = None
+
+    # seconds between keep alive messages on the events stream
+    keepalive = 15.0
+
+    def __init__(
+        self, *args: Any, livereload: LiveReload | None = None, **kwargs: Any
+    ):
+        # the request is handled by the constructor
+        self.livereload = livereload
+        super().__init__(*args, **kwargs)
+
+    def do_GET(self) -> None:
+        """Serve a GET request."""
+        if self.livereload is not None:
+            path = urllib.parse.urlsplit(self.path).path
+            if path == EVENTS_PATH:
+                self.send_events(self.livereload)
+                return
+            if path == SCRIPT_PATH:
+                self.send_response(HTTPStatus.OK)
+                self.send_header("Content-type", "text/javascript")
+                self.send_header("Content-Length", str(len(SCRIPT)))
+                self.end_headers()
+                self.wfile.write(SCRIPT)
+                return
+        super().do_GET()
+
+    def send_events(self, livereload: LiveReload) -> None:
+        """Stream the live reload events to the browser."""
+        self.close_connection = True
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        events = livereload.connect()
+        try:
+            while True:
+                try:
+                    changed = events.get(timeout=self.keepalive)
+                except queue.Empty:
+                    self.wfile.write(b": keepalive\n\n")
+                    continue
+                data = json.dumps(changed)
+                self.wfile.write(f"data: {data}\n\n".encode())
+        except OSError:
+            # the browser went away
+            pass
+        finally:
+            livereload.disconnect(events)
+
+    def send_head(self) -> Any:
+        """Send the response code and headers for GET and HEAD requests.
+
+        Returns
+        -------
+        file object | None
+            the file to send, or None if there is no body
+
+        """
+        self.byte_range = None
+        path = self.translate_path(self.path)
+        if os.path.isdir(path):
+            index = os.path.join(path, "index.html")
+            slash = urllib.parse.urlsplit(self.path).path.endswith("/")
+            if not slash or not os.path.isfile(index):
+                # redirects and directory listings
+                return super().send_head()
+            path = index
+        if path.endswith("/"):
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return None
+        try:
+            f = open(path, "rb")
+        except OSError:
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return None
+
         try:
-            mtime = get_last_modified(dirs)
-            if mtime > last_mtime:
-                last_mtime = mtime
-                logger.info("Change detected, rebuilding...")
-                blag.build(args)
-            time.sleep(wait)
-        except Exception:
-            logger.exception("Error occurred during rebuild:")
-            logger.info("Devserver did not crash, you may continue editing.")
+            return self.send_file_head(f, self.guess_type(path))
+        except BaseException:
+            f.close()
+            raise
+
+    def send_file_head(self, f: IO[bytes], ctype: str) -> IO[bytes] | None:
+        """Send the response code and headers for the file `f`."""
+        fs = os.fstat(f.fileno())
+        etag = f'"{fs.st_mtime_ns:x}-{fs.st_size:x}"'
+        if self.not_modified(etag, fs.st_mtime):
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            f.close()
+            return None
+
+        if self.livereload is not None and ctype == "text/html":
+            body = inject_script(f.read())
+            f.close()
+            self.send_response(HTTPStatus.OK)
+            self.send_header("Content-type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header(
+                "Last-Modified", self.date_time_string(fs.st_mtime)
+            )
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            return io.BytesIO(body)
+
+        size = fs.st_size
+        self.byte_range = (0, size)
+        range_ = None
+        if self.headers.get("If-Range", etag) == etag:
+            range_ = parse_range(self.headers.get("Range"), size)
+        if range_ is None:
+            self.send_response(HTTPStatus.OK)
+        elif range_ == (0, 0):
+            self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+            self.send_header("Content-Range", f"bytes */{size}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            f.close()
+            return None
+        else:
+            self.byte_range = range_
+            start, length = range_
+            self.send_response(HTTPStatus.PARTIAL_CONTENT)
+            self.send_header(
+                "Content-Range", f"bytes {start}-{start + length - 1}/{size}"
+            )
+        self.send_header("Content-type", ctype)
+        self.send_header("Content-Length", str(self.byte_range[1]))
+        self.send_header("Last-Modified", self.date_time_string(fs.st_mtime))
+        self.send_header("ETag", etag)
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        return f
+
+    def not_modified(self, etag: str, mtime: float) -> bool:
+        """Check if the client's copy of a file is up to date.
+
+        Parameters
+        ----------
+        etag
+            the file's ETag
+        mtime
+            the file's modification time
+
+        Returns
+        -------
+        bool
+
+        """
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            # If-None-Match takes precedence over If-Modified-Since
+            tags = [
+                t.strip().removeprefix("W/") for t in if_none_match.split(",")
+            ]
+            return "*" in tags or etag in tags
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since is None:
+            return False
+        try:
+            date = email.utils.parsedate_to_datetime(if_modified_since)
+        except (TypeError, IndexError, OverflowError, ValueError):
+            # ignore ill-formed values
+            return False
+        if date.tzinfo is None:
+            date = date.replace(tzinfo=timezone.utc)
+        return int(mtime) <= date.timestamp()
+
+    def copyfile(self, source: Any, outputfile: Any) -> None:
+        """Send the file (range) with `sendfile`."""
+        if self.byte_range is None:
+            super().copyfile(source, outputfile)
+            return
+        offset, count = self.byte_range
+        self.byte_range = None
+        if count > 0:
+            self.connection.sendfile(source, offset, count)
+
+
+def inject_script(html: bytes) -> bytes:
+    """Inject the live reload script into an HTML page.
+
+    Parameters
+    ----------
+    html
+
+    Returns
+    -------
+    bytes
+
+    """
+    i = html.lower().rfind(b"</body>")
+    if i < 0:
+        return html + SCRIPT_TAG
+    return html[:i] + SCRIPT_TAG + html[i:]
+
+
+def parse_range(header: str | None, size: int) -> tuple[int, int] | None:
+    """Parse the `Range` header of a request.
+
+    Only single byte ranges are supported, other ranges are ignored, i.e.
+    the whole file is sent.
+
+    Parameters
+    ----------
+    header
+        value of the `Range` header
+    size
+        size of the file
+
+    Returns
+    -------
+    tuple[int, int] | None
+        offset and length of the range, None if the whole file is to be
+        sent and (0, 0) if the range cannot be satisfied
+
+    """
+    if header is None or not header.startswith("bytes="):
+        return None
+    spec = header.removeprefix("bytes=").strip()
+    if "," in spec or "-" not in spec:
+        return None
+    first, last = (part.strip() for part in spec.split("-", 1))
+    try:
+        if not first:
+            # suffix range: the last bytes
+            length = int(last)
+            if length <= 0 or size == 0:
+                return (0, 0)
+            return (max(0, size - length), min(length, size))
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        return (0, 0)
+    if start < 0 or end < start:
+        return None
+    return (start, min(end, size - 1) - start + 1)
 
 
 def serve(args: argparse.Namespace) -> None:
@@ -99,14 +551,25 @@ def serve(args: argparse.Namespace) -> None:
     Parameters
     ----------
     args
-        contains the input-, template- and static dir
+        contains the input-, template- and static dir, and the address and
+        port to listen on
 
     """
-    httpd = HTTPServer(
-        ("", 8000),
-        partial(SimpleHTTPRequestHandler, directory=args.output_dir),
+    livereload = LiveReload()
+    httpd = ThreadingHTTPServer(
+        (args.bind, args.port),
+        partial(
+            RequestHandler, directory=args.output_dir, livereload=livereload
+        ),
     )
-    proc = multiprocessing.Process(target=autoreload, args=(args,))
+    events: Queue[list[str]] = multiprocessing.Queue()
+    threading.Thread(
+        target=livereload.forward, args=(events,), daemon=True
+    ).start()
+    proc = multiprocessing.Process(target=autoreload, args=(args, 1, events))
     proc.start()
-    logger.info("\n\n  Devserver Started -- visit http://localhost:8000\n")
+    host = args.bind or "localhost"
+    logger.info(
+        f"\n\n  Devserver Started -- visit http://{host}:{args.port}\n"
+    )
     httpd.serve_forever()
@@ -0,0 +1,86 @@
+"""Atom Feed.
+
+`feedgenerator` collects all entries of a feed in memory before it
+serializes the whole document. `StreamingAtomFeed` instead adds the entries
+while the feed is written, so only one entry is held at a time and the
+document is written directly into its file (see `blag.sync.write_with`).
+
+The output is the same as the one of `feedgenerator.Atom1Feed`.
+
+Entries can also be passed already serialized (see
+`StreamingAtomFeed.serialize`), so a feed that is written again, e.g. by
+the devserver after an article changed, only needs to serialize the entries
+that changed.
+
+"""
+
+import datetime
+import io
+from collections.abc import Iterable
+from typing import Any
+
+import feedgenerator
+from feedgenerator.django.utils.feedgenerator import SimplerXMLGenerator
+
+
+class StreamingAtomFeed(feedgenerator.Atom1Feed):  # type: ignore[misc]
+    """Atom feed that adds its entries while it is written.
+
+    Parameters
+    ----------
+    entries
+        the keyword arguments of `add_item` for each entry, or the entry
+        serialized with `serialize`, they are consumed by `write`
+    updated
+        date of the latest entry, if None the current time is used
+    **kwargs
+        see `feedgenerator.Atom1Feed`
+
+    """
+
+    def __init__(
+        self,
+        entries: Iterable[dict[str, Any] | str],
+        updated: datetime.datetime | None = None,
+        **kwargs: Any,
+    ):
+        super().__init__(**kwargs)
+        self.entries = entries
+        self.updated = updated
+
+    def latest_post_date(self) -> datetime.datetime:
+        """Get the date of the latest entry."""
+        if self.updated is None:
+            return datetime.datetime.now(tz=datetime.timezone.utc)
+        return self.updated
+
+    def serialize(self, entry: dict[str, Any]) -> str:
+        """Serialize an entry.
+
+        Parameters
+        ----------
+        entry
+            the keyword arguments of `add_item`
+
+        Returns
+        -------
+        str
+            the `entry` element
+
+        """
+        buffer = io.StringIO()
+        handler = SimplerXMLGenerator(
+            buffer, "utf-8", short_empty_elements=True
+        )
+        self.add_item(**entry)
+        super().write_items(handler)
+        self.items.clear()
+        return buffer.getvalue()
+
+    def write_items(self, handler: Any) -> None:
+        """Write the entries one at a time."""
+        for entry in self.entries:
+            if not isinstance(entry, str):
+                entry = self.serialize(entry)
+            # writes the serialized entry as it is
+            handler.ignorableWhitespace(entry)
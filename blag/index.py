@@ -0,0 +1,261 @@
+"""Article Index.
+
+This module maintains an SQLite database of the articles' metadata (title,
+description, date, tags and the remaining metadata elements) and their
+output paths. The index is stored in the output directory and updated
+incrementally with every build: only articles whose source changed are
+written again, articles that are gone are removed.
+
+The index is meant for scripting (see `blag query`), e.g. for deployment
+tools that need to know the latest articles or the articles of a tag,
+without parsing the generated html.
+
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import sys
+from collections.abc import Mapping, Sequence
+from datetime import datetime
+from typing import Any
+
+INDEX_FILE = ".blag-index.sqlite"
+# bump when the schema changes, the index is then created again
+INDEX_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE articles (
+    dst TEXT PRIMARY KEY,
+    hash TEXT,
+    title TEXT NOT NULL,
+    description TEXT,
+    date TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    meta TEXT NOT NULL
+);
+CREATE INDEX articles_timestamp ON articles (timestamp);
+CREATE TABLE tags (
+    tag TEXT NOT NULL,
+    dst TEXT NOT NULL,
+    PRIMARY KEY (tag, dst)
+);
+CREATE INDEX tags_dst ON tags (dst);
+"""
+
+
+class ArticleIndex:
+    """SQLite index of the articles.
+
+    If the database is hard linked, e.g. into a staging directory (see
+    `blag.sync.stage`), it is copied first, so the other links are not
+    modified.
+
+    Parameters
+    ----------
+    output_dir
+        the output directory, the index is stored in it
+
+    """
+
+    def __init__(self, output_dir: str):
+        self.path = os.path.join(output_dir, INDEX_FILE)
+        try:
+            if os.stat(self.path).st_nlink > 1:
+                _unlink_copy(self.path)
+        except FileNotFoundError:
+            pass
+        self.connection = sqlite3.connect(self.path)
+        self.connection.row_factory = sqlite3.Row
+        version = self.connection.execute("PRAGMA user_version").fetchone()
+        if version[0] != INDEX_VERSION:
+            self._create()
+
+    def _create(self) -> None:
+        """Create the tables, dropping outdated ones."""
+        with self.connection:
+            self.connection.execute("DROP TABLE IF EXISTS articles")
+            self.connection.execute("DROP TABLE IF EXISTS tags")
+            self.connection.executescript(SCHEMA)
+            self.connection.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+
+    def close(self) -> None:
+        """Close the database."""
+        self.connection.close()
+
+    def update(
+        self,
+        articles: Sequence[tuple[str, Mapping[str, Any]]],
+        hashes: Mapping[str, str],
+    ) -> int:
+        """Update the index.
+
+        Parameters
+        ----------
+        articles
+            relative path and context of each article
+        hashes
+            the hashes of the articles' sources by their relative path, see
+            `blag.manifest.Manifest.articles_changed`. Articles without a
+            hash are always updated.
+
+        Returns
+        -------
+        int
+            the number of added, changed and removed articles
+
+        """
+        known = dict(
+            self.connection.execute("SELECT dst, hash FROM articles")
+        )
+        removed = known.keys() - {dst for dst, _ in articles}
+        changed = [
+            (dst, context)
+            for dst, context in articles
+            if hashes.get(dst) is None or known.get(dst) != hashes[dst]
+        ]
+        with self.connection:
+            for dst in removed:
+                self._delete(dst)
+            for dst, context in changed:
+                self._delete(dst)
+                self._insert(dst, hashes.get(dst), context)
+        return len(removed) + len(changed)
+
+    def _delete(self, dst: str) -> None:
+        self.connection.execute("DELETE FROM articles WHERE dst = ?", (dst,))
+        self.connection.execute("DELETE FROM tags WHERE dst = ?", (dst,))
+
+    def _insert(
+        self, dst: str, hash_: str | None, context: Mapping[str, Any]
+    ) -> None:
+        date: datetime = context["date"]
+        meta = {
+            key: value
+            for key, value in context.items()
+            if key not in ("content", "dst")
+        }
+        self.connection.execute(
+            "INSERT INTO articles VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                dst,
+                hash_,
+                context["title"],
+                context.get("description"),
+                date.isoformat(),
+                date.timestamp(),
+                json.dumps(meta, default=str),
+            ),
+        )
+        self.connection.executemany(
+            "INSERT OR IGNORE INTO tags VALUES (?, ?)",
+            [(tag, dst) for tag in context.get("tags", [])],
+        )
+
+    def articles(
+        self, tag: str | None = None, limit: int | None = None
+    ) -> list[dict[str, Any]]:
+        """Query the articles, newest first.
+
+        Parameters
+        ----------
+        tag
+            if given, only articles with this tag
+        limit
+            if given, at most this many articles
+
+        Returns
+        -------
+        list[dict[str, Any]]
+            relative path (`dst`), `title`, `description`, `date` (in ISO
+            format), `tags` and the remaining metadata (`meta`) of each
+            article
+
+        """
+        query = "SELECT * FROM articles"
+        params: list[Any] = []
+        if tag is not None:
+            query += " WHERE dst IN (SELECT dst FROM tags WHERE tag = ?)"
+            params.append(tag)
+        query += " ORDER BY timestamp DESC, dst"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        result = []
+        for row in self.connection.execute(query, params):
+            meta = json.loads(row["meta"])
+            result.append(
+                dict(
+                    dst=row["dst"],
+                    title=row["title"],
+                    description=row["description"],
+                    date=row["date"],
+                    tags=meta.pop("tags", []),
+                    meta=meta,
+                )
+            )
+        return result
+
+    def tags(self) -> list[tuple[str, int]]:
+        """Query the tags and their number of articles.
+
+        Returns
+        -------
+        list[tuple[str, int]]
+            the tags, by number of articles (descending) and name
+
+        """
+        return [
+            (tag, count)
+            for tag, count in self.connection.execute(
+                "SELECT tag, COUNT(*) AS n FROM tags GROUP BY tag "
+                "ORDER BY n DESC, tag"
+            )
+        ]
+
+
+def _unlink_copy(path: str) -> None:
+    """Replace the hard link `path` with a copy of the file."""
+    tmp = f"{path}.tmp"
+    shutil.copy2(path, tmp)
+    os.replace(tmp, path)
+
+
+def query_command(args: argparse.Namespace) -> None:
+    """Run the `query` command.
+
+    Prints the articles (date, relative path and title, tab separated) or,
+    with `--tags`, the tags and their number of articles. With `--json`, the
+    result is printed as JSON.
+
+    Parameters
+    ----------
+    args
+        contains the output dir and the query
+
+    """
+    if not os.path.exists(os.path.join(args.output_dir, INDEX_FILE)):
+        print(f"There is no index in {args.output_dir}, run blag build first.")
+        sys.exit(1)
+    index = ArticleIndex(args.output_dir)
+    try:
+        if args.tags:
+            tags = index.tags()
+            if args.json:
+                lines = [json.dumps(dict(tags))]
+            else:
+                lines = [f"{tag}\t{count}" for tag, count in tags]
+        else:
+            articles = index.articles(args.tag, args.limit)
+            if args.json:
+                lines = [json.dumps(articles)]
+            else:
+                lines = [
+                    f"{a['date']}\t{a['dst']}\t{a['title']}" for a in articles
+                ]
+    finally:
+        index.close()
+    for line in lines:
+        print(line)
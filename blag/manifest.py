@@ -0,0 +1,515 @@
+"""Build Manifest.
+
+This module contains the build manifest, that allows blag to build a site
+incrementally. The manifest is stored in the output directory and records for
+every markdown source its content hash, its destination, the metadata of the
+context it was converted into and the time its content last changed (for the
+sitemap, see `blag.sitemap`). The converted content itself is not recorded,
+it is kept in the cache (see `blag.cache`) and loaded from there when needed.
+Additionally, it records fingerprints of everything else that influences the
+output, namely blag's version, the markdown configuration, the site
+configuration and each template (including the templates it depends on).
+
+On the next build, sources whose hash did not change are not converted again
+and -- if their template did not change either -- not rendered again.
+
+The manifest also records a digest of each listing page (index, archive and
+tag pages), computed from the articles on the page, so pages whose articles
+did not change are not rendered again. The tag index (see
+`blag.blag.tag_index`) is recorded as well, so the pages of tags that are
+no longer used can be removed.
+
+"""
+
+import hashlib
+import json
+import logging
+import os
+from collections.abc import Mapping, Sequence
+from datetime import datetime
+from typing import Any
+
+from blag.sync import write_file
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = ".blag-manifest.json"
+MANIFEST_VERSION = 1
+
+# fingerprints that invalidate the converted markdown
+CONVERT_FINGERPRINTS = ("blag", "markdown")
+# fingerprints that invalidate all rendered outputs, `minify` and `assets` are
+# only set if the outputs are minified and the assets fingerprinted,
+# respectively
+RENDER_FINGERPRINTS = ("site", "minify", "assets")
+
+
+def digest(data: str | bytes) -> str:
+    """Compute the hex digest of `data`.
+
+    Parameters
+    ----------
+    data
+        string or bytes, strings are utf-8 encoded
+
+    Returns
+    -------
+    str
+
+    """
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+def serialize_context(context: dict[str, Any]) -> dict[str, Any]:
+    """Convert a context into something JSON serializable.
+
+    The only non-JSON type `convert_markdown` produces is the `date`.
+
+    Parameters
+    ----------
+    context
+
+    Returns
+    -------
+    dict[str, Any]
+
+    """
+    context = context.copy()
+    if isinstance(context.get("date"), datetime):
+        context["date"] = context["date"].isoformat()
+    return context
+
+
+def deserialize_context(context: dict[str, Any]) -> dict[str, Any]:
+    """Reverse `serialize_context`.
+
+    Parameters
+    ----------
+    context
+
+    Returns
+    -------
+    dict[str, Any]
+
+    """
+    context = context.copy()
+    if "date" in context:
+        context["date"] = datetime.fromisoformat(context["date"])
+    return context
+
+
+class Manifest:
+    """The build manifest.
+
+    A manifest is loaded at the beginning of a build, queried and updated
+    while the sources are processed and saved at the end of the build.
+    Sources that are not recorded during the build are considered deleted.
+
+    Parameters
+    ----------
+    output_dir
+        the output directory, where the manifest is stored
+    fingerprints
+        mapping of the things that influence the output to their digests,
+        see `CONVERT_FINGERPRINTS` and `RENDER_FINGERPRINTS`
+    templates
+        mapping of template names to their fingerprints, see
+        `blag.dependencies.template_fingerprints`
+
+    """
+
+    def __init__(
+        self,
+        output_dir: str,
+        fingerprints: dict[str, str],
+        templates: dict[str, str] | None = None,
+    ):
+        self.output_dir = output_dir
+        self.fingerprints = fingerprints
+        self.templates = templates or {}
+        self.previous: dict[str, Any] = {}
+        self.sources: dict[str, dict[str, Any]] = {}
+        self.listings = ""
+        # digests of the listing pages
+        self.pages: dict[str, str] = {}
+        # hashes of the articles by their destination
+        self.hashes: dict[str, str] = {}
+        # the articles of each tag
+        self.tags: dict[str, list[str]] = {}
+
+    @property
+    def path(self) -> str:
+        """Path of the manifest file."""
+        return os.path.join(self.output_dir, MANIFEST_FILE)
+
+    @classmethod
+    def load(
+        cls,
+        output_dir: str,
+        fingerprints: dict[str, str],
+        templates: dict[str, str] | None = None,
+    ) -> "Manifest":
+        """Load the manifest from `output_dir`.
+
+        If there is no manifest, or it cannot be read, an empty manifest is
+        returned, which will cause a full build.
+
+        Parameters
+        ----------
+        output_dir
+        fingerprints
+        templates
+
+        Returns
+        -------
+        Manifest
+
+        """
+        manifest = cls(output_dir, fingerprints, templates)
+        try:
+            with open(manifest.path) as fh:
+                previous = json.load(fh)
+        except FileNotFoundError:
+            return manifest
+        except ValueError:
+            logger.warning(f"Ignoring corrupt manifest {manifest.path}.")
+            return manifest
+        if previous.get("version") != MANIFEST_VERSION:
+            return manifest
+        manifest.previous = previous
+        manifest.pages = dict(previous.get("pages", {}))
+        manifest.tags = dict(previous.get("tags", {}))
+        return manifest
+
+    def data(self) -> dict[str, Any]:
+        """Get the state of this build, as it is saved.
+
+        Returns
+        -------
+        dict[str, Any]
+
+        """
+        return dict(
+            version=MANIFEST_VERSION,
+            fingerprints=self.fingerprints,
+            templates=self.templates,
+            sources=self.sources,
+            listings=self.listings,
+            pages=self.pages,
+            tags=self.tags,
+        )
+
+    def save(self) -> None:
+        """Save the manifest."""
+        write_file(self.path, json.dumps(self.data()))
+
+    def settle(self) -> None:
+        """Consider the outputs rendered with the current fingerprints.
+
+        This is called once all outputs are built, so `template_changed`
+        is False until the fingerprints or templates change again, e.g.
+        when the outputs are updated after the build.
+
+        """
+        self.previous = dict(
+            self.previous,
+            fingerprints=dict(self.fingerprints),
+            templates=dict(self.templates),
+        )
+
+    def invalidate(self) -> None:
+        """Remove the saved manifest.
+
+        This is used while the outputs are updated without the manifest
+        being saved, so the next build does not trust a manifest that does
+        not match the outputs anymore. `save` writes it again.
+
+        """
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def renew(
+        self,
+        fingerprints: dict[str, str],
+        templates: dict[str, str] | None = None,
+    ) -> "Manifest":
+        """Start the next build from this manifest, without loading it.
+
+        Parameters
+        ----------
+        fingerprints
+        templates
+
+        Returns
+        -------
+        Manifest
+            a manifest whose previous build is this one
+
+        """
+        manifest = type(self)(self.output_dir, fingerprints, templates)
+        manifest.previous = self.data()
+        manifest.pages = dict(self.pages)
+        manifest.tags = dict(self.tags)
+        return manifest
+
+    def _unchanged(self, keys: tuple[str, ...]) -> bool:
+        """Check if the fingerprints for `keys` did not change."""
+        previous = self.previous.get("fingerprints", {})
+        return all(previous.get(k) == self.fingerprints.get(k) for k in keys)
+
+    def template_changed(self, template: str | None = None) -> bool:
+        """Check if outputs rendered with `template` need to be re-rendered.
+
+        This is the case if the template, any template it depends on, or the
+        site configuration changed, or if the markdown is converted again
+        (see `CONVERT_FINGERPRINTS`), as the outputs contain the converted
+        markdown.
+
+        Parameters
+        ----------
+        template
+            name of the template, if None only the fingerprints are
+            considered
+
+        Returns
+        -------
+        bool
+
+        """
+        if not self._unchanged(CONVERT_FINGERPRINTS + RENDER_FINGERPRINTS):
+            return True
+        if template is None:
+            return False
+        previous: dict[str, str] = self.previous.get("templates", {})
+        return previous.get(template) != self.templates.get(template)
+
+    def lookup(self, src: str, dst: str, hash_: str) -> dict[str, Any] | None:
+        """Look up the metadata of an unchanged source.
+
+        Parameters
+        ----------
+        src
+            relative path of the markdown source
+        dst
+            relative path of the html destination
+        hash_
+            digest of the source's content
+
+        Returns
+        -------
+        dict[str, Any] | None
+            the context `src` was converted into without its `content`, or
+            None if `src` changed and needs to be converted again
+
+        """
+        if not self._unchanged(CONVERT_FINGERPRINTS):
+            return None
+        entry = self.previous.get("sources", {}).get(src)
+        if entry is None or entry["hash"] != hash_ or entry["dst"] != dst:
+            return None
+        return deserialize_context(entry["context"])
+
+    def needs_render(self, dst: str, template: str | None = None) -> bool:
+        """Check if an output needs to be rendered anyway.
+
+        This is the case if its template changed (see `template_changed`) or
+        the output file is missing.
+
+        Parameters
+        ----------
+        dst
+            relative path of the output
+        template
+            name of the template `dst` is rendered with
+
+        Returns
+        -------
+        bool
+
+        """
+        if self.template_changed(template):
+            return True
+        return not os.path.exists(os.path.join(self.output_dir, dst))
+
+    def record(
+        self,
+        src: str,
+        dst: str,
+        hash_: str,
+        context: dict[str, Any],
+        mtime: float | None = None,
+    ) -> None:
+        """Record a processed source.
+
+        The `content` of the context is not recorded. The time the
+        source's content last changed (see `lastmod`) is kept as long as its
+        hash stays the same, otherwise it is `mtime`.
+
+        Parameters
+        ----------
+        src
+            relative path of the markdown source
+        dst
+            relative path of the html destination
+        hash_
+            digest of the source's content
+        context
+            the context `src` was converted into
+        mtime
+            modification time of the source
+
+        """
+        previous = self.previous.get("sources", {})
+        entry = self.sources.get(src) or previous.get(src)
+        if entry is not None and entry["hash"] == hash_:
+            mtime = entry.get("modified") or mtime
+        self.sources[src] = dict(
+            hash=hash_,
+            dst=dst,
+            context=serialize_context(
+                {k: v for k, v in context.items() if k != "content"}
+            ),
+            modified=mtime,
+        )
+
+    def forget(self, src: str) -> None:
+        """Forget a deleted source.
+
+        Parameters
+        ----------
+        src
+            relative path of the markdown source
+
+        """
+        self.sources.pop(src, None)
+
+    def lastmod(self) -> dict[str, float]:
+        """Get the times the recorded sources' contents last changed.
+
+        Unlike the modification times of the sources, these do not change
+        if a source is only touched or checked out again.
+
+        Returns
+        -------
+        dict[str, float]
+            seconds since the epoch by relative html destination, sources
+            whose time is not known are left out
+
+        """
+        return {
+            entry["dst"]: entry["modified"]
+            for entry in self.sources.values()
+            if entry.get("modified") is not None
+        }
+
+    def articles_changed(
+        self,
+        articles: Sequence[tuple[str, Mapping[str, Any]]],
+    ) -> bool:
+        """Check if the articles changed since the last build.
+
+        The listings (feed, index, etc.) depend on the sorted list of
+        articles and their contents, if any of those changed the listings
+        need to be regenerated.
+
+        Parameters
+        ----------
+        articles
+            the sorted articles of this build
+
+        Returns
+        -------
+        bool
+
+        """
+        self.hashes = {e["dst"]: e["hash"] for e in self.sources.values()}
+        self.listings = digest(
+            json.dumps([(dst, self.hashes.get(dst)) for dst, _ in articles])
+        )
+        return self.listings != self.previous.get("listings")
+
+    def page_changed(
+        self,
+        dst: str,
+        articles: Sequence[tuple[str, Mapping[str, Any]]],
+        extra: Any,
+        template: str | None,
+    ) -> bool:
+        """Check if a listing page needs to be rendered.
+
+        This is the case if the articles on the page or `extra` changed, if
+        the template changed or if the output is missing. The page's digest
+        is recorded. `articles_changed` must have been called before.
+
+        Parameters
+        ----------
+        dst
+            relative path of the page
+        articles
+            the articles on the page
+        extra
+            anything else the page depends on, must be JSON serializable
+        template
+            name of the template the page is rendered with
+
+        Returns
+        -------
+        bool
+
+        """
+        page = digest(
+            json.dumps(
+                [extra, [(d, self.hashes.get(d)) for d, _ in articles]]
+            )
+        )
+        changed = self.pages.get(dst) != page or self.needs_render(
+            dst, template
+        )
+        self.pages[dst] = page
+        return changed
+
+    def forget_page(self, dst: str) -> None:
+        """Forget a removed listing page.
+
+        Parameters
+        ----------
+        dst
+            relative path of the page
+
+        """
+        self.pages.pop(dst, None)
+
+    def update_tags(self, tags: dict[str, list[str]]) -> set[str]:
+        """Record the tag index.
+
+        Parameters
+        ----------
+        tags
+            the destinations of the articles of each tag
+
+        Returns
+        -------
+        set[str]
+            the tags that are gone since the tag index was last recorded
+
+        """
+        removed = self.tags.keys() - tags.keys()
+        self.tags = tags
+        return removed
+
+    def remove_stale(self) -> None:
+        """Remove outputs of sources deleted since the last build."""
+        current = {entry["dst"] for entry in self.sources.values()}
+        for src, entry in self.previous.get("sources", {}).items():
+            if src in self.sources or entry["dst"] in current:
+                continue
+            path = os.path.join(self.output_dir, entry["dst"])
+            logger.info(f"Removing {path}, its source {src} is gone.")
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
@@ -7,15 +7,29 @@ processing.
 
 import logging
 from datetime import datetime
+from typing import Any
 from urllib.parse import urlsplit, urlunsplit
 from xml.etree.ElementTree import Element
 
+import markdown
+import pygments
+import pygments.lexers
 from markdown import Markdown
-from markdown.extensions import Extension
+from markdown.extensions import Extension, codehilite
 from markdown.treeprocessors import Treeprocessor
 
+from blag.cache import Cache
+
 logger = logging.getLogger(__name__)
 
+EXTENSIONS = [
+    "meta",
+    "fenced_code",
+    "codehilite",
+    "smarty",
+    "footnotes",
+]
+
 
 def markdown_factory() -> Markdown:
     """Create a Markdown instance.
@@ -30,11 +44,7 @@ def markdown_factory() -> Markdown:
     """
     md = Markdown(
         extensions=[
-            "meta",
-            "fenced_code",
-            "codehilite",
-            "smarty",
-            "footnotes",
+            *EXTENSIONS,
             MarkdownLinkExtension(),
         ],
         output_format="html",
@@ -42,6 +52,111 @@ def markdown_factory() -> Markdown:
     return md
 
 
+def markdown_fingerprint() -> str:
+    """Describe the Markdown configuration.
+
+    The fingerprint changes whenever the output of `convert_markdown` might
+    change for the same input, i.e. when the extensions or the versions of
+    markdown or pygments change.
+
+    Returns
+    -------
+    str
+
+    """
+    return ":".join(
+        [
+            markdown.__version__,
+            pygments.__version__,
+            ",".join(EXTENSIONS),
+            "mdlink",
+        ]
+    )
+
+
+# state of the memoized highlighting, see `memoize_highlighting`
+_highlight_cache: Cache | None = None
+_lexers: dict[str, Any] = {}
+_guessed_lexers: dict[str, str] = {}
+
+
+def memoize_highlighting(cache: Cache | None = None) -> None:
+    """Memoize the syntax highlighting of code blocks.
+
+    The `codehilite` extension calls Pygments for every code block on every
+    conversion, guessing the language of code blocks without language is
+    particularly expensive. This method replaces the Pygments functions used
+    by `codehilite` with memoizing equivalents:
+
+    * lexers are looked up only once per language and options
+    * guessed languages are stored in the `lexer` namespace of `cache`
+    * highlighted code is stored in the `highlight` namespace of `cache`
+
+    The results are identical to the ones of Pygments. Since the cache is on
+    disk, it is shared between builds and worker processes.
+
+    Parameters
+    ----------
+    cache
+        the persistent cache, if None, only the lexer lookups are memoized
+        within this process
+
+    """
+    global _highlight_cache
+    _highlight_cache = cache
+    setattr(codehilite, "highlight", _highlight)
+    setattr(codehilite, "get_lexer_by_name", _get_lexer_by_name)
+    setattr(codehilite, "guess_lexer", _guess_lexer)
+
+
+def _describe(obj: Any) -> str:
+    """Describe a Pygments lexer or formatter by its class and options."""
+    cls = type(obj)
+    return f"{cls.__module__}.{cls.__qualname__}:{sorted(obj.options.items())}"
+
+
+def _get_lexer_by_name(alias: str, **options: Any) -> Any:
+    """Memoized `pygments.lexers.get_lexer_by_name`."""
+    key = repr((alias, sorted(options.items())))
+    if key not in _lexers:
+        _lexers[key] = pygments.lexers.get_lexer_by_name(alias, **options)
+    return _lexers[key]
+
+
+def _guess_lexer(text: str, **options: Any) -> Any:
+    """Memoized `pygments.lexers.guess_lexer`."""
+    key = Cache.key(text, repr(sorted(options.items())), pygments.__version__)
+    if key not in _guessed_lexers:
+        cached = None
+        if _highlight_cache is not None:
+            cached = _highlight_cache.get("lexer", key)
+        if cached is not None:
+            _guessed_lexers[key] = cached.decode("utf-8")
+        else:
+            lexer = pygments.lexers.guess_lexer(text, **options)
+            _guessed_lexers[key] = lexer.aliases[0]
+            if _highlight_cache is not None:
+                _highlight_cache.set(
+                    "lexer", key, _guessed_lexers[key].encode("utf-8")
+                )
+    return _get_lexer_by_name(_guessed_lexers[key], **options)
+
+
+def _highlight(code: str, lexer: Any, formatter: Any) -> str:
+    """Memoized `pygments.highlight`."""
+    if _highlight_cache is None:
+        return str(pygments.highlight(code, lexer, formatter))
+    key = Cache.key(
+        code, _describe(lexer), _describe(formatter), pygments.__version__
+    )
+    cached = _highlight_cache.get("highlight", key)
+    if cached is not None:
+        return cached.decode("utf-8")
+    result = str(pygments.highlight(code, lexer, formatter))
+    _highlight_cache.set("highlight", key, result.encode("utf-8"))
+    return result
+
+
 def convert_markdown(
     md: Markdown,
     markdown: str,
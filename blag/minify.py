@@ -0,0 +1,199 @@
+"""Minification.
+
+This module minifies the rendered HTML and the copied CSS files, see
+`Minifier`. The minification is conservative, so it never changes how a
+page is displayed:
+
+* HTML: comments are removed, runs of whitespace are collapsed into a
+  single space, and whitespace in the document's head is removed. As
+  stylesheets can display any element inline, whitespace between other
+  elements is kept. The contents of `pre`, `textarea`, `script` and `style`
+  elements, e.g. the code blocks highlighted by `codehilite`, and the tags
+  themselves are kept as they are.
+* CSS: comments are removed, whitespace is collapsed and removed around
+  braces, semicolons, commas, colons and child combinators. Strings are
+  kept as they are.
+
+"""
+
+import re
+from collections.abc import Callable
+
+from blag.cache import Cache
+from blag.version import __VERSION__
+
+# elements whose surrounding whitespace is never displayed, whatever the
+# stylesheet says
+HIDDEN_ELEMENTS = frozenset(
+    ["!doctype", "html", "head", "meta", "link", "title", "base", "body"]
+)
+
+_HTML_TOKEN = re.compile(
+    # elements whose content is kept as it is
+    r"(?P<raw><(?P<name>pre|textarea|script|style)\b.*?</(?P=name)\s*>)"
+    # comments, except conditional ones
+    r"|(?P<comment><!--(?!\[if).*?-->)"
+    # tags, attribute values may contain ">"
+    r"""|(?P<tag><(?P<tagname>[!/]?[\w-]+)(?:[^>"']|"[^"]*"|'[^']*')*>)""",
+    re.DOTALL | re.IGNORECASE,
+)
+# not \s, non-breaking spaces are displayed
+_WHITESPACE = re.compile(r"[ \t\n\r\f]+")
+
+_CSS_TOKEN = re.compile(
+    r"""(?P<string>"(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')"""
+    r"|(?P<comment>/\*.*?\*/)",
+    re.DOTALL,
+)
+_CSS_PUNCTUATION = re.compile(r" ?([{};,>]) ?")
+_CSS_COLON = re.compile(r": ")
+
+
+def minify_html(html: str) -> str:
+    """Minify HTML.
+
+    Parameters
+    ----------
+    html
+
+    Returns
+    -------
+    str
+
+    """
+    result: list[str] = []
+    # whitespace at the start of the next text is not displayed
+    strip = True
+    text = ""
+    position = 0
+    for match in _HTML_TOKEN.finditer(html):
+        text += html[position : match.start()]
+        position = match.end()
+        if match["comment"] is not None:
+            continue
+        name = (match["name"] or match["tagname"]).lower().lstrip("/")
+        text = _WHITESPACE.sub(" ", text)
+        if strip:
+            text = text.lstrip()
+        if name in HIDDEN_ELEMENTS:
+            text = text.rstrip()
+        result.append(text)
+        result.append(match.group())
+        text = ""
+        strip = name in HIDDEN_ELEMENTS
+    text = _WHITESPACE.sub(" ", text + html[position:])
+    result.append(text.strip() if strip else text.rstrip())
+    return "".join(result)
+
+
+def minify_css(css: str) -> str:
+    """Minify CSS.
+
+    Parameters
+    ----------
+    css
+
+    Returns
+    -------
+    str
+
+    """
+    result: list[str] = []
+    code = ""
+    position = 0
+    for match in _CSS_TOKEN.finditer(css):
+        code += css[position : match.start()]
+        position = match.end()
+        if match["string"] is not None:
+            result.append(_minify_css_code(code))
+            result.append(match["string"])
+            code = ""
+    result.append(_minify_css_code(code + css[position:]))
+    return "".join(result).strip()
+
+
+def _minify_css_code(code: str) -> str:
+    """Minify CSS without strings and comments."""
+    code = _WHITESPACE.sub(" ", code)
+    code = _CSS_PUNCTUATION.sub(r"\1", code)
+    code = _CSS_COLON.sub(":", code)
+    return code.replace(";}", "}")
+
+
+class Minifier:
+    """Minifies HTML and CSS.
+
+    The results are stored in the `minify` namespace of the cache, keyed by
+    the content, so unchanged outputs are not minified again in the next
+    build.
+
+    Parameters
+    ----------
+    cache
+        the persistent cache, if None nothing is cached
+
+    """
+
+    def __init__(self, cache: Cache | None = None):
+        self.cache = cache
+
+    @property
+    def fingerprint(self) -> str:
+        """Fingerprint of the minification, see `blag.manifest`."""
+        return Cache.key("minify", __VERSION__)
+
+    def html(self, html: str) -> str:
+        """Minify HTML, see `minify_html`.
+
+        Parameters
+        ----------
+        html
+
+        Returns
+        -------
+        str
+
+        """
+        return self._cached("html", html, minify_html)
+
+    def css(self, css: str) -> str:
+        """Minify CSS, see `minify_css`.
+
+        Parameters
+        ----------
+        css
+
+        Returns
+        -------
+        str
+
+        """
+        return self._cached("css", css, minify_css)
+
+    def transforms(self) -> dict[str, Callable[[bytes], bytes]]:
+        """Get the transformations of copied files.
+
+        Returns
+        -------
+        dict[str, Callable[[bytes], bytes]]
+            the transformations by file extension, see
+            `blag.sync.sync_tree`
+
+        """
+        return {".css": self._css_bytes}
+
+    def _css_bytes(self, data: bytes) -> bytes:
+        return self.css(data.decode("utf-8")).encode("utf-8")
+
+    def _cached(
+        self, kind: str, text: str, minify: Callable[[str], str]
+    ) -> str:
+        if self.cache is None:
+            return minify(text)
+        key = Cache.key(kind, text, __VERSION__)
+        cached = self.cache.get("minify", key)
+        if cached is not None:
+            return cached.decode("utf-8")
+        result = minify(text)
+        self.cache.set("minify", key, result.encode("utf-8"))
+        return result
@@ -0,0 +1,201 @@
+"""Precompression.
+
+Web servers like nginx (`gzip_static`) can serve precompressed sidecars,
+e.g. `index.html.gz` next to `index.html`, instead of compressing the files
+on every request. `precompress` writes such sidecars for the text files in
+the output directory: gzip (`.gz`) always, and zstd (`.zst`) if it is
+available, either from the standard library (Python 3.14+) or from the
+`zstandard` package.
+
+The sidecars get the modification time of their file. As blag only writes
+outputs whose content changed (see `blag.sync.write_file`), a sidecar is
+out of date iff the modification times differ, so only changed files are
+compressed again. The files are compressed in a thread pool, zlib and zstd
+release the GIL while compressing.
+
+"""
+
+import gzip
+import importlib
+import logging
+import os
+import tempfile
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from blag.sync import FILE_MODE
+
+logger = logging.getLogger(__name__)
+
+# the files that are precompressed
+EXTENSIONS = (".html", ".xml", ".css", ".js")
+# the suffixes of all sidecars, available or not
+SIDECARS = (".gz", ".zst")
+GZIP_LEVEL = 9
+ZSTD_LEVEL = 19
+
+Compressor = Callable[[bytes], bytes]
+
+
+def gzip_compress(data: bytes) -> bytes:
+    """Compress `data` with gzip.
+
+    The header contains no modification time, so the result only depends
+    on `data`.
+
+    Parameters
+    ----------
+    data
+
+    Returns
+    -------
+    bytes
+
+    """
+    return gzip.compress(data, GZIP_LEVEL, mtime=0)
+
+
+def zstd_compressor() -> Compressor | None:
+    """Get a zstd compressor, if available.
+
+    Returns
+    -------
+    Callable[[bytes], bytes] | None
+        the compressor or None if neither `compression.zstd` nor
+        `zstandard` is available
+
+    """
+    try:
+        zstd = importlib.import_module("compression.zstd")
+    except ImportError:
+        pass
+    else:
+        return partial(zstd.compress, level=ZSTD_LEVEL)
+    try:
+        zstandard = importlib.import_module("zstandard")
+    except ImportError:
+        return None
+
+    def compress(data: bytes) -> bytes:
+        # compressor objects must not be shared between threads
+        compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+        result: bytes = compressor.compress(data)
+        return result
+
+    return compress
+
+
+def compressors() -> dict[str, Compressor]:
+    """Get the available compressors.
+
+    Returns
+    -------
+    dict[str, Callable[[bytes], bytes]]
+        the compressors by the suffix of their sidecars
+
+    """
+    result: dict[str, Compressor] = {".gz": gzip_compress}
+    zstd = zstd_compressor()
+    if zstd is not None:
+        result[".zst"] = zstd
+    return result
+
+
+def compress_file(path: str, compress: dict[str, Compressor]) -> bool:
+    """Write the sidecars of `path` that are out of date.
+
+    Parameters
+    ----------
+    path
+    compress
+        the compressors by the suffix of their sidecars
+
+    Returns
+    -------
+    bool
+        True if any sidecar was written
+
+    """
+    stat = os.stat(path)
+    stale = []
+    for suffix in compress:
+        try:
+            mtime = os.stat(path + suffix).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime != stat.st_mtime_ns:
+            stale.append(suffix)
+    if not stale:
+        return False
+
+    with open(path, "rb") as fh:
+        data = fh.read()
+    for suffix in stale:
+        _write_sidecar(path + suffix, compress[suffix](data), stat)
+    return True
+
+
+def _write_sidecar(path: str, data: bytes, stat: os.stat_result) -> None:
+    """Atomically write the sidecar `path` with the times of `stat`.
+
+    The sidecar is replaced, not rewritten, as it might be hard linked into
+    a staging directory (see `blag.sync.stage`).
+
+    """
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        os.chmod(tmp, FILE_MODE)
+        os.utime(tmp, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def precompress(
+    output_dir: str, workers: int | None = None
+) -> tuple[int, int]:
+    """Write the out of date sidecars of the files in `output_dir`.
+
+    Sidecars whose file is gone, or whose compressor is no longer
+    available, are removed.
+
+    Parameters
+    ----------
+    output_dir
+    workers
+        number of threads, if None `concurrent.futures.ThreadPoolExecutor`
+        decides
+
+    Returns
+    -------
+    tuple[int, int]
+        number of compressed and skipped files
+
+    """
+    compress = compressors()
+    paths = []
+    for root, _, filenames in os.walk(output_dir):
+        names = set(filenames)
+        for filename in filenames:
+            if filename.endswith(EXTENSIONS):
+                paths.append(os.path.join(root, filename))
+                continue
+            name, suffix = os.path.splitext(filename)
+            if (
+                suffix in SIDECARS
+                and name.endswith(EXTENSIONS)
+                and (name not in names or suffix not in compress)
+            ):
+                logger.debug(f"Removing stale {filename}.")
+                os.remove(os.path.join(root, filename))
+
+    with ThreadPoolExecutor(workers) as executor:
+        results = list(
+            executor.map(lambda path: compress_file(path, compress), paths)
+        )
+    compressed = sum(results)
+    return compressed, len(results) - compressed
@@ -0,0 +1,167 @@
+"""Build Profiling.
+
+This module collects the metrics of a build, when blag is run with
+`--profile`: the wall time of each stage of the build (see
+`blag.blag.BuildSession.timings`), the time each markdown file took to be
+converted and rendered, and how many files were written or skipped.
+
+The metrics are reported as a table (`BuildProfile.report`) or as JSON
+(`BuildProfile.metrics`), e.g. for CI to track them over time.
+
+"""
+
+from typing import Any
+
+# number of files listed in the report
+SLOWEST_FILES = 10
+
+
+class BuildProfile:
+    """Metrics of a build.
+
+    `stages` holds the wall time of each stage in seconds, `files` the time
+    each rendered markdown file took to be converted (None if it was not
+    converted) and rendered, and `counters` the number of processed,
+    written and skipped files.
+
+    """
+
+    def __init__(self) -> None:
+        self.stages: dict[str, float] = {}
+        self.files: dict[str, tuple[float | None, float]] = {}
+        self.counters: dict[str, int] = {}
+
+    def count(self, name: str, n: int = 1) -> None:
+        """Increase the counter `name` by `n`.
+
+        Parameters
+        ----------
+        name
+        n
+
+        """
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def add_file(
+        self, dst: str, convert: float | None, render: float, written: bool
+    ) -> None:
+        """Record a rendered markdown file.
+
+        Parameters
+        ----------
+        dst
+            relative path of the html destination
+        convert
+            seconds it took to convert the file, None if it was not
+            converted
+        render
+            seconds it took to render (and write) the file
+        written
+            True if the output was written, False if it did not change
+
+        """
+        self.files[dst] = (convert, render)
+        self.count("rendered")
+        if convert is not None:
+            self.count("converted")
+        self.count("written" if written else "unchanged")
+
+    def slowest(
+        self, n: int = SLOWEST_FILES
+    ) -> list[tuple[str, float, float]]:
+        """Get the slowest files.
+
+        Parameters
+        ----------
+        n
+            number of files
+
+        Returns
+        -------
+        list[tuple[str, float, float]]
+            relative path, convert and render time of the `n` files that
+            took longest
+
+        """
+        files = [
+            (dst, convert or 0.0, render)
+            for dst, (convert, render) in self.files.items()
+        ]
+        files.sort(key=lambda x: x[1] + x[2], reverse=True)
+        return files[:n]
+
+    def metrics(self, n: int = SLOWEST_FILES) -> dict[str, Any]:
+        """Get the metrics as JSON serializable dictionary.
+
+        Parameters
+        ----------
+        n
+            number of slowest files to include
+
+        Returns
+        -------
+        dict[str, Any]
+
+        """
+        return dict(
+            stages=self.stages,
+            total=sum(self.stages.values()),
+            counters=self.counters,
+            slowest=[
+                dict(dst=dst, convert=convert, render=render)
+                for dst, convert, render in self.slowest(n)
+            ],
+        )
+
+    def report(self, n: int = SLOWEST_FILES) -> str:
+        """Format the metrics as human readable report.
+
+        Parameters
+        ----------
+        n
+            number of slowest files to list
+
+        Returns
+        -------
+        str
+
+        """
+        lines = [f"{'Stage':<40}{'Time':>10}"]
+        for stage, seconds in self.stages.items():
+            lines.append(f"{stage:<40}{seconds:>9.3f}s")
+        lines.append(f"{'total':<40}{sum(self.stages.values()):>9.3f}s")
+
+        slowest = self.slowest(n)
+        if slowest:
+            lines.append("")
+            lines.append(f"{'Slowest files':<40}{'Convert':>10}{'Render':>10}")
+            for dst, convert, render in slowest:
+                lines.append(f"{dst:<40}{convert:>9.3f}s{render:>9.3f}s")
+
+        lines.append("")
+        counters = self.counters
+        lines.append(
+            f"Markdown: {counters.get('sources', 0)} files, "
+            f"{counters.get('converted', 0)} converted, "
+            f"{counters.get('rendered', 0)} rendered, "
+            f"{counters.get('written', 0)} written, "
+            f"{counters.get('unchanged', 0)} unchanged"
+        )
+        lines.append(
+            f"Static files: {counters.get('static_copied', 0)} copied, "
+            f"{counters.get('static_skipped', 0)} up to date"
+        )
+        lines.append(
+            f"Listings: {counters.get('listings_written', 0)} written"
+        )
+        if "assets_hashed" in counters:
+            lines.append(
+                f"Assets: {counters['assets_hashed']} hashed, "
+                f"{counters.get('assets_skipped', 0)} up to date"
+            )
+        if "precompressed" in counters:
+            lines.append(
+                f"Precompressed: {counters['precompressed']} files, "
+                f"{counters.get('precompress_skipped', 0)} up to date"
+            )
+        return "\n".join(lines)
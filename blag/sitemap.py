@@ -0,0 +1,106 @@
+"""Sitemap.
+
+The sitemap (`sitemap.xml`) lists the URLs of all articles and pages, each
+with the time its source's content last changed (`lastmod`, see
+`blag.manifest.Manifest.lastmod`), so crawlers only need to fetch what
+changed. A sitemap holds at most `MAX_URLS` URLs, larger sites are split
+into shards (`sitemap-1.xml`, `sitemap-2.xml`, ...) and `sitemap.xml`
+becomes the sitemap index referring to them.
+
+The documents are written one URL at a time into their files (see
+`blag.sync.write_with`), so they are never held in memory.
+
+"""
+
+from collections.abc import Iterable
+from datetime import datetime, timezone
+from typing import TextIO
+from xml.sax.saxutils import escape
+
+# the maximum number of URLs in a sitemap, see https://www.sitemaps.org
+MAX_URLS = 50000
+NAMESPACE = "http://www.sitemaps.org/schemas/sitemap/0.9"
+
+
+def shard_name(n: int) -> str:
+    """Get the file name of the `n`th shard.
+
+    Parameters
+    ----------
+    n
+        number of the shard, starting with 1
+
+    Returns
+    -------
+    str
+
+    """
+    return f"sitemap-{n}.xml"
+
+
+def format_lastmod(timestamp: float) -> str:
+    """Format a timestamp in W3C datetime format.
+
+    Parameters
+    ----------
+    timestamp
+        seconds since the epoch
+
+    Returns
+    -------
+    str
+
+    """
+    date = datetime.fromtimestamp(int(timestamp), tz=timezone.utc)
+    return date.isoformat()
+
+
+def _write(
+    fh: TextIO,
+    root: str,
+    element: str,
+    urls: Iterable[tuple[str, float | None]],
+) -> None:
+    """Write a sitemap document with an `element` per URL."""
+    fh.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+    fh.write(f'<{root} xmlns="{NAMESPACE}">\n')
+    for loc, lastmod in urls:
+        fh.write(f"<{element}><loc>{escape(loc)}</loc>")
+        if lastmod is not None:
+            fh.write(f"<lastmod>{format_lastmod(lastmod)}</lastmod>")
+        fh.write(f"</{element}>\n")
+    fh.write(f"</{root}>\n")
+
+
+def write_urlset(
+    fh: TextIO, urls: Iterable[tuple[str, float | None]]
+) -> None:
+    """Write a sitemap.
+
+    Parameters
+    ----------
+    fh
+        the file the sitemap is written to
+    urls
+        the absolute URL of each page and the time its content last
+        changed, if known. The URLs are consumed while they are written.
+
+    """
+    _write(fh, "urlset", "url", urls)
+
+
+def write_index(
+    fh: TextIO, sitemaps: Iterable[tuple[str, float | None]]
+) -> None:
+    """Write a sitemap index.
+
+    Parameters
+    ----------
+    fh
+        the file the sitemap index is written to
+    sitemaps
+        the absolute URL of each sitemap and the time its latest page
+        changed, if known
+
+    """
+    _write(fh, "sitemapindex", "sitemap", sitemaps)
@@ -0,0 +1,417 @@
+"""File Synchronization.
+
+This module copies the static files into the output directory. Files that
+are already up to date in the output directory -- same size and
+modification time or, optionally, same content -- are skipped.
+
+Files can be copied in different ways (see `STRATEGIES`):
+
+* `copy`: copy the contents using `os.copy_file_range` where available, so
+  the data does not pass through Python
+* `hardlink`: hard link the files instead of copying them
+* `reflink`: create copy-on-write clones of the files, on filesystems
+  supporting it (e.g. btrfs, XFS)
+
+If a strategy is not supported for a file, e.g. hard links across
+filesystems, the file is copied instead.
+
+Files are never modified in place, but replaced. So, even if the output
+directory contains hard links to the sources, the sources are never touched.
+
+The generated outputs are written with `write_file` or, if they are
+generated in chunks, `write_stream` and `write_with`. They leave files alone
+whose content did not change and otherwise replace them atomically.
+`stage` and `swap` allow to build the site into a staging directory and
+replace the output directory with it at once.
+
+"""
+
+import filecmp
+import logging
+import os
+import shutil
+import tempfile
+from collections.abc import Callable, Iterable, Mapping
+from typing import TextIO
+
+logger = logging.getLogger(__name__)
+
+STRATEGIES = ["copy", "hardlink", "reflink"]
+
+# ioctl to clone a file on Linux, see ioctl_ficlone(2)
+FICLONE = 0x40049409
+
+# renameat2 arguments to exchange two paths on Linux, see rename(2)
+AT_FDCWD = -100
+RENAME_EXCHANGE = 2
+
+# permissions of newly written files
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+FILE_MODE = 0o666 & ~_UMASK
+
+
+def is_up_to_date(src: str, dst: str, checksum: bool = False) -> bool:
+    """Check if `dst` is an up to date copy of `src`.
+
+    Parameters
+    ----------
+    src
+    dst
+    checksum
+        compare the contents instead of the modification times
+
+    Returns
+    -------
+    bool
+
+    """
+    try:
+        dst_stat = os.stat(dst)
+    except FileNotFoundError:
+        return False
+    src_stat = os.stat(src)
+    if os.path.samestat(src_stat, dst_stat):
+        return True
+    if src_stat.st_size != dst_stat.st_size:
+        return False
+    if checksum:
+        return filecmp.cmp(src, dst, shallow=False)
+    return src_stat.st_mtime_ns == dst_stat.st_mtime_ns
+
+
+def _copy_file_range(src: str, dst: str) -> None:
+    """Copy `src` to `dst` within the kernel."""
+    try:
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            remaining = os.fstat(fsrc.fileno()).st_size
+            while remaining > 0:
+                n = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                if n == 0:
+                    break
+                remaining -= n
+    except (AttributeError, OSError):
+        # not available on this platform or not supported for those
+        # files, shutil knows the next best way
+        shutil.copyfile(src, dst)
+
+
+def _reflink(src: str, dst: str) -> None:
+    """Clone `src` to `dst`."""
+    import fcntl
+
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+
+
+def copy_file(src: str, dst: str, strategy: str = "copy") -> None:
+    """Copy `src` to `dst`.
+
+    The copy is created next to `dst` and then moved into place, so `dst`
+    is replaced atomically. The permissions and modification time of `src`
+    are copied as well.
+
+    Parameters
+    ----------
+    src
+    dst
+    strategy
+        one of `STRATEGIES`
+
+    """
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dst) or ".")
+    os.close(fd)
+    try:
+        if strategy == "hardlink":
+            try:
+                os.remove(tmp)
+                os.link(src, tmp)
+                os.replace(tmp, dst)
+                return
+            except OSError as e:
+                logger.debug(f"Cannot hard link {src}: {e}, copying.")
+        if strategy == "reflink":
+            try:
+                _reflink(src, tmp)
+            except (ImportError, OSError) as e:
+                logger.debug(f"Cannot reflink {src}: {e}, copying.")
+                _copy_file_range(src, tmp)
+        else:
+            _copy_file_range(src, tmp)
+        shutil.copystat(src, tmp)
+        os.replace(tmp, dst)
+    finally:
+        try:
+            os.remove(tmp)
+        except FileNotFoundError:
+            pass
+
+
+def sync_file(
+    src: str,
+    dst: str,
+    strategy: str = "copy",
+    checksum: bool = False,
+    transform: Callable[[bytes], bytes] | None = None,
+) -> bool:
+    """Copy `src` to `dst` unless `dst` is up to date.
+
+    If a `transform` is given, the transformed content of `src` is written
+    instead, unless `dst` already contains it (see `write_file`).
+
+    Parameters
+    ----------
+    src
+    dst
+    strategy
+        one of `STRATEGIES`
+    checksum
+        compare the contents instead of the modification times
+    transform
+        transformation of the content
+
+    Returns
+    -------
+    bool
+        True if the file was copied
+
+    """
+    if transform is not None:
+        with open(src, "rb") as fh:
+            return write_file(dst, transform(fh.read()))
+    if is_up_to_date(src, dst, checksum):
+        return False
+    logger.debug(f"Copying {src} to {dst}")
+    copy_file(src, dst, strategy)
+    return True
+
+
+def sync_tree(
+    src_dir: str,
+    dst_dir: str,
+    strategy: str = "copy",
+    checksum: bool = False,
+    transforms: Mapping[str, Callable[[bytes], bytes]] | None = None,
+) -> tuple[int, int]:
+    """Copy all files from `src_dir` to `dst_dir`, unless up to date.
+
+    Parameters
+    ----------
+    src_dir
+    dst_dir
+    strategy
+        one of `STRATEGIES`
+    checksum
+        compare the contents instead of the modification times
+    transforms
+        transformations of the files' contents by file extension (e.g.
+        `.css`), see `sync_file`
+
+    Returns
+    -------
+    tuple[int, int]
+        number of copied and skipped files
+
+    """
+    transforms = transforms or {}
+    copied = skipped = 0
+    for root, _, filenames in os.walk(src_dir):
+        rel = os.path.relpath(root, start=src_dir)
+        target = os.path.normpath(os.path.join(dst_dir, rel))
+        os.makedirs(target, exist_ok=True)
+        for filename in filenames:
+            if sync_file(
+                os.path.join(root, filename),
+                os.path.join(target, filename),
+                strategy,
+                checksum,
+                transforms.get(os.path.splitext(filename)[1]),
+            ):
+                copied += 1
+            else:
+                skipped += 1
+    return copied, skipped
+
+
+def write_file(path: str, data: str | bytes) -> bool:
+    """Write `data` to `path`, unless the file already contains it.
+
+    Unchanged files are not touched, so their modification times stay the
+    same. Otherwise, `data` is written next to `path` and then moved into
+    place, so readers never see a partially written file.
+
+    Parameters
+    ----------
+    path
+    data
+        strings are utf-8 encoded
+
+    Returns
+    -------
+    bool
+        True if the file was written
+
+    """
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    try:
+        if os.stat(path).st_size == len(data):
+            with open(path, "rb") as fh:
+                if fh.read() == data:
+                    return False
+    except FileNotFoundError:
+        pass
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        os.chmod(tmp, FILE_MODE)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+    return True
+
+
+def write_stream(path: str, chunks: Iterable[str]) -> bool:
+    """Write `chunks` to `path`, unless the file already contains them.
+
+    Like `write_file`, but the chunks are written to the temporary file as
+    they are generated, so the whole content is never held in memory. The
+    temporary file is then compared with `path`.
+
+    Parameters
+    ----------
+    path
+    chunks
+        strings, they are utf-8 encoded
+
+    Returns
+    -------
+    bool
+        True if the file was written
+
+    """
+    return write_with(path, lambda fh: fh.writelines(chunks))
+
+
+def write_with(path: str, write: Callable[[TextIO], object]) -> bool:
+    """Write `path` with `write`, unless the file's content stays the same.
+
+    Like `write_stream`, but for writers that expect a file, e.g. XML
+    generators.
+
+    Parameters
+    ----------
+    path
+    write
+        called with the utf-8 encoded temporary file
+
+    Returns
+    -------
+    bool
+        True if the file was written
+
+    """
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".")
+    try:
+        with open(fd, "w", encoding="utf-8", newline="") as fh:
+            write(fh)
+        if os.path.exists(path) and filecmp.cmp(tmp, path, shallow=False):
+            os.remove(tmp)
+            return False
+        os.chmod(tmp, FILE_MODE)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+    return True
+
+
+def staging_dir(output_dir: str) -> str:
+    """Get the staging directory for `output_dir`.
+
+    It is next to `output_dir`, so both are on the same filesystem.
+
+    Parameters
+    ----------
+    output_dir
+
+    Returns
+    -------
+    str
+
+    """
+    return os.path.normpath(output_dir) + ".staging"
+
+
+def stage(output_dir: str) -> str:
+    """Create the staging directory for `output_dir`.
+
+    The staging directory starts as a copy of `output_dir` made of hard
+    links, so the build can be incremental. As files are never modified in
+    place, building into the staging directory does not change
+    `output_dir`.
+
+    Parameters
+    ----------
+    output_dir
+
+    Returns
+    -------
+    str
+        the staging directory
+
+    """
+    staging = staging_dir(output_dir)
+    # left over from an interrupted build
+    shutil.rmtree(staging, ignore_errors=True)
+    if os.path.isdir(output_dir):
+        shutil.copytree(output_dir, staging, copy_function=os.link)
+    else:
+        os.makedirs(staging)
+    return staging
+
+
+def _exchange(a: str, b: str) -> None:
+    """Atomically exchange the paths `a` and `b`."""
+    import ctypes
+    import ctypes.util
+
+    libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    if libc.renameat2(
+        AT_FDCWD, os.fsencode(a), AT_FDCWD, os.fsencode(b), RENAME_EXCHANGE
+    ):
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+
+
+def swap(staging: str, output_dir: str) -> None:
+    """Replace `output_dir` with the `staging` directory.
+
+    On Linux, both directories are exchanged atomically. Elsewhere, the
+    output directory is moved aside first, so it is missing for a moment.
+
+    Parameters
+    ----------
+    staging
+        the staging directory, see `stage`
+    output_dir
+
+    """
+    if not os.path.exists(output_dir):
+        os.rename(staging, output_dir)
+        return
+    try:
+        _exchange(staging, output_dir)
+    except (AttributeError, OSError) as e:
+        logger.debug(f"Cannot exchange directories ({e}), renaming.")
+        old = staging + ".old"
+        shutil.rmtree(old, ignore_errors=True)
+        os.rename(output_dir, old)
+        os.rename(staging, output_dir)
+        staging = old
+    shutil.rmtree(staging)
@@ -0,0 +1,119 @@
+"""Template Loading.
+
+Before a Jinja2 template can be rendered, it has to be parsed and compiled
+into Python code. This module allows blag to skip that in two ways:
+
+* the compiled templates are stored in the persistent cache (see
+  `blag.cache`) as Jinja2 bytecode. An entry is only used as long as the
+  template's source did not change.
+* a theme (i.e. a template directory) can be precompiled into a zip file
+  with `blag compile-templates`. The zip file can be used instead of the
+  template directory and is loaded without parsing or compiling anything.
+
+"""
+
+import argparse
+import os
+from typing import Any
+
+from jinja2 import (
+    BaseLoader,
+    Environment,
+    FileSystemBytecodeCache,
+    FileSystemLoader,
+    ModuleLoader,
+)
+
+# cache namespace of the compiled templates
+BYTECODE_NAMESPACE = "jinja"
+
+
+class PrecompiledLoader(ModuleLoader):
+    """Loader for themes precompiled with `compile_theme`.
+
+    Unlike `jinja2.ModuleLoader`, the loader can be pickled, so it can be
+    passed to worker processes.
+
+    Parameters
+    ----------
+    path
+        the precompiled theme
+
+    """
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self.path = path
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        """Pickle the loader by its path."""
+        return (type(self), (self.path,))
+
+
+def loader_factory(template_dir: str) -> BaseLoader:
+    """Create the loader for the templates in `template_dir`.
+
+    Parameters
+    ----------
+    template_dir
+        directory containing the templates, or a precompiled theme
+
+    Returns
+    -------
+    jinja2.BaseLoader
+
+    """
+    if os.path.isfile(template_dir):
+        return PrecompiledLoader(template_dir)
+    return FileSystemLoader(template_dir)
+
+
+def bytecode_cache(cache_dir: str) -> FileSystemBytecodeCache:
+    """Create the bytecode cache in `cache_dir`.
+
+    Parameters
+    ----------
+    cache_dir
+        the cache directory, see `blag.cache.Cache`
+
+    Returns
+    -------
+    jinja2.FileSystemBytecodeCache
+
+    """
+    directory = os.path.join(cache_dir, BYTECODE_NAMESPACE)
+    os.makedirs(directory, exist_ok=True)
+    return FileSystemBytecodeCache(directory)
+
+
+def compile_theme(template_dir: str, target: str) -> None:
+    """Precompile all templates in `template_dir` into a zip file.
+
+    Parameters
+    ----------
+    template_dir
+        directory containing the templates
+    target
+        path of the zip file
+
+    """
+    env = Environment(loader=FileSystemLoader(template_dir))
+    env.compile_templates(
+        target,
+        zip="deflated",
+        ignore_errors=False,
+        log_function=None,
+    )
+
+
+def compile_command(args: argparse.Namespace) -> None:
+    """Run the `compile-templates` command.
+
+    Parameters
+    ----------
+    args
+        contains the template dir and the output file
+
+    """
+    compile_theme(args.template_dir, args.output)
+    print(f"Compiled {args.template_dir} into {args.output}.")
@@ -0,0 +1,298 @@
+"""File Watching.
+
+This module provides the watchers the devserver uses to detect changes in
+the input, template and static directories. Watchers report *which* paths
+changed, so the devserver can decide what to rebuild.
+
+There are two watchers:
+
+* `InotifyWatcher` uses Linux' inotify API (via ctypes) and is notified by
+  the kernel about changes, without scanning the directories.
+* `PollingWatcher` periodically scans the directories and compares the
+  modification times, sizes and inodes of all files. It works everywhere
+  and is used as fallback.
+
+Both watchers coalesce changes: several changes to the same file, e.g. an
+editor writing a file in several steps, are reported only once, and
+changes that happen shortly after each other are reported together.
+
+"""
+
+import abc
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+# inotify constants, see inotify(7)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (
+    IN_MODIFY
+    | IN_ATTRIB
+    | IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_MOVE_SELF
+    | IN_ONLYDIR
+)
+
+# struct inotify_event without the name
+EVENT = struct.Struct("iIII")
+
+
+class Watcher(abc.ABC):
+    """Base class of the watchers.
+
+    Parameters
+    ----------
+    dirs
+        directories to watch recursively
+
+    """
+
+    def __init__(self, dirs: list[str]):
+        self.dirs = dirs
+
+    @abc.abstractmethod
+    def wait(self, timeout: float) -> set[str]:
+        """Wait for changes.
+
+        Parameters
+        ----------
+        timeout
+            maximum number of seconds to wait
+
+        Returns
+        -------
+        set[str]
+            the changed (created, modified, deleted) paths, empty if there
+            were no changes within `timeout`
+
+        """
+
+    def close(self) -> None:
+        """Stop watching."""
+
+
+class PollingWatcher(Watcher):
+    """Watcher that periodically scans the directories.
+
+    Parameters
+    ----------
+    dirs
+        directories to watch recursively
+    interval
+        number of seconds between two scans
+
+    """
+
+    def __init__(self, dirs: list[str], interval: float = 1):
+        super().__init__(dirs)
+        self.interval = interval
+        self.snapshot = self.scan()
+
+    def scan(self) -> dict[str, tuple[int, int, int]]:
+        """Get modification time, size and inode of all files.
+
+        Returns
+        -------
+        dict[str, tuple[int, int, int]]
+
+        """
+        snapshot = {}
+        for dir_ in self.dirs:
+            for root, _, files in os.walk(dir_):
+                for f in files:
+                    path = os.path.join(root, f)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        # ignore files that have been deleted since the
+                        # os.walk call (for example temporary emacs files)
+                        continue
+                    snapshot[path] = (
+                        stat.st_mtime_ns,
+                        stat.st_size,
+                        stat.st_ino,
+                    )
+        return snapshot
+
+    def wait(self, timeout: float) -> set[str]:
+        """Wait for changes, see `Watcher.wait`."""
+        deadline = time.monotonic() + timeout
+        while True:
+            time.sleep(min(self.interval, max(0, deadline - time.monotonic())))
+            snapshot = self.scan()
+            changed = {
+                path
+                for path in snapshot.keys() | self.snapshot.keys()
+                if snapshot.get(path) != self.snapshot.get(path)
+            }
+            self.snapshot = snapshot
+            if changed or time.monotonic() >= deadline:
+                return changed
+
+
+class InotifyWatcher(Watcher):
+    """Watcher using Linux' inotify API.
+
+    Parameters
+    ----------
+    dirs
+        directories to watch recursively
+    debounce
+        number of seconds without further events, before the changes are
+        reported
+
+    Raises
+    ------
+    OSError
+        if inotify is not available
+
+    """
+
+    def __init__(self, dirs: list[str], debounce: float = 0.1):
+        super().__init__(dirs)
+        self.debounce = debounce
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify is only available on Linux")
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [
+            ctypes.c_int,
+            ctypes.c_char_p,
+            ctypes.c_uint32,
+        ]
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        # watch descriptor to directory
+        self.watches: dict[int, str] = {}
+        for dir_ in dirs:
+            self.add_watches(dir_)
+
+    def add_watches(self, path: str) -> set[str]:
+        """Watch `path` and all directories below it.
+
+        Parameters
+        ----------
+        path
+            a directory
+
+        Returns
+        -------
+        set[str]
+            the files found below `path`
+
+        """
+        files: set[str] = set()
+        for root, _, filenames in os.walk(path):
+            wd = self._add_watch(self.fd, os.fsencode(root), WATCH_MASK)
+            if wd < 0:
+                err = ctypes.get_errno()
+                logger.warning(f"Cannot watch {root}: {os.strerror(err)}")
+                continue
+            self.watches[wd] = root
+            files.update(os.path.join(root, f) for f in filenames)
+        return files
+
+    def read_events(self) -> set[str]:
+        """Read all pending events.
+
+        Returns
+        -------
+        set[str]
+            the changed paths
+
+        """
+        changed: set[str] = set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return changed
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT.unpack_from(data, offset)
+            offset += EVENT.size
+            name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                # we lost events, so everything might have changed
+                logger.warning("Too many changes, rescanning everything.")
+                changed.update(self.dirs)
+                continue
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            root = self.watches.get(wd)
+            if root is None:
+                continue
+            path = os.path.join(root, name) if name else root
+            changed.add(path)
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                # files might have been created before we watched the new
+                # directory
+                changed.update(self.add_watches(path))
+        return changed
+
+    def wait(self, timeout: float) -> set[str]:
+        """Wait for changes, see `Watcher.wait`."""
+        changed: set[str] = set()
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        while readable:
+            changed.update(self.read_events())
+            # wait until things calmed down
+            readable, _, _ = select.select([self.fd], [], [], self.debounce)
+        return changed
+
+    def close(self) -> None:
+        """Stop watching."""
+        os.close(self.fd)
+
+
+def watcher_factory(dirs: list[str], interval: float = 1) -> Watcher:
+    """Create the best watcher available on this system.
+
+    Parameters
+    ----------
+    dirs
+        directories to watch recursively
+    interval
+        number of seconds between two scans, if polling is used
+
+    Returns
+    -------
+    Watcher
+
+    """
+    try:
+        return InotifyWatcher(dirs)
+    except (OSError, AttributeError) as e:
+        logger.debug(f"inotify not available ({e}), polling for changes.")
+        return PollingWatcher(dirs, interval)
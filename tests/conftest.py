@@ -92,5 +92,17 @@ def args(cleandir: Callable[[], Iterator[str]]) -> Iterator[Namespace]:
         output_dir="build",
         static_dir="static",
         template_dir="templates",
+        jobs=1,
+        cache_dir=".blag-cache",
+        cache_size=512,
+        copy_mode="copy",
+        checksum=False,
+        staging=False,
+        profile=False,
+        metrics=None,
+        cprofile=None,
+        precompress=False,
+        minify=False,
+        fingerprint_assets=False,
     )
     yield args
@@ -0,0 +1,124 @@
+"""Tests for the assets module."""
+
+import json
+import os
+
+from blag import assets
+
+
+def write(path: str, content: str) -> None:
+    """Write `content` to `path`."""
+    with open(path, "w") as fh:
+        fh.write(content)
+
+
+def test_hashed_name() -> None:
+    """Test the hash is inserted before the extension."""
+    hash_ = "3f9a1c2b" + "0" * 56
+    assert assets.hashed_name("style.css", hash_) == "style.3f9a1c2b.css"
+    assert (
+        assets.hashed_name("images/a.b.png", hash_)
+        == "images/a.b.3f9a1c2b.png"
+    )
+    assert assets.hashed_name("LICENSE", hash_) == "LICENSE.3f9a1c2b"
+
+
+def test_asset_paths(cleandir: str) -> None:
+    """Test all but markdown files are assets."""
+    os.makedirs("src/images")
+    os.makedirs("assets")
+    write("src/a.md", "a")
+    write("src/images/a.png", "png")
+    write("assets/style.css", "css")
+    paths = assets.asset_paths(["assets", "src", "missing"])
+    assert list(paths) == ["style.css", "images/a.png"]
+
+
+def test_asset_manifest(cleandir: str) -> None:
+    """Test only changed assets get new names."""
+    os.makedirs("out/images")
+    write("out/style.css", "body {}")
+    write("out/images/a.png", "png")
+    paths = ["style.css", "images/a.png", "missing.js"]
+
+    manifest = assets.AssetManifest.load("out")
+    assert manifest.update(paths) == (2, 0)
+    css = manifest.entries["style.css"]["name"]
+    png = manifest.entries["images/a.png"]["name"]
+    assert css.startswith("style.") and css.endswith(".css")
+    assert png.startswith("images/a.") and png.endswith(".png")
+    with open(f"out/{css}") as fh:
+        assert fh.read() == "body {}"
+    fingerprint = manifest.fingerprint
+    manifest.save()
+
+    # a new build, nothing changed
+    manifest = assets.AssetManifest.load("out")
+    assert manifest.update(paths) == (0, 2)
+    assert manifest.fingerprint == fingerprint
+
+    # a changed asset gets a new name, the old copy is removed
+    write("out/style.css", "body {color: red}")
+    assert manifest.update(paths) == (1, 1)
+    assert manifest.entries["style.css"]["name"] != css
+    assert manifest.entries["images/a.png"]["name"] == png
+    assert not os.path.exists(f"out/{css}")
+    assert manifest.fingerprint != fingerprint
+
+    # a touched asset keeps its name
+    css = manifest.entries["style.css"]["name"]
+    os.utime("out/style.css", ns=(0, 0))
+    assert manifest.update(paths) == (1, 1)
+    assert manifest.entries["style.css"]["name"] == css
+    assert os.path.exists(f"out/{css}")
+
+    # assets that are gone are forgotten
+    assert manifest.update(["style.css"]) == (0, 1)
+    assert not os.path.exists(f"out/{png}")
+    assert os.path.exists("out/images/a.png")
+    manifest.save()
+    with open("out/.blag-assets.json") as fh:
+        assert set(json.load(fh)["assets"]) == {"style.css"}
+
+
+def test_asset_manifest_corrupt(cleandir: str) -> None:
+    """Test a corrupt or outdated manifest is ignored."""
+    os.makedirs("out")
+    write("out/.blag-assets.json", "{")
+    assert assets.AssetManifest.load("out").entries == {}
+    write("out/.blag-assets.json", '{"version": 0, "assets": {"a": {}}}')
+    assert assets.AssetManifest.load("out").entries == {}
+
+
+def test_url_and_rewrite() -> None:
+    """Test links to assets point to the hashed copies."""
+    manifest = assets.AssetManifest("out")
+    manifest.entries = {
+        "style.css": dict(name="style.1234.css"),
+        "images/a.png": dict(name="images/a.1234.png"),
+    }
+    assert manifest.url("/style.css") == "/style.1234.css"
+    assert manifest.url("style.css") == "style.1234.css"
+    assert manifest.url("/other.css") == "/other.css"
+    assert manifest.url("https://example.com/style.css") == (
+        "https://example.com/style.css"
+    )
+
+    html = (
+        '<p><img alt="a" src="images/a.png"> '
+        "<a href='../style.css?v=1#x'>css</a> "
+        '<a href="/images/a.png">png</a> '
+        '<a href="a.html">page</a></p>\n'
+        '<pre><code>&lt;img src="images/a.png"&gt;</code></pre>'
+    )
+    assert manifest.rewrite(html, "posts/index.html") == (
+        '<p><img alt="a" src="images/a.png"> '
+        "<a href='../style.1234.css?v=1#x'>css</a> "
+        '<a href="/images/a.1234.png">png</a> '
+        '<a href="a.html">page</a></p>\n'
+        '<pre><code>&lt;img src="images/a.png"&gt;</code></pre>'
+    )
+    assert manifest.rewrite(html, "index.html").startswith(
+        '<p><img alt="a" src="images/a.1234.png">'
+    )
+    assert assets.plain_url("/style.css") == "/style.css"
@@ -0,0 +1,72 @@
+"""Tests for the benchmark module."""
+
+import filecmp
+import json
+import os
+
+import pytest
+from pytest import CaptureFixture
+
+from blag import benchmark
+
+
+def test_generate_corpus(cleandir: str) -> None:
+    """Test the generated sites are reproducible."""
+    benchmark.generate_corpus("a", 20, tags=5)
+    benchmark.generate_corpus("b", 20, tags=5)
+    articles = [f for f in os.listdir("a/content") if f.startswith("article")]
+    assert len(articles) == 20
+    comparison = filecmp.dircmp("a/content", "b/content")
+    assert not comparison.diff_files
+    assert comparison.left_only == comparison.right_only == []
+
+    with open("a/content/article0.md") as fh:
+        assert "tags: tag" in fh.read()
+
+
+def test_run_build(cleandir: str) -> None:
+    """Test the stages of a build are measured."""
+    benchmark.generate_corpus("site", 10, tags=3)
+    timings = benchmark.run_build("site")
+    assert os.path.exists("site/build/article9.html")
+    assert os.getcwd() == cleandir
+    for stage in "walk", "markdown", "feed", "index", "archive", "tags":
+        assert timings[stage] > 0
+    assert timings["total"] >= sum(
+        seconds for stage, seconds in timings.items() if stage != "total"
+    )
+
+
+def test_compare() -> None:
+    """Test results are compared with the baseline."""
+    results = {"10": {"markdown": 2.0, "feed": 0.002}}
+    table, regression = benchmark.compare(results)
+    assert "markdown" in table
+    assert not regression
+
+    baseline = {"10": {"markdown": 1.0, "feed": 0.001}}
+    table, regression = benchmark.compare(results, baseline)
+    assert "+100.0%" in table
+    assert regression
+    # small absolute slowdowns are noise
+    table, regression = benchmark.compare(
+        results, {"10": {"markdown": 2.0, "feed": 0.001}}
+    )
+    assert not regression
+
+
+def test_main(cleandir: str, capsys: CaptureFixture[str]) -> None:
+    """Test the benchmark command."""
+    benchmark.main(["--sizes", "5", "--repeat", "1", "--save", "base.json"])
+    assert "markdown" in capsys.readouterr().out
+    with open("base.json") as fh:
+        baseline = json.load(fh)
+    assert set(baseline) == {"5"}
+
+    baseline["5"]["total"] /= 10
+    with open("base.json", "w") as fh:
+        json.dump(baseline, fh)
+    with pytest.raises(SystemExit):
+        benchmark.main(
+            ["--sizes", "5", "--repeat", "1", "--baseline", "base.json"]
+        )
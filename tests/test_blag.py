@@ -1,16 +1,21 @@
 """Test blag."""
 
+import json
 import os
+import pstats
+import shutil
 from argparse import Namespace
 from datetime import datetime
 from tempfile import TemporaryDirectory
 from typing import Any
 
 import pytest
-from jinja2 import Template
+from jinja2 import Environment, Template
 from pytest import CaptureFixture, LogCaptureFixture
 
 from blag import __VERSION__, blag
+from blag.manifest import Manifest
+from blag.markdown import convert_markdown
 
 
 def test_generate_feed(cleandir: str) -> None:
@@ -73,6 +78,83 @@ def test_feed(cleandir: str) -> None:
     assert '<link href="https://example.com/dest2.html"' in feed
 
 
+def test_generate_feed_bounded(cleandir: str) -> None:
+    """Test the feed's size can be limited."""
+    articles: list[tuple[str, dict[str, Any]]] = [
+        (
+            f"dest{i}.html",
+            {
+                "title": f"title{i}",
+                "date": datetime(2019, 6, i),
+                "content": f"content{i}",
+            },
+        )
+        for i in (3, 2, 1)
+    ]
+    assert blag.generate_feed(
+        articles, "build", " ", " ", " ", " ", entries=2, summary_only=True
+    ) == ["atom.xml"]
+    with open("build/atom.xml") as fh:
+        feed = fh.read()
+    assert "<title>title3</title>" in feed
+    assert "<title>title2</title>" in feed
+    assert "<title>title1</title>" not in feed
+    assert '<summary type="html">title3' in feed
+    assert "<content" not in feed
+    assert "<updated>2019-06-03" in feed
+
+    # unchanged feeds are not written
+    assert blag.generate_feed(
+        articles, "build", " ", " ", " ", " ", entries=2, summary_only=True
+    ) == []
+
+
+def test_generate_feed_serialized(cleandir: str) -> None:
+    """Test only the entries of changed articles are serialized again."""
+    manifest = Manifest("build", {})
+    loaded = []
+
+    def content(dst: str) -> str:
+        loaded.append(dst)
+        return f"content of {dst}"
+
+    def generate(serialized: dict[str, str]) -> str:
+        manifest.articles_changed(articles)
+        blag.generate_feed(
+            blag.article_records(articles, content),
+            "build",
+            " ",
+            " ",
+            " ",
+            " ",
+            manifest=manifest,
+            serialized=serialized,
+        )
+        with open("build/atom.xml") as fh:
+            return fh.read()
+
+    articles: list[tuple[str, dict[str, Any]]] = []
+    for i in 1, 2, 3:
+        dst = f"dest{i}.html"
+        manifest.record(f"{i}.md", dst, f"hash{i}", {})
+        articles.append((dst, dict(title=f"t{i}", date=datetime(2019, 6, i))))
+    serialized: dict[str, str] = {}
+    feed = generate(serialized)
+    assert sorted(loaded) == ["dest1.html", "dest2.html", "dest3.html"]
+    assert len(serialized) == 3
+
+    # an article changed
+    loaded.clear()
+    manifest.record("2.md", "dest2.html", "hash2b", {})
+    articles[1] = ("dest2.html", dict(title="t2b", date=datetime(2019, 6, 2)))
+    changed = generate(serialized)
+    assert loaded == ["dest2.html"]
+    assert len(serialized) == 3
+    assert changed == feed.replace(">t2<", ">t2b<")
+
+    # the same feed without serialized entries
+    assert generate({}) == changed
+
 def test_generate_feed_with_description(cleandir: str) -> None:
     """Test generate_feed with description."""
     # if a description is provided, it will be used as the summary in
@@ -142,6 +224,83 @@ def test_parse_args_build() -> None:
     assert args.static_dir == "foo"
 
 
+def test_parse_args_jobs() -> None:
+    """Test parse_args with jobs."""
+    for command in "build", "serve":
+        args = blag.parse_args([command])
+        assert args.jobs == 1
+        args = blag.parse_args([command, "-j", "4"])
+        assert args.jobs == 4
+        args = blag.parse_args([command, "--jobs", "0"])
+        assert args.jobs == os.cpu_count()
+        with pytest.raises(SystemExit):
+            blag.parse_args([command, "--jobs", "-1"])
+
+
+def test_parse_args_cache() -> None:
+    """Test parse_args with the cache options and command."""
+    for command in "build", "serve":
+        args = blag.parse_args([command])
+        assert args.cache_dir == ".blag-cache"
+        assert args.cache_size == 512
+        args = blag.parse_args(
+            [command, "--cache-dir", "foo", "--cache-size", "0"]
+        )
+        assert args.cache_dir == "foo"
+        assert args.cache_size == 0
+
+    args = blag.parse_args(["cache", "stats"])
+    assert args.action == "stats"
+    assert args.cache_dir == ".blag-cache"
+    args = blag.parse_args(["cache", "clear", "--cache-dir", "foo"])
+    assert args.action == "clear"
+    assert args.cache_dir == "foo"
+    with pytest.raises(SystemExit):
+        blag.parse_args(["cache", "foo"])
+
+
+def test_parse_args_copy_mode() -> None:
+    """Test parse_args with copy mode and checksum."""
+    for command in "build", "serve":
+        args = blag.parse_args([command])
+        assert args.copy_mode == "copy"
+        assert not args.checksum
+        args = blag.parse_args(
+            [command, "--copy-mode", "hardlink", "--checksum"]
+        )
+        assert args.copy_mode == "hardlink"
+        assert args.checksum
+        with pytest.raises(SystemExit):
+            blag.parse_args([command, "--copy-mode", "foo"])
+
+
+def test_parse_args_serve() -> None:
+    """Test parse_args with bind address and port."""
+    args = blag.parse_args(["serve"])
+    assert args.bind == ""
+    assert args.port == 8000
+    args = blag.parse_args(["serve", "--bind", "127.0.0.1", "-p", "8080"])
+    assert args.bind == "127.0.0.1"
+    assert args.port == 8080
+
+
+def test_parse_args_profile() -> None:
+    """Test parse_args with the profiling options."""
+    for command in "build", "serve":
+        args = blag.parse_args([command])
+        assert args.profile is False
+        args = blag.parse_args([command, "--profile"])
+        assert args.profile is True
+    args = blag.parse_args(["build"])
+    assert args.metrics is None
+    assert args.cprofile is None
+    args = blag.parse_args(
+        ["build", "--metrics", "m.json", "--cprofile", "build.prof"]
+    )
+    assert args.metrics == "m.json"
+    assert args.cprofile == "build.prof"
+
+
 def test_get_config() -> None:
     """Test get_config."""
     config = """
@@ -317,6 +476,877 @@ foo bar
     assert os.path.exists(f"{args.output_dir}/tags/bar.html")
 
 
+def test_build_incremental(args: Namespace) -> None:
+    """Test unchanged sources are not rebuilt."""
+    article = """\
+title: some article
+date: 2020-01-01
+tags: foo
+
+some text
+    """
+    with open(f"{args.input_dir}/article.md", "w") as fh:
+        fh.write(article)
+    with open(f"{args.input_dir}/page.md", "w") as fh:
+        fh.write("title: page\n\nsome text")
+
+    def mtimes() -> dict[str, int]:
+        return {
+            f: os.stat(f"{args.output_dir}/{f}").st_mtime_ns
+            for f in ("article.html", "page.html", "index.html", "atom.xml")
+        }
+
+    blag.build(args)
+    t1 = mtimes()
+
+    # nothing changed, nothing is written
+    blag.build(args)
+    t2 = mtimes()
+    assert t1 == t2
+
+    # a changed page does not affect the listings
+    with open(f"{args.input_dir}/page.md", "a") as fh:
+        fh.write("more text")
+    blag.build(args)
+    t3 = mtimes()
+    assert t3["page.html"] > t2["page.html"]
+    assert t3["article.html"] == t2["article.html"]
+    assert t3["index.html"] == t2["index.html"]
+
+    # a changed article affects the listings
+    with open(f"{args.input_dir}/article.md", "w") as fh:
+        fh.write(article.replace("some article", "changed article"))
+    blag.build(args)
+    t4 = mtimes()
+    assert t4["page.html"] == t3["page.html"]
+    assert t4["article.html"] > t3["article.html"]
+    assert t4["index.html"] > t3["index.html"]
+    assert t4["atom.xml"] > t3["atom.xml"]
+
+    # changed templates cause a rerender of the outputs depending on them
+    with open(f"{args.template_dir}/base.html", "a") as fh:
+        fh.write("<!-- changed -->")
+    blag.build(args)
+    t5 = mtimes()
+    assert all(t5[f] > t4[f] for f in t5 if f.endswith(".html"))
+    assert t5["atom.xml"] == t4["atom.xml"]
+    with open(f"{args.output_dir}/page.html") as fh:
+        assert "changed" in fh.read()
+
+    # deleted sources are removed from the output
+    os.remove(f"{args.input_dir}/page.md")
+    blag.build(args)
+    assert not os.path.exists(f"{args.output_dir}/page.html")
+
+
+def test_build_skips_unchanged_static_files(args: Namespace) -> None:
+    """Test static files are only copied if they changed."""
+    with open(f"{args.static_dir}/test", "w") as fh:
+        fh.write("hello")
+    with open(f"{args.input_dir}/test.txt", "w") as fh:
+        fh.write("hello")
+    blag.build(args)
+    stat1 = os.stat(f"{args.output_dir}/test")
+    stat2 = os.stat(f"{args.output_dir}/test.txt")
+
+    blag.build(args)
+    assert os.path.samestat(stat1, os.stat(f"{args.output_dir}/test"))
+    assert os.path.samestat(stat2, os.stat(f"{args.output_dir}/test.txt"))
+
+    os.remove(f"{args.output_dir}/test")
+    args.copy_mode = "hardlink"
+    blag.build(args)
+    assert os.path.samefile(
+        f"{args.static_dir}/test", f"{args.output_dir}/test"
+    )
+
+
+def test_build_unchanged_outputs(args: Namespace) -> None:
+    """Test outputs whose content did not change are not written."""
+    with open(f"{args.input_dir}/article.md", "w") as fh:
+        fh.write("title: article\ndate: 2020-01-01\ntags: foo\n\ntext")
+    blag.build(args)
+    stat = os.stat(f"{args.output_dir}/article.html")
+
+    # without manifest, everything is rendered again but nothing changed
+    os.remove(f"{args.output_dir}/.blag-manifest.json")
+    blag.build(args)
+    new = os.stat(f"{args.output_dir}/article.html")
+    assert (new.st_ino, new.st_mtime_ns) == (stat.st_ino, stat.st_mtime_ns)
+
+
+def test_build_staging(args: Namespace) -> None:
+    """Test building into a staging directory."""
+    args.staging = True
+    with open(f"{args.input_dir}/page.md", "w") as fh:
+        fh.write("title: page\n\nsome text")
+    blag.build(args)
+    assert os.path.exists(f"{args.output_dir}/page.html")
+    assert not os.path.exists(f"{args.output_dir}.staging")
+    mtime = os.stat(f"{args.output_dir}/page.html").st_mtime_ns
+
+    # the build is still incremental
+    blag.build(args)
+    assert os.stat(f"{args.output_dir}/page.html").st_mtime_ns == mtime
+
+    # a failed build leaves the output directory alone
+    with open(f"{args.input_dir}/page.md", "w") as fh:
+        fh.write("date: ")
+    with pytest.raises(ValueError):
+        blag.build(args)
+    assert os.stat(f"{args.output_dir}/page.html").st_mtime_ns == mtime
+    assert not os.path.exists(f"{args.output_dir}.staging")
+
+
+def test_build_profile(args: Namespace, capsys: CaptureFixture[str]) -> None:
+    """Test profiling a build."""
+    blag.build(args)
+    assert "Slowest files" not in capsys.readouterr().out
+
+    args.profile = True
+    args.staging = True
+    with open(f"{args.input_dir}/page.md", "w") as fh:
+        fh.write("title: page\n\nsome text")
+    blag.build(args)
+    out = capsys.readouterr().out
+    assert "markdown" in out
+    assert "page.html" in out
+    assert "1 converted, 1 rendered, 1 written, 0 unchanged" in out
+
+    args.profile = False
+    args.metrics = "metrics.json"
+    args.cprofile = "build.prof"
+    blag.build(args)
+    with open("metrics.json") as fh:
+        metrics = json.load(fh)
+    assert set(metrics["stages"]) >= {"walk", "markdown", "finish"}
+    assert metrics["total"] == pytest.approx(sum(metrics["stages"].values()))
+    sources = [f for f in os.listdir(args.input_dir) if f.endswith(".md")]
+    assert metrics["counters"]["sources"] == len(sources)
+    assert "rendered" not in metrics["counters"]
+    assert metrics["slowest"] == []
+    assert pstats.Stats("build.prof").get_stats_profile().func_profiles
+
+
+def test_build_precompress(args: Namespace) -> None:
+    """Test precompressing the outputs."""
+    assert not blag.parse_args(["build"]).precompress
+    assert blag.parse_args(["build", "--precompress"]).precompress
+
+    blag.build(args)
+    assert not os.path.exists(f"{args.output_dir}/atom.xml.gz")
+
+    args.precompress = True
+    args.staging = True
+    blag.build(args)
+    for path in "atom.xml", "index.html", "archive.html", "style.css":
+        assert os.path.exists(f"{args.output_dir}/{path}.gz")
+    assert not os.path.exists(f"{args.output_dir}/favicon.ico.gz")
+
+
+def test_build_minify(args: Namespace) -> None:
+    """Test minifying the outputs."""
+    assert not blag.parse_args(["build"]).minify
+    assert blag.parse_args(["build", "--minify"]).minify
+    assert blag.parse_args(["serve", "--minify"]).minify
+
+    os.makedirs(args.input_dir, exist_ok=True)
+    with open(f"{args.input_dir}/foo.md", "w") as fh:
+        fh.write(
+            "title: foo\n"
+            "date: 2020-01-01\n"
+            "tags: bar\n\n"
+            "some   text\n\n"
+            "```python\ndef f():\n    return  1\n```\n"
+        )
+    blag.build(args)
+    with open(f"{args.output_dir}/foo.html") as fh:
+        html = fh.read()
+    assert "\n  " in html
+
+    args.minify = True
+    blag.build(args)
+    with open(f"{args.output_dir}/foo.html") as fh:
+        minified = fh.read()
+    assert len(minified) < len(html)
+    assert "some text" in minified
+    # the code block is kept as it is
+    assert '<span class="k">return</span>  <span class="mi">1</span>' in (
+        minified
+    )
+    for path in "index.html", "archive.html", "tags/index.html":
+        with open(f"{args.output_dir}/{path}") as fh:
+            assert "\n  " not in fh.read()
+    with open(f"{args.output_dir}/style.css") as fh:
+        assert "\n" not in fh.read()
+
+    # nothing changed, nothing is written
+    mtimes = {
+        path: os.stat(f"{args.output_dir}/{path}").st_mtime_ns
+        for path in ("foo.html", "index.html", "style.css")
+    }
+    blag.build(args)
+    for path, mtime in mtimes.items():
+        assert os.stat(f"{args.output_dir}/{path}").st_mtime_ns == mtime
+
+    # a parallel build minifies as well
+    args.output_dir = "build-parallel"
+    args.jobs = 2
+    blag.build(args)
+    with open(f"{args.output_dir}/foo.html") as fh:
+        assert fh.read() == minified
+
+    # without minification, the pages are rendered again
+    args.output_dir = "build"
+    args.jobs = 1
+    args.minify = False
+    blag.build(args)
+    with open(f"{args.output_dir}/foo.html") as fh:
+        assert fh.read() == html
+    with open(f"{args.output_dir}/style.css") as fh:
+        assert "\n" in fh.read()
+
+
+def test_build_fingerprint_assets(args: Namespace) -> None:
+    """Test the rendered pages refer to the hashed copies of the assets."""
+    assert not blag.parse_args(["build"]).fingerprint_assets
+    for command in "build", "serve":
+        parsed = blag.parse_args([command, "--fingerprint-assets"])
+        assert parsed.fingerprint_assets
+
+    os.makedirs(f"{args.input_dir}/images", exist_ok=True)
+    with open(f"{args.input_dir}/images/a.png", "wb") as fh:
+        fh.write(b"png")
+    with open(f"{args.input_dir}/foo.md", "w") as fh:
+        fh.write("title: foo\ndate: 2020-01-01\n\n![a](images/a.png)\n")
+    blag.build(args)
+    with open(f"{args.output_dir}/foo.html") as fh:
+        html = fh.read()
+    assert 'href="/style.css"' in html
+    assert 'src="images/a.png"' in html
+
+    args.fingerprint_assets = True
+    blag.build(args)
+    with open(f"{args.output_dir}/.blag-assets.json") as fh:
+        entries = json.load(fh)["assets"]
+    css = entries["style.css"]["name"]
+    png = entries["images/a.png"]["name"]
+    assert os.path.exists(f"{args.output_dir}/{css}")
+    assert os.path.exists(f"{args.output_dir}/{png}")
+    # the plain copies are kept
+    assert os.path.exists(f"{args.output_dir}/style.css")
+    for path in "foo.html", "index.html", "tags/index.html":
+        with open(f"{args.output_dir}/{path}") as fh:
+            assert f'href="/{css}"' in fh.read()
+    with open(f"{args.output_dir}/foo.html") as fh:
+        assert f'src="{png}"' in fh.read()
+
+    # only changed assets get new names
+    with open(f"{args.static_dir}/style.css", "a") as fh:
+        fh.write("p {}\n")
+    session = blag.BuildSession(args)
+    session.update({f"{args.static_dir}/style.css"})
+    with open(f"{args.output_dir}/.blag-assets.json") as fh:
+        entries = json.load(fh)["assets"]
+    assert entries["style.css"]["name"] != css
+    assert entries["images/a.png"]["name"] == png
+    assert not os.path.exists(f"{args.output_dir}/{css}")
+    with open(f"{args.output_dir}/foo.html") as fh:
+        assert f'href="/{entries["style.css"]["name"]}"' in fh.read()
+
+    # a parallel build rewrites the links as well
+    args.output_dir = "build-parallel"
+    args.jobs = 2
+    blag.build(args)
+    with open(f"{args.output_dir}/foo.html") as fh:
+        assert f'src="{png}"' in fh.read()
+
+
+def test_generate_sitemap(cleandir: str) -> None:
+    """Test the sitemap is split into shards."""
+    entries: list[tuple[str, dict[str, Any]]] = [
+        (f"{i} & more.html", {}) for i in range(5)
+    ]
+    lastmod = {"0 & more.html": 0.0, "3 & more.html": 86400.0}
+    url = "https://example.com/"
+
+    written = blag.generate_sitemap(entries, lastmod, "build", url)
+    assert written == ["sitemap.xml"]
+    with open("build/sitemap.xml") as fh:
+        xml = fh.read()
+    assert "<urlset" in xml
+    assert xml.count("<url>") == 5
+    assert "<loc>https://example.com/0%20%26%20more.html</loc>" in xml
+    assert xml.count("<lastmod>") == 2
+
+    written = blag.generate_sitemap(entries, lastmod, "build", url, 2)
+    assert written == [
+        "sitemap-1.xml",
+        "sitemap-2.xml",
+        "sitemap-3.xml",
+        "sitemap.xml",
+    ]
+    with open("build/sitemap.xml") as fh:
+        xml = fh.read()
+    assert "<sitemapindex" in xml
+    assert "<loc>https://example.com/sitemap-3.xml</loc>" in xml
+    assert "<lastmod>1970-01-02T00:00:00+00:00</lastmod>" in xml
+    with open("build/sitemap-2.xml") as fh:
+        assert fh.read().count("<url>") == 2
+
+    # a new last entry only changes the last shard and the index
+    entries.append(("5.html", {}))
+    written = blag.generate_sitemap(entries, lastmod, "build", url, 2)
+    assert written == ["sitemap-3.xml"]
+
+    # shards that are no longer needed are removed
+    written = blag.generate_sitemap(entries, lastmod, "build", url, 3)
+    assert written == [
+        "sitemap-1.xml",
+        "sitemap-2.xml",
+        "sitemap.xml",
+        "sitemap-3.xml",
+    ]
+    assert not os.path.exists("build/sitemap-3.xml")
+    written = blag.generate_sitemap(entries, lastmod, "build", url)
+    assert written == ["sitemap.xml", "sitemap-1.xml", "sitemap-2.xml"]
+    assert not os.path.exists("build/sitemap-1.xml")
+
+
+def test_build_sitemap(args: Namespace) -> None:
+    """Test the sitemap's lastmod follows the sources' contents."""
+    with open(f"{args.input_dir}/a.md", "w") as fh:
+        fh.write("title: a\ndate: 2020-01-01\n\ntext")
+    os.utime(f"{args.input_dir}/a.md", (0, 0))
+    blag.build(args)
+    with open(f"{args.output_dir}/sitemap.xml") as fh:
+        xml = fh.read()
+    assert "<loc>https://example.com/a.html</loc>" in xml
+    assert "<loc>https://example.com/about.html</loc>" in xml
+    assert "<lastmod>1970-01-01T00:00:00+00:00</lastmod>" in xml
+
+    # touched, e.g. checked out again
+    os.utime(f"{args.input_dir}/a.md", (86400, 86400))
+    blag.build(args)
+    with open(f"{args.output_dir}/sitemap.xml") as fh:
+        assert fh.read() == xml
+
+    # changed
+    with open(f"{args.input_dir}/a.md", "a") as fh:
+        fh.write(" more text")
+    os.utime(f"{args.input_dir}/a.md", (86400, 86400))
+    blag.build(args)
+    with open(f"{args.output_dir}/sitemap.xml") as fh:
+        assert "<lastmod>1970-01-02T00:00:00+00:00</lastmod>" in fh.read()
+
+
+def test_paginate() -> None:
+    """Test paginate."""
+    articles = [(f"{i}.html", dict(title=str(i))) for i in range(5)]
+    pages = blag.paginate(articles, 2, "tags/foo.html", "tags/foo/page/")
+    assert [dst for dst, _, _ in pages] == [
+        "tags/foo.html",
+        "tags/foo/page/2.html",
+        "tags/foo/page/3.html",
+    ]
+    assert [len(a) for _, a, _ in pages] == [2, 2, 1]
+    assert pages[0][2] == dict(
+        page=1, pages=3, previous=None, next="foo/page/2.html"
+    )
+    assert pages[1][2] == dict(
+        page=2, pages=3, previous="../../foo.html", next="3.html"
+    )
+    assert pages[2][2]["next"] is None
+
+    # no pagination
+    pages = blag.paginate(articles, 0, "archive.html", "archive/page/")
+    assert len(pages) == 1
+    assert pages[0][1] == articles
+    assert blag.paginate([], 2, "archive.html", "archive/page/") == [
+        ("archive.html", [], dict(page=1, pages=1, previous=None, next=None))
+    ]
+
+
+def test_build_pagination(args: Namespace) -> None:
+    """Test paginated archive and tag pages."""
+    with open("config.ini", "a") as fh:
+        fh.write("\nper_page = 2\n")
+    shutil.rmtree(args.input_dir)
+    os.mkdir(args.input_dir)
+
+    def write_article(day: int) -> None:
+        with open(f"{args.input_dir}/{day}.md", "w") as fh:
+            fh.write(f"title: a{day}\ndate: 2020-01-{day:02d}\ntags: foo\n\nx")
+
+    for day in range(10, 15):
+        write_article(day)
+    blag.build(args)
+
+    pages = ["archive.html", "archive/page/2.html", "archive/page/3.html"]
+    tag_pages = [
+        "tags/foo.html",
+        "tags/foo/page/2.html",
+        "tags/foo/page/3.html",
+    ]
+    for page in pages + tag_pages:
+        assert os.path.exists(f"{args.output_dir}/{page}")
+    with open(f"{args.output_dir}/archive/page/2.html") as fh:
+        html = fh.read()
+    assert 'href="../../12.html"' in html
+    assert 'href="../../archive.html"' in html
+    assert 'href="3.html"' in html
+    with open(f"{args.output_dir}/tags/foo/page/3.html") as fh:
+        assert 'href="../../../10.html"' in fh.read()
+    with open(f"{args.output_dir}/index.html") as fh:
+        html = fh.read()
+    assert "a14" in html and "a13" in html and "a12" not in html
+
+    def mtimes() -> dict[str, int]:
+        return {
+            p: os.stat(f"{args.output_dir}/{p}").st_mtime_ns
+            for p in pages + tag_pages
+        }
+
+    # an older article only affects the last pages
+    t1 = mtimes()
+    write_article(9)
+    blag.build(args)
+    t2 = mtimes()
+    assert {p for p in t2 if t2[p] > t1[p]} == {
+        "archive/page/3.html",
+        "tags/foo/page/3.html",
+    }
+
+    # pages beyond the last one are removed
+    for day in range(9, 13):
+        os.remove(f"{args.input_dir}/{day}.md")
+    blag.build(args)
+    assert os.path.exists(f"{args.output_dir}/archive.html")
+    assert not os.path.exists(f"{args.output_dir}/archive/page/2.html")
+    assert not os.path.exists(f"{args.output_dir}/tags/foo/page/2.html")
+
+
+def test_build_session_update_pagination(
+    args: Namespace, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test an update only renders the listing pages that changed."""
+    with open("config.ini", "a") as fh:
+        fh.write("\nper_page = 2\n")
+    shutil.rmtree(args.input_dir)
+    os.mkdir(args.input_dir)
+    for day in range(10, 15):
+        with open(f"{args.input_dir}/{day}.md", "w") as fh:
+            fh.write(f"title: a{day}\ndate: 2020-01-{day}\ntags: foo\n\nx")
+    session = blag.BuildSession(args)
+    session.build()
+
+    rendered = []
+    write_page = blag._write_page
+
+    def render(path: str, *args: Any) -> bool:
+        rendered.append(path)
+        return write_page(path, *args)
+
+    monkeypatch.setattr(blag, "_write_page", render)
+    with open(f"{args.input_dir}/10.md", "a") as fh:
+        fh.write("more text")
+    session.update({f"{args.input_dir}/10.md"})
+    assert sorted(rendered) == [
+        f"{args.output_dir}/archive/page/3.html",
+        f"{args.output_dir}/tags/foo/page/3.html",
+    ]
+    session.close()
+
+def test_article_record(environment: Environment) -> None:
+    """Test ArticleRecord."""
+    context = dict(title="title", content="<p>content</p>")
+    record = blag.ArticleRecord("foo.html", context)
+    assert record.dst == record["dst"] == "foo.html"
+    assert record.title == record["title"] == "title"
+    assert record.get("description") is None
+    assert dict(record) == dict(context, dst="foo.html")
+    with pytest.raises(AttributeError):
+        record.description
+    with pytest.raises(AttributeError):
+        record.title = "other"
+    # the context is shared, not copied
+    assert record.content is context["content"]
+
+    template = environment.from_string(
+        "{{ entry.dst }} {{ entry.title }} {{ entry.description }}"
+    )
+    assert template.render(entry=record) == "foo.html title "
+
+    records = blag.article_records([("foo.html", context)])
+    assert records[0][1].title == "title"
+
+    # contexts without content load it when it is used
+    loaded = []
+
+    def content(dst: str) -> str:
+        loaded.append(dst)
+        return "<p>loaded</p>"
+
+    record = blag.ArticleRecord("foo.html", dict(title="title"), content)
+    assert template.render(entry=record) == "foo.html title "
+    assert loaded == []
+    assert record.content == record["content"] == "<p>loaded</p>"
+    assert loaded == ["foo.html", "foo.html"]
+    assert dict(record) == dict(
+        title="title", dst="foo.html", content="<p>loaded</p>"
+    )
+    # contexts with content do not
+    record = blag.ArticleRecord("foo.html", context, content)
+    assert record.content == "<p>content</p>"
+    assert len(loaded) == 3
+
+
+def test_tag_index() -> None:
+    """Test tag_index."""
+    articles: list[tuple[str, dict[str, Any]]] = [
+        ("a.html", dict(tags=["foo", "bar"])),
+        ("b.html", dict()),
+        ("c.html", dict(tags=["bar"])),
+    ]
+    index = blag.tag_index(articles)
+    assert index == {"foo": ["a.html"], "bar": ["a.html", "c.html"]}
+    assert list(index) == ["foo", "bar"]
+
+
+def test_build_tags(args: Namespace) -> None:
+    """Test only changed tag pages are rendered and unused ones removed."""
+    with open("config.ini", "a") as fh:
+        fh.write("\nper_page = 1\n")
+    for name, tags in ("a", "foo, bar"), ("b", "bar"), ("c", "baz"):
+        with open(f"{args.input_dir}/{name}.md", "w") as fh:
+            fh.write(f"title: {name}\ndate: 2020-01-01\ntags: {tags}\n\nx")
+    blag.build(args)
+    assert os.path.exists(f"{args.output_dir}/tags/bar/page/2.html")
+
+    def mtime(path: str) -> int:
+        return os.stat(f"{args.output_dir}/{path}").st_mtime_ns
+
+    baz = mtime("tags/baz.html")
+    with open(f"{args.input_dir}/b.md", "w") as fh:
+        fh.write("title: b\ndate: 2020-01-01\ntags: foo\n\nx")
+    with open(f"{args.input_dir}/a.md", "w") as fh:
+        fh.write("title: a\ndate: 2020-01-01\ntags: foo\n\nx")
+    blag.build(args)
+    assert mtime("tags/baz.html") == baz
+    assert os.path.exists(f"{args.output_dir}/tags/foo/page/2.html")
+    assert not os.path.exists(f"{args.output_dir}/tags/bar.html")
+    assert not os.path.exists(f"{args.output_dir}/tags/bar")
+    with open(f"{args.output_dir}/tags/index.html") as fh:
+        assert "bar" not in fh.read()
+
+
+def change_template(path: str) -> None:
+    """Change the content block of a template."""
+    with open(path) as fh:
+        template = fh.read()
+    with open(path, "w") as fh:
+        fh.write(
+            template.replace(
+                "{% block content %}", "{% block content %}<!-- changed -->"
+            )
+        )
+
+
+def test_build_template_dependencies(args: Namespace) -> None:
+    """Test only outputs depending on a changed template are re-rendered."""
+    with open(f"{args.input_dir}/article.md", "w") as fh:
+        fh.write("title: article\ndate: 2020-01-01\ntags: foo\n\ntext")
+    with open(f"{args.input_dir}/page.md", "w") as fh:
+        fh.write("title: page\n\nsome text")
+
+    outputs = (
+        "article.html",
+        "page.html",
+        "index.html",
+        "archive.html",
+        "tags/index.html",
+        "tags/foo.html",
+    )
+
+    def mtimes() -> dict[str, int]:
+        return {
+            f: os.stat(f"{args.output_dir}/{f}").st_mtime_ns for f in outputs
+        }
+
+    blag.build(args)
+    t1 = mtimes()
+
+    change_template(f"{args.template_dir}/page.html")
+    blag.build(args)
+    t2 = mtimes()
+    assert t2["page.html"] > t1["page.html"]
+    assert all(t2[f] == t1[f] for f in outputs if f != "page.html")
+
+    change_template(f"{args.template_dir}/tag.html")
+    blag.build(args)
+    t3 = mtimes()
+    assert t3["tags/foo.html"] > t2["tags/foo.html"]
+    assert t3["article.html"] == t2["article.html"]
+    assert t3["index.html"] == t2["index.html"]
+
+
+def test_build_markdown_update(
+    args: Namespace, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test a changed markdown configuration regenerates the feed."""
+    with open(f"{args.input_dir}/article.md", "w") as fh:
+        fh.write("title: article\ndate: 2020-01-01\ntags: foo\n\ntext")
+    blag.build(args)
+
+    def convert(*args: Any) -> tuple[str, dict[str, str]]:
+        content, meta = convert_markdown(*args)
+        return content + "<p>converted again</p>", meta
+
+    monkeypatch.setattr(blag, "markdown_fingerprint", lambda: "updated")
+    monkeypatch.setattr(blag, "convert_markdown", convert)
+    blag.build(args)
+    for path in "article.html", "atom.xml":
+        with open(f"{args.output_dir}/{path}") as fh:
+            assert "converted again" in fh.read()
+
+@pytest.mark.parametrize("cache_size", [512, 0])
+def test_build_feed_content(args: Namespace, cache_size: int) -> None:
+    """Test the feed has the content of unchanged articles."""
+    args.cache_size = cache_size
+    for day in 1, 2:
+        with open(f"{args.input_dir}/{day}.md", "w") as fh:
+            fh.write(f"title: a{day}\ndate: 2020-01-0{day}\n\ntext {day}")
+    blag.build(args)
+
+    # the manifest only has the metadata
+    with open(f"{args.output_dir}/.blag-manifest.json") as fh:
+        assert "text 1" not in fh.read()
+
+    with open(f"{args.input_dir}/3.md", "w") as fh:
+        fh.write("title: a3\ndate: 2020-01-03\n\ntext 3")
+    blag.build(args)
+    with open(f"{args.output_dir}/atom.xml") as fh:
+        feed = fh.read()
+    for day in 1, 2, 3:
+        assert f"text {day}" in feed
+
+def test_build_other_template_files(args: Namespace) -> None:
+    """Test files in the template dir that are no templates are ignored."""
+    with open(f"{args.template_dir}/draft.html", "w") as fh:
+        fh.write("{% if %}")
+    with open(f"{args.template_dir}/logo.png", "wb") as fh:
+        fh.write(b"\x89PNG\r\n\x1a\n\xff")
+    with open(f"{args.template_dir}/.base.html.swp", "wb") as fh:
+        fh.write(b"\xff\xfe")
+    with open(f"{args.input_dir}/page.md", "w") as fh:
+        fh.write("title: page\n\nsome text")
+    blag.build(args)
+    assert os.path.exists(f"{args.output_dir}/page.html")
+
+def test_build_feed_entries(args: Namespace) -> None:
+    """Test the feed is only regenerated if its entries changed."""
+    with open("config.ini", "a") as fh:
+        fh.write("\nfeed_entries = 1\nfeed_summary_only = yes\n")
+    shutil.rmtree(args.input_dir)
+    os.mkdir(args.input_dir)
+    for day in 1, 2:
+        with open(f"{args.input_dir}/{day}.md", "w") as fh:
+            fh.write(f"title: a{day}\ndate: 2020-01-0{day}\n\ntext")
+
+    session = blag.BuildSession(args)
+    session.build()
+    with open(f"{args.output_dir}/atom.xml") as fh:
+        feed = fh.read()
+    assert "<title>a2</title>" in feed
+    assert "<title>a1</title>" not in feed
+    assert "<content" not in feed
+
+    # the older article is not in the feed
+    with open(f"{args.input_dir}/1.md", "a") as fh:
+        fh.write("more text")
+    written = session.update({f"{args.input_dir}/1.md"})
+    assert written is not None
+    assert "atom.xml" not in written
+    # only the summary is in the feed
+    with open(f"{args.input_dir}/2.md", "a") as fh:
+        fh.write("more text")
+    written = session.update({f"{args.input_dir}/2.md"})
+    assert written is not None
+    assert "atom.xml" not in written
+    with open(f"{args.input_dir}/2.md", "w") as fh:
+        fh.write("title: b2\ndate: 2020-01-02\n\ntext")
+    written = session.update({f"{args.input_dir}/2.md"})
+    assert written is not None
+    assert "atom.xml" in written
+    session.close()
+
+
+def test_build_session_update(args: Namespace) -> None:
+    """Test a session only rebuilds what changed paths affect."""
+    for name, tags in ("a", "foo, bar"), ("b", "baz"):
+        with open(f"{args.input_dir}/{name}.md", "w") as fh:
+            fh.write(f"title: {name}\ndate: 2020-01-01\ntags: {tags}\n\ntext")
+    with open(f"{args.input_dir}/page.md", "w") as fh:
+        fh.write("title: page\n\nsome text")
+
+    outputs = (
+        "a.html",
+        "b.html",
+        "page.html",
+        "index.html",
+        "archive.html",
+        "atom.xml",
+        "tags/index.html",
+        "tags/foo.html",
+        "tags/bar.html",
+        "tags/baz.html",
+        "sitemap.xml",
+    )
+
+    def mtimes() -> dict[str, int]:
+        return {
+            f: os.stat(f"{args.output_dir}/{f}").st_mtime_ns
+            for f in outputs
+            if os.path.exists(f"{args.output_dir}/{f}")
+        }
+
+    session = blag.BuildSession(args)
+    session.build()
+    assert os.path.exists(f"{args.output_dir}/.blag-manifest.json")
+    t1 = mtimes()
+
+    # an edited article: its page, the listings, its tag pages and the
+    # sitemap, as the article's lastmod changed
+    with open(f"{args.input_dir}/a.md", "w") as fh:
+        fh.write("title: a2\ndate: 2020-01-02\ntags: foo, qux\n\ntext")
+    os.utime(f"{args.input_dir}/a.md", (2e9, 2e9))
+    written = session.update({f"{args.input_dir}/a.md"})
+    t2 = mtimes()
+    changed = {f for f in t2 if t2[f] > t1[f]}
+    assert changed == {
+        "a.html",
+        "index.html",
+        "archive.html",
+        "atom.xml",
+        "tags/index.html",
+        "tags/foo.html",
+        "sitemap.xml",
+    }
+    assert os.path.exists(f"{args.output_dir}/tags/qux.html")
+    # the pages of tags that are no longer used are removed
+    assert not os.path.exists(f"{args.output_dir}/tags/bar.html")
+    assert written == changed | {"tags/qux.html"}
+    with open(f"{args.output_dir}/index.html") as fh:
+        assert "a2" in fh.read()
+    # the manifest is only saved when the session is closed
+    assert not os.path.exists(f"{args.output_dir}/.blag-manifest.json")
+
+    # an edited page does not affect the listings, only the sitemap
+    with open(f"{args.input_dir}/page.md", "a") as fh:
+        fh.write("more text")
+    os.utime(f"{args.input_dir}/page.md", (2e9, 2e9))
+    assert session.update({f"{args.input_dir}/page.md"}) == {
+        "page.html",
+        "sitemap.xml",
+    }
+    t3 = mtimes()
+    assert {f for f in t3 if t3[f] > t2[f]} == {"page.html", "sitemap.xml"}
+
+    # deleted sources are removed
+    os.remove(f"{args.input_dir}/b.md")
+    session.update({f"{args.input_dir}/b.md"})
+    assert not os.path.exists(f"{args.output_dir}/b.html")
+    with open(f"{args.output_dir}/tags/index.html") as fh:
+        assert "baz" not in fh.read()
+
+    # changed templates trigger a build
+    with open(f"{args.template_dir}/base.html", "a") as fh:
+        fh.write("<!-- changed -->")
+    assert session.update({f"{args.template_dir}/base.html"}) is None
+    with open(f"{args.output_dir}/page.html") as fh:
+        assert "changed" in fh.read()
+
+    # the next build picks up where the session left off
+    with open(f"{args.input_dir}/a.md", "a") as fh:
+        fh.write("more text")
+    session.update({f"{args.input_dir}/a.md"})
+    session.close()
+    a_mtime = os.stat(f"{args.output_dir}/a.html").st_mtime_ns
+    blag.build(args)
+    assert os.stat(f"{args.output_dir}/a.html").st_mtime_ns == a_mtime
+
+
+def test_build_incremental_missing_output(args: Namespace) -> None:
+    """Test missing outputs are rebuilt even if the source is unchanged."""
+    with open(f"{args.input_dir}/page.md", "w") as fh:
+        fh.write("title: page\n\nsome text")
+    blag.build(args)
+    os.remove(f"{args.output_dir}/page.html")
+    os.remove(f"{args.output_dir}/index.html")
+    blag.build(args)
+    assert os.path.exists(f"{args.output_dir}/page.html")
+    assert os.path.exists(f"{args.output_dir}/index.html")
+
+
+def test_build_cache(
+    args: Namespace, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test the cache is used if the manifest does not know a file."""
+    with open(f"{args.input_dir}/article.md", "w") as fh:
+        fh.write("title: article\ndate: 2020-01-01\n\nsome text")
+    blag.build(args)
+    with open(f"{args.output_dir}/article.html") as fh:
+        expected = fh.read()
+
+    def fail(*args: Any) -> None:
+        raise AssertionError("convert_markdown called")
+
+    monkeypatch.setattr(blag, "convert_markdown", fail)
+    args.output_dir = "build2"
+    blag.build(args)
+    with open(f"{args.output_dir}/article.html") as fh:
+        assert fh.read() == expected
+
+    # without cache, the file is converted again
+    args.output_dir = "build3"
+    args.cache_size = 0
+    with pytest.raises(AssertionError):
+        blag.build(args)
+
+
+def test_build_parallel(args: Namespace) -> None:
+    """Test a parallel build is identical to a serial build."""
+    for i in range(10):
+        with open(f"{args.input_dir}/{i}.md", "w") as fh:
+            fh.write(
+                f"title: article {i}\n"
+                # some articles share a date to test the sort is stable
+                f"date: 2020-01-0{1 + i // 2}\n"
+                f"tags: foo, tag{i % 3}\n\n"
+                f"some text {i}\n"
+            )
+
+    def read_tree(path: str) -> dict[str, bytes]:
+        tree = {}
+        for root, _, filenames in os.walk(path):
+            for filename in filenames:
+                with open(f"{root}/{filename}", "rb") as fh:
+                    tree[os.path.relpath(f"{root}/{filename}", path)] = (
+                        fh.read()
+                    )
+        return tree
+
+    blag.build(args)
+    serial = read_tree(args.output_dir)
+
+    args.output_dir = "build-parallel"
+    args.jobs = 4
+    blag.build(args)
+    parallel = read_tree(args.output_dir)
+
+    assert serial == parallel
+
+
 @pytest.mark.parametrize(
     "template",
     [
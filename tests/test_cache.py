@@ -0,0 +1,111 @@
+"""Tests for the cache module."""
+
+import os
+import time
+from argparse import Namespace
+
+import pytest
+from pytest import CaptureFixture
+
+from blag.cache import Cache, cache_command
+
+
+def test_key() -> None:
+    """Test key depends on all parts."""
+    assert Cache.key("a", "b") == Cache.key("a", "b")
+    assert Cache.key("a", "b") != Cache.key("a", "c")
+    assert Cache.key("ab", "c") != Cache.key("a", "bc")
+
+
+def test_get_set(cleandir: str) -> None:
+    """Test get and set."""
+    cache = Cache(".blag-cache")
+    key = Cache.key("foo")
+    assert cache.get("test", key) is None
+    cache.set("test", key, b"bar")
+    assert cache.get("test", key) == b"bar"
+    # namespaces are separated
+    assert cache.get("test2", key) is None
+
+
+def test_set_failure(
+    cleandir: str, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test a failed write leaves no temporary file behind."""
+    cache = Cache(".blag-cache")
+    directory = os.path.dirname(cache._path("test", Cache.key("foo")))
+
+    def fail(src: str, dst: str) -> None:
+        raise OSError("disk full")
+
+    monkeypatch.setattr(os, "replace", fail)
+    with pytest.raises(OSError):
+        cache.set("test", Cache.key("foo"), b"bar")
+    monkeypatch.undo()
+    assert os.listdir(directory) == []
+
+
+def test_leftover_temporary_files(cleandir: str) -> None:
+    """Test temporary files are no entries and old ones are evicted."""
+    cache = Cache(".blag-cache")
+    cache.set("test", Cache.key("foo"), b"bar")
+    directory = os.path.dirname(cache._path("test", Cache.key("foo")))
+    for name, age in ("old.tmp", 7200), ("new.tmp", 0):
+        with open(f"{directory}/{name}", "wb") as fh:
+            fh.write(b"0123456789")
+        t = time.time() - age
+        os.utime(f"{directory}/{name}", (t, t))
+    assert cache.stats() == {"test": (1, 3)}
+
+    cache.evict()
+    assert not os.path.exists(f"{directory}/old.tmp")
+    # it might still be written by another process
+    assert os.path.exists(f"{directory}/new.tmp")
+    assert cache.get("test", Cache.key("foo")) == b"bar"
+
+
+def test_evict(cleandir: str) -> None:
+    """Test evict removes the least recently used entries."""
+    cache = Cache(".blag-cache", max_size=20)
+    keys = [Cache.key(str(i)) for i in range(3)]
+    for i, key in enumerate(keys):
+        cache.set("test", key, b"0123456789")
+        # make sure the entries have distinct access times
+        t = time.time() - 100 + i
+        os.utime(cache._path("test", key), (t, t))
+    # access the oldest entry, so the second one is the least recently used
+    # one
+    assert cache.get("test", keys[0]) is not None
+
+    cache.evict()
+    assert cache.get("test", keys[0]) is not None
+    assert cache.get("test", keys[1]) is None
+    assert cache.get("test", keys[2]) is not None
+
+
+def test_stats_and_clear(cleandir: str) -> None:
+    """Test stats and clear."""
+    cache = Cache(".blag-cache")
+    assert cache.stats() == {}
+    cache.set("foo", Cache.key("1"), b"12")
+    cache.set("foo", Cache.key("2"), b"34")
+    cache.set("bar", Cache.key("1"), b"5")
+    assert cache.stats() == {"foo": (2, 4), "bar": (1, 1)}
+
+    cache.clear()
+    assert cache.stats() == {}
+    assert not os.path.exists(".blag-cache")
+
+
+def test_cache_command(cleandir: str, capsys: CaptureFixture[str]) -> None:
+    """Test the cache command."""
+    cache = Cache(".blag-cache")
+    cache.set("foo", Cache.key("1"), b"12")
+
+    cache_command(Namespace(cache_dir=".blag-cache", action="stats"))
+    out, _ = capsys.readouterr()
+    assert "foo: 1 entries" in out
+    assert "total: 1 entries" in out
+
+    cache_command(Namespace(cache_dir=".blag-cache", action="clear"))
+    assert cache.stats() == {}
@@ -0,0 +1,111 @@
+"""Tests for the cli module."""
+
+import multiprocessing
+import pickle
+import subprocess
+import sys
+from argparse import Namespace
+
+import pytest
+
+from blag import cli
+
+# the import time of blag.cli in seconds, importing blag.blag takes about
+# five times as long
+IMPORT_BUDGET = 0.1
+# imported by the commands, but not by the CLI itself
+HEAVY_MODULES = [
+    "blag.blag",
+    "blag.devserver",
+    "blag.markdown",
+    "feedgenerator",
+    "jinja2",
+    "markdown",
+    "pygments",
+]
+
+
+def test_command(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test commands import their implementation when they run."""
+    calls = []
+    monkeypatch.setattr(
+        "blag.quickstart.quickstart", lambda args: calls.append(args)
+    )
+    command = cli.command("blag.quickstart:quickstart")
+    assert command.__name__ == "quickstart"
+    args = Namespace()
+    command(args)
+    assert calls == [args]
+
+
+def test_command_pickle() -> None:
+    """Test the arguments can be passed to spawned processes."""
+    args = cli.parse_args(["serve"])
+    copy = pickle.loads(pickle.dumps(args))
+    assert copy.func.__name__ == "serve"
+
+    # the autoreloader gets the arguments of `blag serve`
+    context = multiprocessing.get_context("spawn")
+    proc = context.Process(target=vars, args=(args,))
+    proc.start()
+    proc.join()
+    assert proc.exitcode == 0
+
+def test_cli_imports() -> None:
+    """Test the CLI does not import the dependencies of the commands."""
+    code = (
+        "import sys\n"
+        "from blag import cli\n"
+        "for command in 'build', 'serve', 'quickstart', 'query':\n"
+        "    cli.parse_args([command])\n"
+        "print('\\n'.join(sys.modules))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
+    modules = {m.split(".")[0] for m in result.stdout.split()}
+    modules |= set(result.stdout.split())
+    assert modules.isdisjoint(HEAVY_MODULES)
+
+
+def test_configure_logging() -> None:
+    """Test blag's messages are logged, debug messages only if verbose."""
+    code = (
+        "import logging, sys\n"
+        "from blag import cli\n"
+        "cli.configure_logging(sys.argv[1] == 'verbose')\n"
+        "logging.getLogger('blag.test').info('info message')\n"
+        "logging.getLogger('blag.test').debug('debug message')\n"
+    )
+    for verbose in "verbose", "quiet":
+        result = subprocess.run(
+            [sys.executable, "-c", code, verbose],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        assert "INFO blag.test info message" in result.stderr
+        assert ("debug message" in result.stderr) == (verbose == "verbose")
+
+
+def import_time() -> float:
+    """Measure the import time of blag.cli in a fresh interpreter."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import blag.cli"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        _, cumulative, name = line.split("|")
+        if name.strip() == "blag.cli":
+            return int(cumulative) / 1_000_000
+    raise AssertionError(result.stderr)
+
+
+def test_import_time() -> None:
+    """Test the CLI stays within its startup budget."""
+    # the fastest of a few runs, to be robust against a busy machine
+    assert min(import_time() for _ in range(3)) < IMPORT_BUDGET
@@ -0,0 +1,103 @@
+"""Tests for the dependencies module."""
+
+from pathlib import Path
+
+from jinja2 import DictLoader, Environment, FileSystemLoader
+
+from blag.dependencies import (
+    dependencies,
+    dependency_graph,
+    template_fingerprints,
+)
+
+TEMPLATES = {
+    "base.html": "{% block content %}{% endblock %}",
+    "macros.html": "{% macro foo() %}foo{% endmacro %}",
+    "footer.html": "footer",
+    "page.html": (
+        '{% extends "base.html" %}'
+        '{% import "macros.html" as macros %}'
+        '{% block content %}{% include "footer.html" %}{% endblock %}'
+    ),
+    "tag.html": '{% extends "base.html" %}',
+    "dynamic.html": "{% include name %}",
+}
+
+
+def test_dependency_graph() -> None:
+    """Test dependency_graph."""
+    env = Environment(loader=DictLoader(TEMPLATES))
+    graph = dependency_graph(env, ["page.html", "tag.html"])
+    # only the templates and what they reference
+    assert set(graph) == {
+        "page.html",
+        "tag.html",
+        "base.html",
+        "macros.html",
+        "footer.html",
+    }
+    assert graph["base.html"] == set()
+    assert graph["page.html"] == {"base.html", "macros.html", "footer.html"}
+    assert graph["tag.html"] == {"base.html"}
+
+    # dynamic references depend on everything
+    graph = dependency_graph(env, ["dynamic.html"])
+    assert graph["dynamic.html"] == set(TEMPLATES) - {"dynamic.html"}
+
+
+def test_dependencies() -> None:
+    """Test dependencies are resolved transitively."""
+    graph = {"a": {"b"}, "b": {"c"}, "c": set(), "d": {"a"}}
+    assert dependencies(graph, "a") == {"a", "b", "c"}
+    assert dependencies(graph, "c") == {"c"}
+    assert dependencies(graph, "d") == {"a", "b", "c", "d"}
+
+
+def test_template_fingerprints() -> None:
+    """Test fingerprints only change with the template's dependencies."""
+    names = ["page.html", "tag.html"]
+    env = Environment(loader=DictLoader(TEMPLATES))
+    f1 = template_fingerprints(env, names)
+
+    templates = TEMPLATES | {"footer.html": "changed"}
+    env = Environment(loader=DictLoader(templates))
+    f2 = template_fingerprints(env, names)
+    assert f1["page.html"] != f2["page.html"]
+    assert f1["tag.html"] == f2["tag.html"]
+
+    templates = TEMPLATES | {"base.html": "changed"}
+    env = Environment(loader=DictLoader(templates))
+    f3 = template_fingerprints(env, names)
+    assert f1["page.html"] != f3["page.html"]
+    assert f1["tag.html"] != f3["tag.html"]
+
+
+def test_template_fingerprints_other_files(tmp_path: Path) -> None:
+    """Test files that are no templates do not break the fingerprints."""
+    (tmp_path / "page.html").write_text(
+        '{% extends "base.html" %}{% include "logo.png" %}'
+    )
+    (tmp_path / "base.html").write_text("{% if %}")
+    (tmp_path / "logo.png").write_bytes(b"\x89PNG\r\n\x1a\n\xff")
+    (tmp_path / "draft.html").write_text("{% if %}")
+    (tmp_path / ".page.html.swp").write_bytes(b"\xff\xfe")
+    env = Environment(loader=FileSystemLoader(tmp_path))
+
+    graph = dependency_graph(env, ["page.html"])
+    assert graph == {
+        "page.html": {"base.html", "logo.png"},
+        "base.html": set(),
+        "logo.png": set(),
+    }
+
+    f1 = template_fingerprints(env, ["page.html"])
+    # unreferenced files are ignored
+    (tmp_path / "draft.html").write_text("{% for %}")
+    assert template_fingerprints(env, ["page.html"]) == f1
+    # templates that cannot be parsed or decoded are fingerprinted by
+    # their content
+    (tmp_path / "base.html").write_text("{% for %}")
+    f2 = template_fingerprints(env, ["page.html"])
+    assert f2 != f1
+    (tmp_path / "logo.png").write_bytes(b"\x89PNG\r\n\x1a\n\xfe")
+    assert template_fingerprints(env, ["page.html"]) != f2
@@ -1,14 +1,85 @@
 """Tests for the devserver module."""
 
+import multiprocessing
+import os
 import threading
 import time
 from argparse import Namespace
+from collections.abc import Callable, Iterator
+from functools import partial
+from http.client import HTTPConnection
+from http.server import ThreadingHTTPServer
+from multiprocessing.queues import Queue
+from typing import Any
+
+import pytest
 
 from blag import devserver
+from blag.watch import Watcher, watcher_factory
 
 WAITTIME = 0.1
 
 
+class _Stop(BaseException):
+    """Stops an autoreloader, which only survives `Exception`s."""
+
+
+class _StoppableWatcher(Watcher):
+    """Watcher that stops the autoreloader once `stop` is set."""
+
+    def __init__(self, watcher: Watcher, stop: threading.Event):
+        super().__init__(watcher.dirs)
+        self.watcher = watcher
+        self.stop = stop
+
+    def wait(self, timeout: float) -> set[str]:
+        changed = self.watcher.wait(timeout)
+        if self.stop.is_set():
+            raise _Stop
+        return changed
+
+    def close(self) -> None:
+        self.watcher.close()
+
+
+@pytest.fixture
+def autoreloader(
+    monkeypatch: pytest.MonkeyPatch,
+) -> Iterator[Callable[..., threading.Thread]]:
+    """Start autoreloaders in threads that are stopped after the test.
+
+    Otherwise they would outlive the test and, as the directories are
+    relative, rebuild the sites of the following tests.
+
+    """
+    stop = threading.Event()
+    factory = watcher_factory
+    monkeypatch.setattr(
+        devserver,
+        "watcher_factory",
+        lambda *args: _StoppableWatcher(factory(*args), stop),
+    )
+
+    def run(*args: Any) -> None:
+        try:
+            devserver.autoreload(*args)
+        except _Stop:
+            pass
+
+    threads = []
+
+    def start(*args: Any) -> threading.Thread:
+        t = threading.Thread(target=run, args=args, daemon=True)
+        t.start()
+        threads.append(t)
+        return t
+
+    yield start
+    stop.set()
+    for t in threads:
+        t.join()
+
+
 def test_get_last_modified(cleandir: str) -> None:
     """Test get_last_modified."""
     # take initial time
@@ -28,19 +99,16 @@ def test_get_last_modified(cleandir: str) -> None:
     assert t2 == t3
 
 
-def test_autoreload_builds_immediately(args: Namespace) -> None:
+def test_autoreload_builds_immediately(
+    args: Namespace, autoreloader: Callable[..., threading.Thread]
+) -> None:
     """Test autoreload builds immediately."""
     # create a dummy file that can be build
     with open("content/test.md", "w") as fh:
         fh.write("boo")
 
-    t = threading.Thread(
-        target=devserver.autoreload,
-        args=(args, WAITTIME),
-        daemon=True,
-    )
     t0 = devserver.get_last_modified(["build"])
-    t.start()
+    autoreloader(args, WAITTIME)
     # try for 5 seconds...
     for i in range(5):
         time.sleep(WAITTIME)
@@ -51,14 +119,28 @@ def test_autoreload_builds_immediately(args: Namespace) -> None:
     assert t1 > t0
 
 
-def test_autoreload(args: Namespace) -> None:
+def test_autoreload_configures_logging(
+    args: Namespace,
+    autoreloader: Callable[..., threading.Thread],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test the autoreloader configures the logging of its process."""
+    calls: list[bool] = []
+    monkeypatch.setattr(devserver, "configure_logging", calls.append)
+    args.verbose = True
+    autoreloader(args, WAITTIME)
+    for i in range(5):
+        time.sleep(WAITTIME)
+        if calls:
+            break
+    assert calls == [True]
+
+
+def test_autoreload(
+    args: Namespace, autoreloader: Callable[..., threading.Thread]
+) -> None:
     """Test autoreload."""
-    t = threading.Thread(
-        target=devserver.autoreload,
-        args=(args, WAITTIME),
-        daemon=True,
-    )
-    t.start()
+    autoreloader(args, WAITTIME)
 
     t0 = devserver.get_last_modified(["build"])
 
@@ -75,14 +157,11 @@ def test_autoreload(args: Namespace) -> None:
     assert t1 > t0
 
 
-def test_autoreload_does_not_crash(args: Namespace) -> None:
+def test_autoreload_does_not_crash(
+    args: Namespace, autoreloader: Callable[..., threading.Thread]
+) -> None:
     """Test autoreload does not crash if build fails."""
-    t = threading.Thread(
-        target=devserver.autoreload,
-        args=(args, WAITTIME),
-        daemon=True,
-    )
-    t.start()
+    t = autoreloader(args, WAITTIME)
 
     t0 = devserver.get_last_modified(["build"])
 
@@ -97,3 +176,219 @@ def test_autoreload_does_not_crash(args: Namespace) -> None:
         if t1 > t0:
             break
     assert t.is_alive()
+
+
+def _serve(
+    livereload: devserver.LiveReload | None,
+) -> Iterator[HTTPConnection]:
+    """Start the devserver's web server and connect to it."""
+    os.makedirs("build/dir", exist_ok=True)
+    with open("build/index.html", "w") as fh:
+        fh.write("<html><body><p>index</p></body></html>")
+    with open("build/data.bin", "wb") as fh:
+        fh.write(bytes(range(256)) * 1024)
+    httpd = ThreadingHTTPServer(
+        ("127.0.0.1", 0),
+        partial(
+            devserver.RequestHandler, directory="build", livereload=livereload
+        ),
+    )
+    t = threading.Thread(target=httpd.serve_forever, daemon=True)
+    t.start()
+    conn = HTTPConnection("127.0.0.1", httpd.server_address[1])
+    yield conn
+    conn.close()
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def server(cleandir: str) -> Iterator[HTTPConnection]:
+    """Start the web server without live reload."""
+    yield from _serve(None)
+
+
+@pytest.fixture
+def livereload() -> devserver.LiveReload:
+    """Create a live reload channel."""
+    return devserver.LiveReload()
+
+
+@pytest.fixture
+def reload_server(
+    cleandir: str, livereload: devserver.LiveReload
+) -> Iterator[HTTPConnection]:
+    """Start the web server with live reload."""
+    yield from _serve(livereload)
+
+
+def get(
+    conn: HTTPConnection, path: str, **headers: str
+) -> tuple[int, dict[str, str], bytes]:
+    """Send a GET request on a kept alive connection."""
+    conn.request("GET", path, headers=headers)
+    response = conn.getresponse()
+    return response.status, dict(response.getheaders()), response.read()
+
+
+def test_server_conditional_requests(server: HTTPConnection) -> None:
+    """Test the server answers conditional requests."""
+    status, headers, body = get(server, "/")
+    assert status == 200
+    assert body == b"<html><body><p>index</p></body></html>"
+    etag = headers["ETag"]
+    last_modified = headers["Last-Modified"]
+    assert headers["Cache-Control"] == "no-cache"
+
+    status, _, body = get(server, "/index.html", **{"If-None-Match": etag})
+    assert status == 304
+    assert body == b""
+
+    status, _, _ = get(server, "/", **{"If-None-Match": '"other"'})
+    assert status == 200
+
+    status, _, _ = get(server, "/", **{"If-Modified-Since": last_modified})
+    assert status == 304
+
+    # the file changed
+    with open("build/index.html", "w") as fh:
+        fh.write("<p>changed</p>")
+    status, _, body = get(server, "/", **{"If-None-Match": etag})
+    assert status == 200
+    assert body == b"<p>changed</p>"
+
+
+def test_server_range_requests(server: HTTPConnection) -> None:
+    """Test the server answers range requests."""
+    with open("build/data.bin", "rb") as fh:
+        data = fh.read()
+
+    status, headers, body = get(server, "/data.bin")
+    assert status == 200
+    assert headers["Accept-Ranges"] == "bytes"
+    assert body == data
+
+    status, headers, body = get(server, "/data.bin", Range="bytes=10-19")
+    assert status == 206
+    assert headers["Content-Range"] == f"bytes 10-19/{len(data)}"
+    assert body == data[10:20]
+
+    status, _, body = get(server, "/data.bin", Range="bytes=-100")
+    assert status == 206
+    assert body == data[-100:]
+
+    status, _, body = get(server, "/data.bin", Range="bytes=1000-")
+    assert status == 206
+    assert body == data[1000:]
+
+    status, headers, _ = get(server, "/data.bin", Range=f"bytes={len(data)}-")
+    assert status == 416
+    assert headers["Content-Range"] == f"bytes */{len(data)}"
+
+    # If-Range with a stale ETag sends the whole file
+    status, _, body = get(
+        server, "/data.bin", Range="bytes=0-9", **{"If-Range": '"stale"'}
+    )
+    assert status == 200
+    assert body == data
+
+
+def test_server_directories(server: HTTPConnection) -> None:
+    """Test directories are redirected and listed."""
+    status, headers, _ = get(server, "/dir")
+    assert status == 301
+    assert headers["Location"] == "/dir/"
+    status, _, _ = get(server, "/dir/")
+    assert status == 200
+    status, _, _ = get(server, "/missing.html")
+    assert status == 404
+
+
+def test_parse_range() -> None:
+    """Test parse_range."""
+    assert devserver.parse_range(None, 100) is None
+    assert devserver.parse_range("bytes=0-9", 100) == (0, 10)
+    assert devserver.parse_range("bytes=90-200", 100) == (90, 10)
+    assert devserver.parse_range("bytes=-10", 100) == (90, 10)
+    assert devserver.parse_range("bytes=-200", 100) == (0, 100)
+    assert devserver.parse_range("bytes=100-", 100) == (0, 0)
+    # unsupported or malformed ranges are ignored
+    assert devserver.parse_range("bytes=0-1,5-6", 100) is None
+    assert devserver.parse_range("bytes=5-1", 100) is None
+    assert devserver.parse_range("bytes=a-b", 100) is None
+    assert devserver.parse_range("lines=1-2", 100) is None
+
+
+def test_server_livereload(
+    reload_server: HTTPConnection, livereload: devserver.LiveReload
+) -> None:
+    """Test the live reload script is injected and events are sent."""
+    status, headers, body = get(reload_server, "/")
+    assert status == 200
+    assert body == (
+        b"<html><body><p>index</p>"
+        + devserver.SCRIPT_TAG
+        + b"</body></html>"
+    )
+    assert headers["Content-Length"] == str(len(body))
+
+    # other files are not touched
+    status, _, body = get(reload_server, "/data.bin", Range="bytes=0-1")
+    assert status == 206
+    assert body == b"\x00\x01"
+
+    status, headers, body = get(reload_server, devserver.SCRIPT_PATH)
+    assert status == 200
+    assert headers["Content-type"] == "text/javascript"
+    assert devserver.EVENTS_PATH.encode() in body
+
+    reload_server.request("GET", devserver.EVENTS_PATH)
+    response = reload_server.getresponse()
+    assert response.status == 200
+    assert response.getheader("Content-type") == "text/event-stream"
+    # wait for the handler to connect
+    for i in range(50):
+        if livereload.clients:
+            break
+        time.sleep(WAITTIME)
+    livereload.broadcast(["index.html", "style.css"])
+    assert response.readline() == b'data: ["index.html", "style.css"]\n'
+    response.close()
+
+
+def test_inject_script() -> None:
+    """Test inject_script."""
+    tag = devserver.SCRIPT_TAG
+    html = devserver.inject_script(b"<BODY>x</BODY>")
+    assert html == b"<BODY>x" + tag + b"</BODY>"
+    assert devserver.inject_script(b"<p>x</p>") == b"<p>x</p>" + tag
+
+
+def test_autoreload_events(
+    args: Namespace, autoreloader: Callable[..., threading.Thread]
+) -> None:
+    """Test autoreload reports the written outputs."""
+    events: Queue[list[str]] = multiprocessing.Queue()
+    autoreloader(args, WAITTIME, events)
+    # the initial build
+    assert events.get(timeout=5) == ["*"]
+
+    # the sitemap is written as well, but no page embeds it
+    with open("content/test.md", "w") as fh:
+        fh.write("title: test\n\nboo")
+    assert events.get(timeout=5) == ["test.html"]
+
+
+def test_urls() -> None:
+    """Test the feed and the sitemaps do not cause reloads."""
+    assert devserver._urls(None) == ["*"]
+    written = {
+        "a.html",
+        "index.html",
+        "atom.xml",
+        "sitemap.xml",
+        "sitemap-2.xml",
+        os.path.join("images", "a.png"),
+    }
+    assert devserver._urls(written) == ["a.html", "images/a.png", "index.html"]
+    assert devserver._urls({"atom.xml", "sitemap.xml"}) == []
@@ -0,0 +1,61 @@
+"""Tests for the feed module."""
+
+from datetime import datetime, timezone
+from io import StringIO
+from typing import Any
+
+import feedgenerator
+
+from blag.feed import StreamingAtomFeed
+
+
+def test_streaming_atom_feed() -> None:
+    """Test the streamed feed equals feedgenerator's."""
+    items: list[dict[str, Any]] = [
+        dict(
+            title=f"title{i}",
+            link=f"https://example.com/{i}.html",
+            description="<b>description</b>",
+            content=f"<p>content{i}</p>",
+            pubdate=datetime(2020, 1, i, tzinfo=timezone.utc),
+        )
+        for i in (3, 1, 2)
+    ]
+    kwargs = dict(link="https://example.com/", title="t", description="d")
+
+    expected = feedgenerator.Atom1Feed(**kwargs)
+    for item in items:
+        expected.add_item(**item)
+    feed = StreamingAtomFeed(
+        iter(items), datetime(2020, 1, 3, tzinfo=timezone.utc), **kwargs
+    )
+    out = StringIO()
+    feed.write(out, "utf-8")
+    assert out.getvalue() == expected.writeString("utf-8")
+    # the entries are not kept
+    assert feed.items == []
+
+
+def test_streaming_atom_feed_empty() -> None:
+    """Test an empty feed is updated now."""
+    feed = StreamingAtomFeed([], link="l", title="t", description="d")
+    assert "<updated>" in feed.writeString("utf-8")
+    assert "<entry>" not in feed.writeString("utf-8")
+
+
+def test_streaming_atom_feed_serialized() -> None:
+    """Test serialized entries are written as they are."""
+    item: dict[str, Any] = dict(
+        title="title",
+        link="https://example.com/1.html",
+        description="description",
+        content="<p>content</p>",
+        pubdate=datetime(2020, 1, 1, tzinfo=timezone.utc),
+    )
+    kwargs = dict(link="https://example.com/", title="t", description="d")
+    expected = StreamingAtomFeed([item], item["pubdate"], **kwargs)
+    entry = expected.serialize(item)
+    assert entry.startswith("<entry>") and entry.endswith("</entry>")
+
+    feed = StreamingAtomFeed([entry], item["pubdate"], **kwargs)
+    assert feed.writeString("utf-8") == expected.writeString("utf-8")
@@ -0,0 +1,109 @@
+"""Tests for the index module."""
+
+import json
+import os
+from argparse import Namespace
+from datetime import datetime, timezone
+from typing import Any
+
+import pytest
+from pytest import CaptureFixture
+
+from blag import blag, index
+
+
+def article(
+    title: str, day: int, tags: list[str] | None = None
+) -> dict[str, Any]:
+    """Create the context of an article."""
+    return dict(
+        title=title,
+        date=datetime(2020, 1, day, tzinfo=timezone.utc),
+        tags=tags or [],
+        content=f"<p>{title}</p>",
+        author="me",
+    )
+
+
+def test_article_index(cleandir: str) -> None:
+    """Test the index is updated incrementally and can be queried."""
+    articles = [
+        ("c.html", article("c", 3, ["foo"])),
+        ("b.html", article("b", 2, ["foo", "bar"])),
+        ("a.html", article("a", 1)),
+    ]
+    hashes = {"a.html": "1", "b.html": "1", "c.html": "1"}
+    idx = index.ArticleIndex("build")
+    assert idx.update(articles, hashes) == 3
+    assert idx.update(articles, hashes) == 0
+
+    assert [a["dst"] for a in idx.articles()] == ["c.html", "b.html", "a.html"]
+    assert [a["dst"] for a in idx.articles(limit=1)] == ["c.html"]
+    assert [a["dst"] for a in idx.articles("foo")] == ["c.html", "b.html"]
+    assert idx.articles("bar")[0] == dict(
+        dst="b.html",
+        title="b",
+        description=None,
+        date="2020-01-02T00:00:00+00:00",
+        tags=["foo", "bar"],
+        meta=dict(title="b", date="2020-01-02 00:00:00+00:00", author="me"),
+    )
+    assert idx.tags() == [("foo", 2), ("bar", 1)]
+    idx.close()
+
+    # changed and removed articles
+    articles = [
+        ("c.html", article("c2", 3)),
+        ("b.html", article("b", 2, ["foo", "bar"])),
+    ]
+    idx = index.ArticleIndex("build")
+    assert idx.update(articles, dict(hashes, **{"c.html": "2"})) == 2
+    assert [a["title"] for a in idx.articles()] == ["c2", "b"]
+    assert idx.tags() == [("bar", 1), ("foo", 1)]
+    idx.close()
+
+
+def test_article_index_hard_link(cleandir: str) -> None:
+    """Test a hard linked index is copied before it is modified."""
+    idx = index.ArticleIndex("build")
+    idx.update([("a.html", article("a", 1))], {"a.html": "1"})
+    idx.close()
+    os.mkdir("staging")
+    os.link(f"build/{index.INDEX_FILE}", f"staging/{index.INDEX_FILE}")
+
+    idx = index.ArticleIndex("staging")
+    idx.update([], {})
+    idx.close()
+    assert os.stat(f"build/{index.INDEX_FILE}").st_nlink == 1
+    idx = index.ArticleIndex("build")
+    assert len(idx.articles()) == 1
+    idx.close()
+
+
+def test_query_command(args: Namespace, capsys: CaptureFixture[str]) -> None:
+    """Test the query command."""
+    query = blag.parse_args(["query"])
+    assert query.output_dir == "build"
+    assert query.tag is None
+    assert query.limit is None
+    with pytest.raises(SystemExit):
+        index.query_command(query)
+
+    for name, tags in ("a", "foo, bar"), ("b", "foo"):
+        with open(f"{args.input_dir}/{name}.md", "w") as fh:
+            fh.write(f"title: {name}\ndate: 2030-01-01\ntags: {tags}\n\nx")
+    blag.build(args)
+    capsys.readouterr()
+
+    index.query_command(blag.parse_args(["query", "--tag", "bar"]))
+    date, dst, title = capsys.readouterr().out.strip().split("\t")
+    assert (dst, title) == ("a.html", "a")
+    assert date.startswith("2030-01-01T00:00:00")
+
+    index.query_command(blag.parse_args(["query", "-n", "2", "--json"]))
+    result = json.loads(capsys.readouterr().out)
+    assert len(result) == 2
+    assert {a["dst"] for a in result} == {"a.html", "b.html"}
+
+    index.query_command(blag.parse_args(["query", "--tags", "--json"]))
+    assert json.loads(capsys.readouterr().out)["foo"] == 2
@@ -0,0 +1,191 @@
+"""Tests for the manifest module."""
+
+import os
+from datetime import datetime
+
+from blag.manifest import (
+    Manifest,
+    deserialize_context,
+    digest,
+    serialize_context,
+)
+
+FINGERPRINTS = dict(blag="1", markdown="1", site="1")
+TEMPLATES = {"page.html": "1", "article.html": "1"}
+
+
+def test_digest() -> None:
+    """Test digest."""
+    assert digest("foo") == digest(b"foo")
+    assert digest("foo") != digest("bar")
+
+
+def test_serialize_context() -> None:
+    """Test serialize_context round trips the date."""
+    context = dict(
+        title="title",
+        content="content",
+        tags=["foo", "bar"],
+        date=datetime(2020, 1, 1, 12, 10).astimezone(),
+    )
+    serialized = serialize_context(context)
+    assert isinstance(serialized["date"], str)
+    assert deserialize_context(serialized) == context
+
+
+def test_manifest_roundtrip(cleandir: str) -> None:
+    """Test a recorded source can be looked up after saving."""
+    manifest = Manifest.load("build", FINGERPRINTS, TEMPLATES)
+    assert manifest.lookup("foo.md", "foo.html", "hash") is None
+    assert manifest.template_changed("page.html")
+
+    manifest.record(
+        "foo.md", "foo.html", "hash", dict(content="foo", title="foo")
+    )
+    manifest.save()
+
+    # the content is not recorded
+    with open(manifest.path) as fh:
+        assert '"content"' not in fh.read()
+    manifest = Manifest.load("build", FINGERPRINTS, TEMPLATES)
+    assert manifest.lookup("foo.md", "foo.html", "hash") == dict(title="foo")
+    assert manifest.lookup("foo.md", "foo.html", "hash2") is None
+    assert manifest.lookup("foo.md", "bar.html", "hash") is None
+    assert not manifest.template_changed("page.html")
+    # the output is missing
+    assert manifest.needs_render("foo.html", "page.html")
+
+
+def test_manifest_fingerprints(cleandir: str) -> None:
+    """Test changed fingerprints invalidate the manifest."""
+    manifest = Manifest.load("build", FINGERPRINTS, TEMPLATES)
+    manifest.record("foo.md", "foo.html", "hash", dict(content="foo"))
+    manifest.save()
+
+    # changed templates require rendering, but not converting
+    manifest = Manifest.load(
+        "build", FINGERPRINTS, TEMPLATES | {"page.html": "2"}
+    )
+    assert manifest.lookup("foo.md", "foo.html", "hash") is not None
+    assert manifest.template_changed("page.html")
+    assert not manifest.template_changed("article.html")
+    assert not manifest.template_changed()
+
+    # changed site configuration requires rendering everything
+    manifest = Manifest.load("build", FINGERPRINTS | dict(site="2"), TEMPLATES)
+    assert manifest.template_changed("article.html")
+    assert manifest.template_changed()
+
+    # changed markdown configuration requires converting and rendering
+    # everything, including the listings
+    manifest = Manifest.load("build", FINGERPRINTS | dict(markdown="2"))
+    assert manifest.lookup("foo.md", "foo.html", "hash") is None
+    assert manifest.template_changed()
+    manifest = Manifest.load("build", FINGERPRINTS | dict(blag="2"))
+    assert manifest.template_changed()
+
+
+def test_manifest_settle(cleandir: str) -> None:
+    """Test nothing needs to be rendered again once the build is done."""
+    manifest = Manifest.load("build", FINGERPRINTS, TEMPLATES)
+    assert manifest.template_changed("page.html")
+    manifest.settle()
+    assert not manifest.template_changed("page.html")
+    assert not manifest.template_changed()
+    manifest.templates = TEMPLATES | {"page.html": "2"}
+    assert manifest.template_changed("page.html")
+
+def test_manifest_corrupt(cleandir: str) -> None:
+    """Test a corrupt manifest is ignored."""
+    manifest = Manifest.load("build", FINGERPRINTS)
+    with open(manifest.path, "w") as fh:
+        fh.write("garbage")
+    manifest = Manifest.load("build", FINGERPRINTS)
+    assert manifest.previous == {}
+
+
+def test_manifest_remove_stale(cleandir: str) -> None:
+    """Test outputs of deleted sources are removed."""
+    manifest = Manifest.load("build", FINGERPRINTS)
+    manifest.record("foo.md", "foo.html", "hash", dict(content="foo"))
+    manifest.save()
+    with open("build/foo.html", "w") as fh:
+        fh.write("foo")
+
+    manifest = Manifest.load("build", FINGERPRINTS)
+    manifest.remove_stale()
+    assert not os.path.exists("build/foo.html")
+
+
+def test_manifest_renew(cleandir: str) -> None:
+    """Test the next build can start from a manifest in memory."""
+    manifest = Manifest.load("build", FINGERPRINTS, TEMPLATES)
+    manifest.record("foo.md", "foo.html", "hash", dict(content="foo"))
+    manifest.record("bar.md", "bar.html", "hash", dict(content="bar"))
+    manifest.save()
+    manifest.forget("bar.md")
+    manifest.invalidate()
+    assert not os.path.exists(manifest.path)
+
+    manifest = manifest.renew(FINGERPRINTS, TEMPLATES)
+    assert manifest.sources == {}
+    assert manifest.lookup("foo.md", "foo.html", "hash") == {}
+    assert manifest.lookup("bar.md", "bar.html", "hash") is None
+
+
+def test_manifest_page_changed(cleandir: str) -> None:
+    """Test listing pages are only rendered if they changed."""
+    Manifest("build", FINGERPRINTS, TEMPLATES).save()
+    manifest = Manifest.load("build", FINGERPRINTS, TEMPLATES)
+    manifest.record("foo.md", "foo.html", "hash", dict(content="foo"))
+    manifest.articles_changed([("foo.html", {})])
+    assert manifest.page_changed("archive.html", [("foo.html", {})], 1, None)
+    with open("build/archive.html", "w") as fh:
+        fh.write("archive")
+    assert not manifest.page_changed(
+        "archive.html", [("foo.html", {})], 1, None
+    )
+    assert manifest.page_changed("archive.html", [("foo.html", {})], 2, None)
+    manifest.save()
+
+    # the digests survive the build, the article changed
+    manifest = Manifest.load("build", FINGERPRINTS, TEMPLATES)
+    manifest.record("foo.md", "foo.html", "hash2", dict(content="foo"))
+    manifest.articles_changed([("foo.html", {})])
+    assert manifest.page_changed("archive.html", [("foo.html", {})], 2, None)
+    manifest.forget_page("archive.html")
+    assert manifest.pages == {}
+
+
+def test_manifest_update_tags(cleandir: str) -> None:
+    """Test the tag index is kept between builds."""
+    manifest = Manifest.load("build", FINGERPRINTS, TEMPLATES)
+    assert manifest.update_tags(dict(foo=["a.html"], bar=["a.html"])) == set()
+    manifest.save()
+
+    manifest = Manifest.load("build", FINGERPRINTS, TEMPLATES)
+    assert manifest.tags == dict(foo=["a.html"], bar=["a.html"])
+    assert manifest.update_tags(dict(foo=["a.html"])) == {"bar"}
+    assert manifest.renew(FINGERPRINTS, TEMPLATES).tags == dict(
+        foo=["a.html"]
+    )
+
+
+def test_manifest_lastmod(cleandir: str) -> None:
+    """Test the lastmod only changes with the source's content."""
+    manifest = Manifest.load("build", FINGERPRINTS, TEMPLATES)
+    manifest.record("foo.md", "foo.html", "hash", dict(content="foo"), 1.0)
+    manifest.record("bar.md", "bar.html", "hash", dict(content="bar"))
+    assert manifest.lastmod() == {"foo.html": 1.0}
+    manifest.save()
+
+    # touched
+    manifest = Manifest.load("build", FINGERPRINTS, TEMPLATES)
+    manifest.record("foo.md", "foo.html", "hash", dict(content="foo"), 2.0)
+    manifest.record("bar.md", "bar.html", "hash", dict(content="bar"), 2.0)
+    assert manifest.lastmod() == {"foo.html": 1.0, "bar.html": 2.0}
+
+    # changed
+    manifest = manifest.renew(FINGERPRINTS, TEMPLATES)
+    manifest.record("foo.md", "foo.html", "hash2", dict(content="foo"), 3.0)
+    assert manifest.lastmod() == {"foo.html": 3.0}
@@ -1,12 +1,20 @@
 """Test markdown module."""
 
+from collections.abc import Iterator
 from datetime import datetime
 from typing import Any
 
 import markdown
+import pygments.lexers
 import pytest
 
-from blag.markdown import convert_markdown, markdown_factory
+from blag import markdown as blag_markdown
+from blag.cache import Cache
+from blag.markdown import (
+    convert_markdown,
+    markdown_factory,
+    memoize_highlighting,
+)
 
 
 @pytest.mark.parametrize(
@@ -125,3 +133,63 @@ this is a footnote[^1]
     assert "<hr>" in html
     assert "<ol>" in html
     assert "footnotetext" in html
+
+
+CODE = """
+```python
+import os
+print(os.getcwd())
+```
+
+```
+#!/bin/sh
+echo "no language"
+```
+"""
+
+
+@pytest.fixture
+def highlight_cache(cleandir: str) -> Iterator[Cache]:
+    """Memoize highlighting in a cache."""
+    cache = Cache(".blag-cache")
+    memoize_highlighting(cache)
+    yield cache
+    memoize_highlighting(None)
+
+
+def test_memoize_highlighting(highlight_cache: Cache) -> None:
+    """Test memoized highlighting does not change the output."""
+    md = markdown_factory()
+    html, _ = convert_markdown(md, CODE)
+
+    stats = highlight_cache.stats()
+    assert stats["highlight"][0] == 2
+    assert stats["lexer"][0] == 1
+
+    # from the cache
+    html2, _ = convert_markdown(md, CODE)
+    assert html == html2
+
+    # without memoizing
+    memoize_highlighting(None)
+    html3, _ = convert_markdown(md, CODE)
+    assert html == html3
+
+
+def test_memoize_highlighting_guess_once(
+    highlight_cache: Cache, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test guessing the language happens only once per code block."""
+    monkeypatch.setattr(blag_markdown, "_guessed_lexers", {})
+    md = markdown_factory()
+    html, _ = convert_markdown(md, CODE)
+
+    def fail(*args: Any, **kwargs: Any) -> None:
+        raise AssertionError("guess_lexer called")
+
+    monkeypatch.setattr(pygments.lexers, "guess_lexer", fail)
+    # also forget the guesses of this process, so the persistent cache is
+    # used
+    monkeypatch.setattr(blag_markdown, "_guessed_lexers", {})
+    html2, _ = convert_markdown(md, CODE)
+    assert html == html2
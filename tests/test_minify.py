@@ -0,0 +1,100 @@
+"""Tests for the minify module."""
+
+import pytest
+
+from blag import minify
+from blag.cache import Cache
+
+
+def test_minify_html() -> None:
+    """Test comments and whitespace are removed."""
+    html = (
+        "<!DOCTYPE html>\n<html>\n  <head>\n"
+        '    <meta charset="utf-8">\n    <title>Foo</title>\n  </head>\n'
+        "  <body>\n    <!-- a comment -->\n"
+        "    <p>Some   <em>emphasized</em>\n    text</p>\n  </body>\n"
+        "</html>\n"
+    )
+    assert minify.minify_html(html) == (
+        '<!DOCTYPE html><html><head><meta charset="utf-8"><title>Foo</title>'
+        "</head><body><p>Some <em>emphasized</em> text</p></body></html>"
+    )
+
+
+def test_minify_html_preserves_pre() -> None:
+    """Test code blocks are kept as they are."""
+    pre = (
+        '<div class="codehilite"><pre><span></span><code>'
+        '<span class="k">def</span>  <span class="nf">f</span>():\n'
+        "    <span>return</span>  1  <!-- not a comment -->\n\n"
+        "</code></pre></div>"
+    )
+    html = f"<body>\n  <p>code:</p>\n  {pre}\n</body>"
+    assert minify.minify_html(html) == f"<body><p>code:</p> {pre}</body>"
+
+    for name in "textarea", "script", "style":
+        raw = f"<{name}>  a\n\n  b  </{name}>"
+        assert minify.minify_html(f"<p>  {raw}  </p>") == f"<p> {raw} </p>"
+
+
+def test_minify_html_keeps() -> None:
+    """Test what is kept."""
+    # conditional comments, their content is minified
+    html = "<p><!--[if IE]>  ie  <![endif]--></p>"
+    assert minify.minify_html(html) == "<p><!--[if IE]> ie <![endif]--></p>"
+    # non-breaking spaces
+    assert minify.minify_html("<p>\xa0a\xa0</p>") == "<p>\xa0a\xa0</p>"
+    # tags and attribute values, also with ">"
+    html = '<a  title="a > b\n  c"   href=\'x\'>link</a>'
+    assert minify.minify_html(html) == html
+    # whitespace between inline elements
+    html = "<p><em>a</em> <strong>b</strong></p>"
+    assert minify.minify_html(html) == html
+    # text around removed comments
+    assert minify.minify_html("<p>a <!-- x --> b</p>") == "<p>a b</p>"
+
+
+def test_minify_css() -> None:
+    """Test CSS minification."""
+    css = (
+        "/* a comment */\n"
+        "body > p,\nh1 {\n  color: red;\n  margin: 0 auto;\n}\n\n"
+        'a::after { content: "  ;}  /* x */  "; }\n'
+    )
+    assert minify.minify_css(css) == (
+        "body>p,h1{color:red;margin:0 auto}"
+        'a::after{content:"  ;}  /* x */  "}'
+    )
+
+
+def test_minifier(cleandir: str, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test the results are cached."""
+    calls = []
+
+    def minify_html(html: str) -> str:
+        calls.append(html)
+        return html.strip()
+
+    monkeypatch.setattr(minify, "minify_html", minify_html)
+    minifier = minify.Minifier(Cache(".blag-cache"))
+    assert minifier.html(" <p>a</p> ") == "<p>a</p>"
+    assert minifier.html(" <p>a</p> ") == "<p>a</p>"
+    assert calls == [" <p>a</p> "]
+
+    # a new minifier uses the persisted cache
+    minifier = minify.Minifier(Cache(".blag-cache"))
+    assert minifier.html(" <p>a</p> ") == "<p>a</p>"
+    assert minifier.html(" <p>b</p> ") == "<p>b</p>"
+    assert len(calls) == 2
+
+    # without cache
+    minifier = minify.Minifier()
+    assert minifier.html(" <p>a</p> ") == "<p>a</p>"
+    assert len(calls) == 3
+
+
+def test_minifier_transforms() -> None:
+    """Test the transformations of copied files."""
+    transforms = minify.Minifier().transforms()
+    assert set(transforms) == {".css"}
+    assert transforms[".css"](b"p {\n  color: red;\n}\n") == b"p{color:red}"
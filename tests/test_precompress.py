@@ -0,0 +1,85 @@
+"""Tests for the precompress module."""
+
+import gzip
+import os
+import time
+
+import pytest
+
+from blag import precompress
+from blag.sync import write_file
+
+
+def test_gzip_compress() -> None:
+    """Test gzip compression is deterministic."""
+    data = b"<p>hello</p>" * 100
+    compressed = precompress.gzip_compress(data)
+    assert gzip.decompress(compressed) == data
+    time.sleep(0.01)
+    assert precompress.gzip_compress(data) == compressed
+
+
+def test_zstd_compressor() -> None:
+    """Test the zstd compressor, if available."""
+    compress = precompress.zstd_compressor()
+    if compress is None:
+        pytest.skip("zstd is not available")
+    data = b"<p>hello</p>" * 100
+    compressed = compress(data)
+    assert compressed.startswith(b"\x28\xb5\x2f\xfd")
+    assert len(compressed) < len(data)
+
+
+def test_precompress(cleandir: str, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test only changed files are compressed."""
+    # a fake zstd, so the test does not depend on it
+    monkeypatch.setattr(
+        precompress, "zstd_compressor", lambda: lambda data: data[::-1]
+    )
+    os.makedirs("out/sub")
+    for path in "index.html", "atom.xml", "sub/style.css", "sub/app.js":
+        write_file(f"out/{path}", f"<{path}>")
+    write_file("out/image.png", b"png")
+
+    assert precompress.precompress("out") == (4, 0)
+    with gzip.open("out/sub/style.css.gz") as fh:
+        assert fh.read() == b"<sub/style.css>"
+    with open("out/sub/style.css.zst", "rb") as fh:
+        assert fh.read() == b">ssc.elyts/bus<"
+    stat = os.stat("out/index.html")
+    assert os.stat("out/index.html.gz").st_mtime_ns == stat.st_mtime_ns
+    assert not os.path.exists("out/image.png.gz")
+
+    # unchanged files are skipped
+    assert precompress.precompress("out") == (0, 4)
+    assert not write_file("out/index.html", "<index.html>")
+    assert precompress.precompress("out") == (0, 4)
+
+    # changed files are compressed again
+    time.sleep(0.01)
+    assert write_file("out/index.html", "<new>")
+    assert precompress.precompress("out", workers=2) == (1, 3)
+    with gzip.open("out/index.html.gz") as fh:
+        assert fh.read() == b"<new>"
+
+    # sidecars of removed files and unavailable compressors are removed
+    os.remove("out/atom.xml")
+    monkeypatch.setattr(precompress, "zstd_compressor", lambda: None)
+    assert precompress.precompress("out") == (0, 3)
+    assert not os.path.exists("out/atom.xml.gz")
+    assert not os.path.exists("out/index.html.zst")
+    assert os.path.exists("out/index.html.gz")
+
+
+def test_precompress_hard_links(cleandir: str) -> None:
+    """Test sidecars are replaced, not rewritten."""
+    os.mkdir("out")
+    write_file("out/index.html", "<p>old</p>")
+    precompress.precompress("out")
+    os.link("out/index.html.gz", "linked.gz")
+
+    time.sleep(0.01)
+    write_file("out/index.html", "<p>new</p>")
+    precompress.precompress("out")
+    with gzip.open("linked.gz") as fh:
+        assert fh.read() == b"<p>old</p>"
@@ -0,0 +1,59 @@
+"""Tests for the profiling module."""
+
+import json
+
+from blag.profiling import BuildProfile
+
+
+def test_build_profile() -> None:
+    """Test recording and reporting metrics."""
+    profile = BuildProfile()
+    profile.stages.update(walk=0.5, markdown=1.5)
+    profile.count("sources", 3)
+    profile.add_file("a.html", 0.2, 0.1, True)
+    profile.add_file("b.html", None, 0.4, False)
+    profile.add_file("c.html", 0.01, 0.01, True)
+    profile.count("static_copied", 2)
+
+    assert profile.counters == dict(
+        sources=3,
+        rendered=3,
+        converted=2,
+        written=2,
+        unchanged=1,
+        static_copied=2,
+    )
+    assert profile.slowest(2) == [
+        ("b.html", 0.0, 0.4),
+        ("a.html", 0.2, 0.1),
+    ]
+
+    metrics = profile.metrics(1)
+    assert metrics["total"] == 2.0
+    assert metrics["slowest"] == [
+        dict(dst="b.html", convert=0.0, render=0.4)
+    ]
+    assert json.loads(json.dumps(metrics)) == metrics
+
+    report = profile.report()
+    assert "markdown" in report
+    assert "2.000s" in report
+    assert report.index("b.html") < report.index("a.html")
+    assert (
+        "Markdown: 3 files, 2 converted, 3 rendered, 2 written, 1 unchanged"
+        in report
+    )
+    assert "Static files: 2 copied, 0 up to date" in report
+    assert "Precompressed" not in report
+    profile.count("precompressed", 4)
+    assert "Precompressed: 4 files, 0 up to date" in profile.report()
+    assert "Assets" not in profile.report()
+    profile.count("assets_hashed", 2)
+    assert "Assets: 2 hashed, 0 up to date" in profile.report()
+
+
+def test_build_profile_empty() -> None:
+    """Test the report of a build without files."""
+    report = BuildProfile().report()
+    assert "Slowest files" not in report
+    assert "total" in report
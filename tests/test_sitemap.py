@@ -0,0 +1,45 @@
+"""Tests for the sitemap module."""
+
+import io
+
+from blag import sitemap
+
+
+def test_format_lastmod() -> None:
+    """Test timestamps are formatted as W3C datetime."""
+    assert sitemap.format_lastmod(0) == "1970-01-01T00:00:00+00:00"
+    assert sitemap.format_lastmod(86400.5) == "1970-01-02T00:00:00+00:00"
+
+
+def test_write_urlset() -> None:
+    """Test writing a sitemap."""
+    fh = io.StringIO()
+    sitemap.write_urlset(
+        fh,
+        [
+            ("https://example.com/a.html", 0.0),
+            ("https://example.com/b.html?x=1&y=2", None),
+        ],
+    )
+    assert fh.getvalue() == (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+        "<url><loc>https://example.com/a.html</loc>"
+        "<lastmod>1970-01-01T00:00:00+00:00</lastmod></url>\n"
+        "<url><loc>https://example.com/b.html?x=1&amp;y=2</loc></url>\n"
+        "</urlset>\n"
+    )
+
+
+def test_write_index() -> None:
+    """Test writing a sitemap index."""
+    fh = io.StringIO()
+    sitemap.write_index(fh, [("https://example.com/sitemap-1.xml", 0.0)])
+    assert fh.getvalue() == (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+        "<sitemap><loc>https://example.com/sitemap-1.xml</loc>"
+        "<lastmod>1970-01-01T00:00:00+00:00</lastmod></sitemap>\n"
+        "</sitemapindex>\n"
+    )
+    assert sitemap.shard_name(2) == "sitemap-2.xml"
@@ -0,0 +1,209 @@
+"""Tests for the sync module."""
+
+import os
+from collections.abc import Iterator
+
+import pytest
+
+from blag import sync
+
+
+def write(path: str, content: str, mtime: int | None = None) -> None:
+    """Write content to path and optionally set its modification time."""
+    with open(path, "w") as fh:
+        fh.write(content)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+def test_is_up_to_date(cleandir: str) -> None:
+    """Test is_up_to_date."""
+    write("src", "foo", 1000)
+    assert not sync.is_up_to_date("src", "dst")
+
+    write("dst", "foo", 1000)
+    assert sync.is_up_to_date("src", "dst")
+
+    # different modification time
+    write("dst", "foo", 2000)
+    assert not sync.is_up_to_date("src", "dst")
+    assert sync.is_up_to_date("src", "dst", checksum=True)
+
+    # same size and time, different content
+    write("dst", "bar", 1000)
+    assert sync.is_up_to_date("src", "dst")
+    assert not sync.is_up_to_date("src", "dst", checksum=True)
+
+    # different size
+    write("dst", "foobar", 1000)
+    assert not sync.is_up_to_date("src", "dst")
+
+
+@pytest.mark.parametrize("strategy", sync.STRATEGIES)
+def test_copy_file(cleandir: str, strategy: str) -> None:
+    """Test copy_file with all strategies."""
+    write("src", "foo", 1000)
+    write("dst", "old")
+    sync.copy_file("src", "dst", strategy)
+    with open("dst") as fh:
+        assert fh.read() == "foo"
+    assert os.stat("dst").st_mtime == 1000
+    assert sync.is_up_to_date("src", "dst")
+    # no temporary files are left behind
+    assert sorted(os.listdir(".")) == sorted(
+        ["build", "config.ini", "content", "dst", "src", "static", "templates"]
+    )
+
+
+def test_copy_file_does_not_touch_hardlinked_source(cleandir: str) -> None:
+    """Test copying over a hard link does not modify its source."""
+    write("src", "foo", 1000)
+    sync.copy_file("src", "dst", "hardlink")
+    assert os.path.samefile("src", "dst")
+
+    write("src2", "bar", 1000)
+    sync.copy_file("src2", "dst", "copy")
+    with open("src") as fh:
+        assert fh.read() == "foo"
+    with open("dst") as fh:
+        assert fh.read() == "bar"
+
+
+def test_sync_file(cleandir: str) -> None:
+    """Test sync_file only copies changed files."""
+    write("src", "foo", 1000)
+    assert sync.sync_file("src", "dst")
+    assert not sync.sync_file("src", "dst")
+
+    write("src", "bar", 2000)
+    assert sync.sync_file("src", "dst")
+    with open("dst") as fh:
+        assert fh.read() == "bar"
+
+
+def test_sync_tree(cleandir: str) -> None:
+    """Test sync_tree."""
+    os.makedirs("src/a/b")
+    write("src/foo", "foo")
+    write("src/a/b/bar", "bar")
+
+    assert sync.sync_tree("src", "dst") == (2, 0)
+    assert os.path.exists("dst/foo")
+    assert os.path.exists("dst/a/b/bar")
+    assert sync.sync_tree("src", "dst") == (0, 2)
+
+    write("src/foo", "foo2")
+    assert sync.sync_tree("src", "dst", checksum=True) == (1, 1)
+
+
+def test_sync_file_transform(cleandir: str) -> None:
+    """Test sync_file writes the transformed content if it changed."""
+    write("src", "foo", 1000)
+    assert sync.sync_file("src", "dst", transform=bytes.upper)
+    with open("dst") as fh:
+        assert fh.read() == "FOO"
+    assert not sync.sync_file("src", "dst", transform=bytes.upper)
+
+    write("src", "bar", 2000)
+    assert sync.sync_file("src", "dst", transform=bytes.upper)
+    with open("dst") as fh:
+        assert fh.read() == "BAR"
+
+
+def test_sync_tree_transforms(cleandir: str) -> None:
+    """Test sync_tree transforms files by extension."""
+    os.makedirs("src")
+    write("src/foo.css", "foo")
+    write("src/bar.txt", "bar")
+
+    transforms = {".css": bytes.upper}
+    assert sync.sync_tree("src", "dst", transforms=transforms) == (2, 0)
+    with open("dst/foo.css") as fh:
+        assert fh.read() == "FOO"
+    with open("dst/bar.txt") as fh:
+        assert fh.read() == "bar"
+    assert sync.sync_tree("src", "dst", transforms=transforms) == (0, 2)
+
+
+def test_write_file(cleandir: str) -> None:
+    """Test write_file only writes changed contents."""
+    assert sync.write_file("out", "foo")
+    with open("out") as fh:
+        assert fh.read() == "foo"
+    assert os.stat("out").st_mode & 0o777 == sync.FILE_MODE
+    os.utime("out", (1000, 1000))
+
+    assert not sync.write_file("out", b"foo")
+    assert os.stat("out").st_mtime == 1000
+
+    # the file is replaced, not modified
+    os.link("out", "link")
+    assert sync.write_file("out", "bar")
+    with open("link") as fh:
+        assert fh.read() == "foo"
+    with open("out") as fh:
+        assert fh.read() == "bar"
+    assert not [f for f in os.listdir() if f.startswith("tmp")]
+
+
+def test_stage_and_swap(cleandir: str) -> None:
+    """Test building into a staging directory."""
+    os.makedirs("out/sub")
+    write("out/sub/a", "a")
+    staging = sync.stage("out")
+    assert staging == "out.staging"
+    assert os.path.samefile("out/sub/a", "out.staging/sub/a")
+
+    sync.write_file("out.staging/sub/a", "b")
+    sync.write_file("out.staging/c", "c")
+    with open("out/sub/a") as fh:
+        assert fh.read() == "a"
+    assert not os.path.exists("out/c")
+
+    sync.swap(staging, "out")
+    assert not os.path.exists("out.staging")
+    with open("out/sub/a") as fh:
+        assert fh.read() == "b"
+    assert os.path.exists("out/c")
+
+    # no output directory yet
+    staging = sync.stage("new")
+    sync.swap(staging, "new")
+    assert os.path.isdir("new")
+    assert not os.path.exists("new.staging")
+
+
+def test_write_stream(cleandir: str) -> None:
+    """Test write_stream only writes changed contents."""
+    assert sync.write_stream("out", (c for c in ["fo", "o", "ä"]))
+    with open("out", encoding="utf-8") as fh:
+        assert fh.read() == "fooä"
+    assert os.stat("out").st_mode & 0o777 == sync.FILE_MODE
+    os.utime("out", (1000, 1000))
+
+    assert not sync.write_stream("out", ["foo", "ä"])
+    assert os.stat("out").st_mtime == 1000
+    assert sync.write_stream("out", ["foo", "ö"])
+    with open("out", encoding="utf-8") as fh:
+        assert fh.read() == "fooö"
+
+    # a failing generator leaves the file alone
+    def fail() -> Iterator[str]:
+        yield "bar"
+        raise ValueError
+
+    with pytest.raises(ValueError):
+        sync.write_stream("out", fail())
+    with open("out", encoding="utf-8") as fh:
+        assert fh.read() == "fooö"
+    assert not [f for f in os.listdir() if f.startswith("tmp")]
+
+
+def test_write_with(cleandir: str) -> None:
+    """Test write_with only writes changed contents."""
+    assert sync.write_with("out", lambda fh: fh.write("fooä"))
+    with open("out", encoding="utf-8") as fh:
+        assert fh.read() == "fooä"
+    os.utime("out", (1000, 1000))
+    assert not sync.write_with("out", lambda fh: fh.write("fooä"))
+    assert os.stat("out").st_mtime == 1000
@@ -0,0 +1,60 @@
+"""Tests for the theme module."""
+
+import os
+import pickle
+from argparse import Namespace
+
+from jinja2 import FileSystemLoader
+
+from blag import blag, theme
+from blag.dependencies import template_fingerprints
+
+
+def test_bytecode_cache(cleandir: str) -> None:
+    """Test compiled templates are cached."""
+    env = blag.environment_factory("templates", cache_dir=".blag-cache")
+    env.get_template("page.html").render(site=dict(title="t"))
+    cached = os.listdir(".blag-cache/jinja")
+    # page.html and base.html
+    assert len(cached) == 2
+
+    env = blag.environment_factory("templates", cache_dir=".blag-cache")
+    env.get_template("page.html")
+    assert sorted(os.listdir(".blag-cache/jinja")) == sorted(cached)
+
+
+def test_compile_theme(cleandir: str) -> None:
+    """Test precompiled themes can be loaded."""
+    theme.compile_theme("templates", "theme.zip")
+    assert isinstance(theme.loader_factory("templates"), FileSystemLoader)
+    loader = theme.loader_factory("theme.zip")
+    assert isinstance(loader, theme.PrecompiledLoader)
+
+    site: dict[str, object] = dict(site=dict(title="t"))
+    env = blag.environment_factory("theme.zip", site)
+    html = env.get_template("page.html").render(title="foo", content="bar")
+    reference = blag.environment_factory("templates", site)
+    assert html == reference.get_template("page.html").render(
+        title="foo", content="bar"
+    )
+
+    # the loader can be passed to worker processes
+    loader = pickle.loads(pickle.dumps(env.loader))
+    assert isinstance(loader, theme.PrecompiledLoader)
+    assert loader.path == "theme.zip"
+
+    # all templates depend on the whole theme
+    fingerprints = template_fingerprints(env, ["page.html", "tag.html"])
+    assert fingerprints["page.html"] == fingerprints["tag.html"]
+
+
+def test_build_precompiled(args: Namespace) -> None:
+    """Test building with a precompiled theme."""
+    blag.main(["compile-templates", "-o", "theme.zip"])
+    args.template_dir = "theme.zip"
+    args.jobs = 2
+    for i in range(2):
+        with open(f"{args.input_dir}/page{i}.md", "w") as fh:
+            fh.write("title: page\n\nsome text")
+    blag.build(args)
+    assert os.path.exists(f"{args.output_dir}/page1.html")
@@ -0,0 +1,107 @@
+"""Tests for the watch module."""
+
+import os
+import sys
+from collections.abc import Callable
+
+import pytest
+
+from blag import watch
+
+WAITTIME = 0.1
+
+
+def polling(dirs: list[str]) -> watch.Watcher:
+    """Create a polling watcher."""
+    return watch.PollingWatcher(dirs, interval=WAITTIME / 10)
+
+
+def inotify(dirs: list[str]) -> watch.Watcher:
+    """Create an inotify watcher."""
+    return watch.InotifyWatcher(dirs, debounce=WAITTIME / 10)
+
+
+watchers = [
+    polling,
+    pytest.param(
+        inotify,
+        marks=pytest.mark.skipif(
+            not sys.platform.startswith("linux"), reason="requires Linux"
+        ),
+    ),
+]
+
+
+@pytest.mark.parametrize("factory", watchers)
+def test_watcher(
+    cleandir: str, factory: Callable[[list[str]], watch.Watcher]
+) -> None:
+    """Test watchers report created, modified and deleted files."""
+    watcher = factory(["content", "static"])
+    assert watcher.wait(WAITTIME) == set()
+
+    with open("content/test", "w") as fh:
+        fh.write("boo")
+    assert watcher.wait(WAITTIME) == {"content/test"}
+
+    with open("content/test", "a") as fh:
+        fh.write("boo")
+    assert watcher.wait(WAITTIME) == {"content/test"}
+
+    os.remove("content/test")
+    assert watcher.wait(WAITTIME) == {"content/test"}
+    watcher.close()
+
+
+@pytest.mark.parametrize("factory", watchers)
+def test_watcher_coalesces(
+    cleandir: str, factory: Callable[[list[str]], watch.Watcher]
+) -> None:
+    """Test several changes are reported together."""
+    watcher = factory(["content", "static"])
+    for i in range(3):
+        with open("content/test", "a") as fh:
+            fh.write("boo")
+        with open(f"static/test{i}", "w") as fh:
+            fh.write("boo")
+    assert watcher.wait(WAITTIME) == {
+        "content/test",
+        "static/test0",
+        "static/test1",
+        "static/test2",
+    }
+    watcher.close()
+
+
+@pytest.mark.parametrize("factory", watchers)
+def test_watcher_new_directories(
+    cleandir: str, factory: Callable[[list[str]], watch.Watcher]
+) -> None:
+    """Test files in new directories are reported."""
+    watcher = factory(["content"])
+    os.makedirs("content/a/b")
+    with open("content/a/b/test", "w") as fh:
+        fh.write("boo")
+    assert "content/a/b/test" in watcher.wait(WAITTIME)
+
+    # the new directory is watched as well
+    with open("content/a/b/test", "a") as fh:
+        fh.write("boo")
+    assert watcher.wait(WAITTIME) == {"content/a/b/test"}
+    watcher.close()
+
+
+def test_watcher_factory(cleandir: str) -> None:
+    """Test watcher_factory."""
+    watcher = watch.watcher_factory(["content"])
+    if sys.platform.startswith("linux"):
+        assert isinstance(watcher, watch.InotifyWatcher)
+    else:
+        assert isinstance(watcher, watch.PollingWatcher)
+    watcher.close()
+
+
+def test_watcher_is_abstract() -> None:
+    """Test watchers must implement `wait`."""
+    with pytest.raises(TypeError):
+        watch.Watcher([])  # type: ignore[abstract]